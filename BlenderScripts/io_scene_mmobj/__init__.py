@@ -33,8 +33,30 @@ bl_info = {
 
 if "bpy" in locals():
     import importlib
+    if "parse_mmobj" in locals():
+        importlib.reload(parse_mmobj)
+    if "snapshot_dat" in locals():
+        importlib.reload(snapshot_dat)
+    if "proxy_mmobj" in locals():
+        importlib.reload(proxy_mmobj)
+    if "watch_mmobj" in locals():
+        importlib.reload(watch_mmobj)
     if "import_mmobj" in locals():
         importlib.reload(import_mmobj)
+    if "cache_mmobj" in locals():
+        importlib.reload(cache_mmobj)
+    if "format_mmobj" in locals():
+        importlib.reload(format_mmobj)
+    if "vcache_mmobj" in locals():
+        importlib.reload(vcache_mmobj)
+    if "delta_mmobj" in locals():
+        importlib.reload(delta_mmobj)
+    if "copy_mmobj" in locals():
+        importlib.reload(copy_mmobj)
+    if "write_mmobj" in locals():
+        importlib.reload(write_mmobj)
+    if "weights_mmobj" in locals():
+        importlib.reload(weights_mmobj)
     if "export_mmobj" in locals():
         importlib.reload(export_mmobj)
 
@@ -42,8 +64,10 @@ if "bpy" in locals():
 import bpy
 from bpy.props import (BoolProperty,
                        FloatProperty,
+                       IntProperty,
                        StringProperty,
                        EnumProperty,
+                       CollectionProperty,
                        )
 from bpy_extras.io_utils import (ImportHelper,
                                  ExportHelper,
@@ -64,6 +88,17 @@ class ImportOBJ(bpy.types.Operator, ImportHelper):
             options={'HIDDEN'},
             )
 
+    # MMObj: several files can be selected at once; they share images and materials, and are parsed on
+    # threads that overlap reading them but share one core (see import_mmobj.parse_many).
+    files = CollectionProperty(
+            type=bpy.types.OperatorFileListElement,
+            options={'HIDDEN', 'SKIP_SAVE'},
+            )
+    directory = StringProperty(
+            subtype='DIR_PATH',
+            options={'HIDDEN', 'SKIP_SAVE'},
+            )
+
     use_ngons = BoolProperty(
             name="NGons",
             description="Import faces with more than 4 verts as ngons",
@@ -80,9 +115,8 @@ class ImportOBJ(bpy.types.Operator, ImportHelper):
             default=True,
             )
 
-    # MMObj: splitting is always disabled because it split_mesh doesn't properly handle the 
-    # weight groups stuff that I added 
-    # (and snapshot never generates more than one OBJ object and it doesn't generate groups)
+    # MMObj: splitting is off by default (snapshot never generates more than one OBJ object and it
+    # doesn't generate groups), but split_mesh carries the blend weights so merged captures can be split.
     use_split_objects = BoolProperty(
             name="Object",
             description="Import OBJ Objects into Blender Objects",
@@ -107,6 +141,40 @@ class ImportOBJ(bpy.types.Operator, ImportHelper):
             default=True,
             )
 
+    use_background = BoolProperty(
+            name="Background",
+            description="Parse on a worker thread and build the mesh in small steps, "
+                        "so that blender stays responsive (Esc cancels)",
+            default=False,
+            )
+
+    use_normals = BoolProperty(
+            name="Custom Normals",
+            description="Import the file's normals (vn) as custom split normals "
+                        "instead of letting blender recompute them",
+            default=False,
+            )
+
+    use_shape_keys = BoolProperty(
+            name="Series as Shape Keys",
+            description="When importing several files, add files with the same topology as an earlier "
+                        "one to its mesh as shape keys instead of creating new meshes",
+            default=False,
+            )
+
+    proxy_mode = EnumProperty(
+            name="Proxy",
+            items=(('OFF', "Full Mesh", "Import the full mesh"),
+                   ('BACKGROUND', "Proxy, Then Full",
+                    "Import a quick preview from a sample of the triangles, "
+                    "then replace it with the full mesh in the background (Esc cancels)"),
+                   ('REQUEST', "Proxy Only",
+                    "Import a quick preview from a sample of the triangles; "
+                    "use Build Full MMObj Mesh to replace it with the full mesh"),
+                   ),
+            default='OFF',
+            )
+
     split_mode = EnumProperty(
             name="Split",
             items=(
@@ -148,6 +216,7 @@ class ImportOBJ(bpy.types.Operator, ImportHelper):
 
     def execute(self, context):
         # print("Selected: " + context.active_object.name)
+        import os
         from . import import_mmobj
 
         if self.split_mode == 'OFF':
@@ -160,19 +229,101 @@ class ImportOBJ(bpy.types.Operator, ImportHelper):
                                             "axis_up",
                                             "filter_glob",
                                             "split_mode",
+                                            "use_background",
+                                            "proxy_mode",
+                                            "files",
+                                            "directory",
                                             ))
 
+        filenames = [f.name for f in self.files if f.name]
+        if len(filenames) > 1:
+            keywords["filepaths"] = [os.path.join(self.directory, name) for name in filenames]
+
         global_matrix = axis_conversion(from_forward=self.axis_forward,
                                         from_up=self.axis_up,
                                         ).to_4x4()
         keywords["global_matrix"] = global_matrix
 
         if bpy.data.is_saved and context.user_preferences.filepaths.use_relative_paths:
-            import os
             keywords["relpath"] = os.path.dirname((bpy.data.path_resolve("filepath", False).as_bytes()))
 
+        if self.proxy_mode != 'OFF':
+            return self.import_proxies(context, import_mmobj, keywords)
+
+        if self.use_background:
+            return self.start_background(context, import_mmobj.BackgroundImport(**keywords))
+
         return import_mmobj.load(self, context, **keywords)
 
+    def import_proxies(self, context, import_mmobj, keywords):
+        filepaths = keywords.pop("filepaths", None) or [keywords["filepath"]]
+        del keywords["filepath"]
+
+        proxies = []
+        for filepath in filepaths:
+            try:
+                proxies.append(import_mmobj.create_proxy(filepath, **keywords))
+            except (OSError, ValueError) as e:
+                self.report({'ERROR'}, "Can't make a proxy of %s: %s" % (filepath, e))
+        if not proxies:
+            return {'CANCELLED'}
+        import_mmobj.link_objects(context, proxies, keywords["global_clamp_size"], keywords["global_matrix"])
+
+        if self.proxy_mode == 'REQUEST':
+            return {'FINISHED'}
+
+        jobs = [import_mmobj.BackgroundImport(ob["mmobj_proxy"]["filepath"], proxy_object=ob, **keywords)
+                for ob in proxies]
+        return self.start_background(context, import_mmobj.ProxyBuild(jobs))
+
+    # seconds of main thread work per timer event when importing in the background
+    background_time_slice = 0.05
+
+    def start_background(self, context, job):
+        wm = context.window_manager
+        self._job = job
+        self._job.start()
+        self._timer = wm.event_timer_add(0.01, context.window)
+        wm.progress_begin(0, 100)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def finish_background(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        if context.area:
+            context.area.header_text_set()
+        self._job = None
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self._job.cancel(context)
+            self.finish_background(context)
+            self.report({'INFO'}, "MMObj import cancelled")
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        try:
+            done = self._job.step(bpy.context, self.background_time_slice)
+        except Exception as e:
+            self._job.cancel(context)
+            self.finish_background(context)
+            self.report({'ERROR'}, "MMObj import failed: %s" % e)
+            return {'CANCELLED'}
+
+        if done:
+            self.finish_background(context)
+            return {'FINISHED'}
+
+        percent = int(self._job.progress * 100)
+        context.window_manager.progress_update(percent)
+        if context.area:
+            context.area.header_text_set("Importing MMObj: %d%% (Esc to cancel)" % percent)
+        return {'RUNNING_MODAL'}
+
     def draw(self, context):
         layout = self.layout
 
@@ -181,19 +332,19 @@ class ImportOBJ(bpy.types.Operator, ImportHelper):
         row.prop(self, "use_edges")
 
         layout.prop(self, "use_smooth_groups")
+        layout.prop(self, "use_normals")
 
-        # MMObj: don't show the split UI since it can mess up import
-        #box = layout.box()
-        #row = box.row()
-        #row.prop(self, "split_mode", expand=True)
+        box = layout.box()
+        row = box.row()
+        row.prop(self, "split_mode", expand=True)
 
-        #row = box.row()
-        #if self.split_mode == 'ON':
-        #    row.label(text="Split by:")
-        #    row.prop(self, "use_split_objects")
-        #    row.prop(self, "use_split_groups")
-        #else:
-        #    row.prop(self, "use_groups_as_vgroups")
+        row = box.row()
+        if self.split_mode == 'ON':
+            row.label(text="Split by:")
+            row.prop(self, "use_split_objects")
+            row.prop(self, "use_split_groups")
+        else:
+            row.prop(self, "use_groups_as_vgroups")
 
         row = layout.split(percentage=0.67)
         row.prop(self, "global_clamp_size")
@@ -201,6 +352,174 @@ class ImportOBJ(bpy.types.Operator, ImportHelper):
         layout.prop(self, "axis_up")
 
         layout.prop(self, "use_image_search")
+        layout.prop(self, "use_shape_keys")
+        layout.prop(self, "use_background")
+        layout.prop(self, "proxy_mode")
+
+
+class BuildFullMesh(bpy.types.Operator):
+    """Replace the selected MMObj proxies with their full meshes"""
+    bl_idname = "object.mmobj_build_full"
+    bl_label = "Build Full MMObj Mesh"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return any("mmobj_proxy" in ob for ob in context.selected_objects)
+
+    def execute(self, context):
+        import os
+        from . import import_mmobj
+
+        relpath = None
+        if bpy.data.is_saved and context.user_preferences.filepaths.use_relative_paths:
+            relpath = os.path.dirname((bpy.data.path_resolve("filepath", False).as_bytes()))
+
+        for ob in [ob for ob in context.selected_objects if "mmobj_proxy" in ob]:
+            keywords = ob["mmobj_proxy"].to_dict()
+            filepath = keywords.pop("filepath")
+            import_mmobj.load(self, context, filepath, relpath=relpath, proxy_object=ob, **keywords)
+        return {'FINISHED'}
+
+
+class WatchSnapshots(bpy.types.Operator):
+    """Import new snapshots automatically as they are written to a folder (run again to stop)"""
+    bl_idname = "import_scene.mmobj_watch"
+    bl_label = "Watch Snapshot Folder"
+
+    directory = StringProperty(
+            subtype='DIR_PATH',
+            )
+    group_name = StringProperty(
+            name="Group",
+            description="Group that the imported snapshots are added to",
+            default="MMSnapshots",
+            )
+    use_normals = ImportOBJ.use_normals
+    use_image_search = ImportOBJ.use_image_search
+    axis_forward = ImportOBJ.axis_forward
+    axis_up = ImportOBJ.axis_up
+
+    # the running watcher, so that invoking the operator again stops it
+    _running = None
+
+    # seconds between checks for parsed snapshots, and main thread work per check
+    timer_step = 0.25
+    time_slice = 0.05
+
+    def invoke(self, context, event):
+        if WatchSnapshots._running is not None:
+            WatchSnapshots._running._stop_requested = True
+            return {'FINISHED'}
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        import os
+        from . import import_mmobj
+
+        if WatchSnapshots._running is not None:
+            WatchSnapshots._running._stop_requested = True
+            return {'FINISHED'}
+        if not os.path.isdir(self.directory):
+            self.report({'ERROR'}, "Not a folder: %s" % self.directory)
+            return {'CANCELLED'}
+
+        relpath = None
+        if bpy.data.is_saved and context.user_preferences.filepaths.use_relative_paths:
+            relpath = os.path.dirname((bpy.data.path_resolve("filepath", False).as_bytes()))
+
+        self._inbox = import_mmobj.SnapshotInbox(self.directory,
+                                                 group_name=self.group_name,
+                                                 use_image_search=self.use_image_search,
+                                                 use_normals=self.use_normals,
+                                                 relpath=relpath,
+                                                 global_matrix=axis_conversion(from_forward=self.axis_forward,
+                                                                               from_up=self.axis_up,
+                                                                               ).to_4x4(),
+                                                 )
+        self._inbox.start()
+        self._stop_requested = False
+        WatchSnapshots._running = self
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(self.timer_step, context.window)
+        wm.modal_handler_add(self)
+        self.report({'INFO'}, "Watching %s for snapshots" % self.directory)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if self._stop_requested:
+            self._inbox.stop(context)
+            context.window_manager.event_timer_remove(self._timer)
+            WatchSnapshots._running = None
+            self.report({'INFO'}, "Stopped watching %s" % self.directory)
+            return {'FINISHED'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        for path, error in self._inbox.step(bpy.context, self.time_slice):
+            if error is None:
+                self.report({'INFO'}, "Imported snapshot %s" % path)
+            else:
+                self.report({'WARNING'}, "Could not import snapshot %s: %s" % (path, error))
+        return {'PASS_THROUGH'}
+
+
+class ImportSnapshotDat(bpy.types.Operator, ImportHelper):
+    """Load a ModelMod snapshot from its raw vertex and index buffer files"""
+    bl_idname = "import_scene.mmobj_snapshot_dat"
+    bl_label = "Import Snapshot Buffers"
+    bl_options = {'PRESET', 'UNDO'}
+
+    filename_ext = ".dat"
+    filter_glob = StringProperty(
+            default="*_VB.dat;*_IB.dat;*_VBDecl.dat",
+            options={'HIDDEN'},
+            )
+
+    use_snapshot_xforms = BoolProperty(
+            name="Snapshot Transforms",
+            description="Apply the transforms recorded in the snapshot's mmobj, "
+                        "so the mesh matches an import of that file",
+            default=True,
+            )
+    use_image_search = ImportOBJ.use_image_search
+    global_clamp_size = ImportOBJ.global_clamp_size
+    axis_forward = ImportOBJ.axis_forward
+    axis_up = ImportOBJ.axis_up
+
+    def execute(self, context):
+        import os
+        from . import import_mmobj
+
+        keywords = self.as_keywords(ignore=("axis_forward",
+                                            "axis_up",
+                                            "filter_glob",
+                                            ))
+        keywords["global_matrix"] = axis_conversion(from_forward=self.axis_forward,
+                                                    from_up=self.axis_up,
+                                                    ).to_4x4()
+
+        if bpy.data.is_saved and context.user_preferences.filepaths.use_relative_paths:
+            keywords["relpath"] = os.path.dirname((bpy.data.path_resolve("filepath", False).as_bytes()))
+
+        try:
+            return import_mmobj.load_snapshot_dat(self, context, **keywords)
+        except (OSError, ValueError) as e:
+            self.report({'ERROR'}, "Snapshot import failed: %s" % e)
+            return {'CANCELLED'}
+
+    def draw(self, context):
+        layout = self.layout
+
+        layout.prop(self, "use_snapshot_xforms")
+        row = layout.split(percentage=0.67)
+        row.prop(self, "global_clamp_size")
+        layout.prop(self, "axis_forward")
+        layout.prop(self, "axis_up")
+        layout.prop(self, "use_image_search")
 
 
 class ExportOBJ(bpy.types.Operator, ExportHelper):
@@ -343,6 +662,97 @@ class ExportOBJ(bpy.types.Operator, ExportHelper):
             min=0.01, max=1000.0,
             default=1.0,
             )
+    use_cache = BoolProperty(
+            name="Reuse Unchanged Meshes",
+            description="Keep the data read from each object, and reuse it in later exports "
+                        "until the object changes",
+            default=True,
+            )
+    use_background = BoolProperty(
+            name="Write in Background",
+            description="Return as soon as the meshes have been read, "
+                        "and format and write the file on worker threads",
+            default=False,
+            )
+    texture_link = EnumProperty(
+            name="Copied Textures",
+            description="How textures are put in the export directory when the path mode is Copy; "
+                        "unchanged textures are never copied again",
+            items=(('COPY', "Copy", "Copy the texture files"),
+                   ('HARDLINK', "Hard Link", "Link to the texture files, copying them where that isn't possible"),
+                   ('REFLINK', "Reflink", "Clone the texture files on filesystems that support it, "
+                                          "copying them elsewhere"),
+                   ),
+            default='COPY',
+            )
+
+    delta_mode = EnumProperty(
+            name="Delta",
+            description="When only vertices moved since the last export, write just them to a .delta file "
+                        "next to the mmobj; merge it with delta_mmobj.py before the game loads the mod.  "
+                        "Auto export always writes the whole mmobj",
+            items=(('OFF', "Off", "Always write the whole file"),
+                   ('POSITIONS', "Positions", "Write a delta when only the positions changed; most moves also "
+                                              "change the exported normals, which writes the whole file"),
+                   ('NORMALS', "Positions and Normals", "Write a delta when only the positions and normals changed"),
+                   ),
+            default='OFF',
+            )
+
+    number_style = EnumProperty(
+            name="Numbers",
+            description="How floats are written",
+            items=(('FIXED', "Fixed", "Always write the chosen number of decimals"),
+                   ('TRIM', "Trimmed", "Write the chosen number of decimals, leaving out trailing zeros"),
+                   ('SHORTEST', "Shortest Exact", "Write as few decimals as the game needs to read back "
+                                                  "exactly the same value, ignoring the decimals below"),
+                   ),
+            default='FIXED',
+            )
+    position_decimals = IntProperty(
+            name="Position Decimals",
+            min=0, max=9,
+            default=6,
+            )
+    uv_decimals = IntProperty(
+            name="UV Decimals",
+            min=0, max=9,
+            default=6,
+            )
+    normal_decimals = IntProperty(
+            name="Normal Decimals",
+            min=0, max=9,
+            default=6,
+            )
+    weight_decimals = IntProperty(
+            name="Weight Decimals",
+            min=0, max=9,
+            default=6,
+            )
+    use_blend_padding = BoolProperty(
+            name="Pad Blend Weights",
+            description="Write four index/weight pairs on every #vbld line, as the game requires; "
+                        "turn off only for readers that accept fewer",
+            default=True,
+            )
+    buffer_decl = StringProperty(
+            name="Buffer Declaration",
+            description="The _VBDecl.dat of the reference the mod replaces; if set, the mesh is also written "
+                        "as _VB.dat and _IB.dat files in that vertex layout",
+            subtype='FILE_PATH',
+            default="",
+            )
+    use_reverse_normals = BoolProperty(
+            name="Reverse Normal Bytes",
+            description="Write byte normals in reverse order, as games with the ReverseNormals profile setting need",
+            default=False,
+            )
+    use_vertex_cache = BoolProperty(
+            name="Optimize Index Buffer",
+            description="Reorder the triangles of the _IB.dat buffer export for a GPU's vertex cache; "
+                        "the mmobj is unchanged, and the game, which draws mods unindexed, doesn't gain from it",
+            default=False,
+            )
 
     path_mode = path_reference_mode
 
@@ -365,15 +775,163 @@ class ExportOBJ(bpy.types.Operator, ExportHelper):
                                          ).to_4x4())
 
         keywords["global_matrix"] = global_matrix
-        return export_mmobj.save(self, context, **keywords)
+
+        if not self.use_background:
+            return export_mmobj.save(self, context, **keywords)
+
+        # set from a writer thread once the file is written
+        self._result = None
+        keywords["on_done"] = self.export_done
+        try:
+            export_mmobj.save(self, context, **keywords)
+        except Exception as e:
+            self.report({'ERROR'}, "MMObj export failed: %s" % e)
+            return {'CANCELLED'}
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.1, context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def export_done(self, error):
+        self._result = (error,)
+
+    def modal(self, context, event):
+        if event.type != 'TIMER' or self._result is None:
+            return {'PASS_THROUGH'}
+
+        context.window_manager.event_timer_remove(self._timer)
+        error = self._result[0]
+        if error is not None:
+            self.report({'ERROR'}, "MMObj export of %s failed: %s" % (self.filepath, error))
+            return {'CANCELLED'}
+        self.report({'INFO'}, "Exported %s" % self.filepath)
+        return {'FINISHED'}
+
+
+class AutoExportOBJ(bpy.types.Operator, ExportHelper):
+    """Export the selected objects, and export them again whenever they change (run again to stop)"""
+    bl_idname = "export_scene.mmobj_auto"
+    bl_label = "Auto Export MMOBJ"
+
+    filename_ext = ".mmobj"
+    filter_glob = ExportOBJ.filter_glob
+
+    delay = FloatProperty(
+            name="Delay",
+            description="Seconds without changes before the objects are exported again",
+            min=0.1, max=60.0,
+            default=1.0,
+            )
+    use_materials = ExportOBJ.use_materials
+    axis_forward = ExportOBJ.axis_forward
+    axis_up = ExportOBJ.axis_up
+    global_scale = ExportOBJ.global_scale
+    texture_link = ExportOBJ.texture_link
+    number_style = ExportOBJ.number_style
+    position_decimals = ExportOBJ.position_decimals
+    uv_decimals = ExportOBJ.uv_decimals
+    normal_decimals = ExportOBJ.normal_decimals
+    weight_decimals = ExportOBJ.weight_decimals
+    use_blend_padding = ExportOBJ.use_blend_padding
+    buffer_decl = ExportOBJ.buffer_decl
+    use_reverse_normals = ExportOBJ.use_reverse_normals
+    use_vertex_cache = ExportOBJ.use_vertex_cache
+    path_mode = path_reference_mode
+
+    check_extension = True
+
+    # the running auto export, so that invoking the operator again stops it
+    _running = None
+
+    # seconds between checks for changes that are due
+    timer_step = 0.25
+
+    def invoke(self, context, event):
+        if AutoExportOBJ._running is not None:
+            AutoExportOBJ._running._stop_requested = True
+            return {'FINISHED'}
+        return ExportHelper.invoke(self, context, event)
+
+    def execute(self, context):
+        from . import export_mmobj
+
+        if AutoExportOBJ._running is not None:
+            AutoExportOBJ._running._stop_requested = True
+            return {'FINISHED'}
+        if not context.selected_objects:
+            self.report({'ERROR'}, "Select the objects to export")
+            return {'CANCELLED'}
+
+        # stored on the objects, so that they keep their target and options in the .blend file
+        options = self.as_keywords(ignore=("delay", "check_existing", "filter_glob"))
+        for ob in context.selected_objects:
+            ob[export_mmobj.AUTO_EXPORT_PROPERTY] = options
+        targets = export_mmobj.start_auto_export(context.scene)
+        for filepath in targets:
+            if not self.export(context, export_mmobj, filepath):
+                export_mmobj.stop_auto_export()
+                return {'CANCELLED'}
+
+        self._stop_requested = False
+        AutoExportOBJ._running = self
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(self.timer_step, context.window)
+        wm.modal_handler_add(self)
+        self.report({'INFO'}, "Exporting %s automatically" % ", ".join(targets))
+        return {'RUNNING_MODAL'}
+
+    def export(self, context, export_mmobj, filepath):
+        try:
+            export_mmobj.auto_export(context, filepath)
+        except Exception as e:
+            self.report({'ERROR'}, "MMObj export of %s failed: %s" % (filepath, e))
+            return False
+        return True
+
+    def modal(self, context, event):
+        from . import export_mmobj
+
+        if self._stop_requested:
+            export_mmobj.stop_auto_export()
+            context.window_manager.event_timer_remove(self._timer)
+            AutoExportOBJ._running = None
+            self.report({'INFO'}, "Stopped exporting automatically")
+            return {'FINISHED'}
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        # the edit mesh is only written back when leaving edit mode, and exporting would leave it
+        if context.mode.startswith('EDIT'):
+            return {'PASS_THROUGH'}
+
+        for filepath in export_mmobj.due_auto_exports(self.delay):
+            if self.export(context, export_mmobj, filepath):
+                self.report({'INFO'}, "Exported %s" % filepath)
+        return {'PASS_THROUGH'}
 
 
 def menu_func_import(self, context):
     self.layout.operator(ImportOBJ.bl_idname, text="ModelMod obj (.mmobj)")
+    self.layout.operator(ImportSnapshotDat.bl_idname, text="ModelMod snapshot buffers (_VB.dat)")
+    if WatchSnapshots._running is None:
+        self.layout.operator(WatchSnapshots.bl_idname, text="ModelMod snapshot folder (watch)")
+    else:
+        self.layout.operator(WatchSnapshots.bl_idname, text="Stop watching ModelMod snapshot folder")
+
+
+def menu_func_object(self, context):
+    self.layout.operator(BuildFullMesh.bl_idname)
 
 
 def menu_func_export(self, context):
     self.layout.operator(ExportOBJ.bl_idname, text="ModelMod obj (.mmobj)")
+    if AutoExportOBJ._running is None:
+        self.layout.operator(AutoExportOBJ.bl_idname, text="ModelMod obj (auto export)")
+    else:
+        self.layout.operator(AutoExportOBJ.bl_idname, text="Stop auto exporting ModelMod obj")
 
 
 def register():
@@ -381,13 +939,19 @@ def register():
 
     bpy.types.INFO_MT_file_import.append(menu_func_import)
     bpy.types.INFO_MT_file_export.append(menu_func_export)
+    bpy.types.VIEW3D_MT_object.append(menu_func_object)
 
 
 def unregister():
+    from . import export_mmobj
+    export_mmobj.stop_auto_export()
+    export_mmobj.remove_cache_handlers()
+
     bpy.utils.unregister_module(__name__)
 
     bpy.types.INFO_MT_file_import.remove(menu_func_import)
     bpy.types.INFO_MT_file_export.remove(menu_func_export)
+    bpy.types.VIEW3D_MT_object.remove(menu_func_object)
 
 if __name__ == "__main__":
     register()
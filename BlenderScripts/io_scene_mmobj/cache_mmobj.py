@@ -0,0 +1,78 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+A size limited cache for the exporter's mesh data, so that repeated exports of a scene only read the
+objects that changed since the last one.
+
+Does not need blender; the exporter decides what the keys are and when entries go stale.
+"""
+
+import collections
+
+
+class ArrayCache:
+    """
+    Keeps values up to a total size in bytes, dropping the least recently used ones when it is over.
+    A value bigger than the whole budget is not kept at all.
+    """
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self._entries = collections.OrderedDict()  # key: (value, size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        return list(self._entries.keys())
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, size):
+        self.discard(key)
+        if size > self.budget:
+            return
+        self._entries[key] = value, size
+        self.size += size
+        while self.size > self.budget:
+            _, (_, old_size) = self._entries.popitem(last=False)
+            self.size -= old_size
+
+    def discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def discard_if(self, predicate):
+        """
+        Drops every entry whose key predicate(key) is true for.
+        """
+        for key in [key for key in self._entries if predicate(key)]:
+            self.discard(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
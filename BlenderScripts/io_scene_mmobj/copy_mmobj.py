@@ -0,0 +1,189 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Copies the textures an export refers to, skipping the ones that are unchanged since the last export.
+
+A manifest in the output directory records, for every copied file, its source and the size, mtime and
+hash the source had.  A texture is copied again only when its copy is missing or was changed, or its
+source is a different file or has different content.  When only the mtime of a source changed, the
+hash decides, and the manifest is updated without copying.
+
+Does not need blender; it takes the copy_set of (source, destination) paths that
+bpy_extras.io_utils.path_reference fills in.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+MANIFEST_NAME = "mmobj_textures.json"
+
+# bytes read at once when hashing or copying
+COPY_CHUNK = 1024 * 1024
+
+# ioctl that makes a file share the blocks of another one, on linux filesystems that support it
+FICLONE = 0x40049409
+
+LINK_MODES = ('COPY', 'HARDLINK', 'REFLINK')
+
+
+def file_hash(path):
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def copy_hashed(src, dst):
+    """
+    Copies src to dst, reading it only once, and returns its hash.
+    """
+    hasher = hashlib.sha1()
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        for chunk in iter(lambda: fsrc.read(COPY_CHUNK), b''):
+            hasher.update(chunk)
+            fdst.write(chunk)
+    shutil.copystat(src, dst)
+    return hasher.hexdigest()
+
+
+def reflink(src, dst):
+    """
+    Makes dst a copy on write clone of src.  Raises OSError where the filesystem can't.
+    """
+    import fcntl
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(src, dst)
+
+
+def place_file(src, dst, link):
+    """
+    Puts src at dst as link says, falling back to a plain copy.  Returns the hash of src.
+    """
+    if link == 'HARDLINK':
+        try:
+            os.link(src, dst)
+            return file_hash(src)
+        except OSError:
+            pass
+    elif link == 'REFLINK':
+        try:
+            reflink(src, dst)
+            return file_hash(src)
+        except (OSError, ImportError):
+            if os.path.exists(dst):
+                os.remove(dst)
+    return copy_hashed(src, dst)
+
+
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_unchanged(entry, src, src_stat, dst):
+    """
+    Returns True if dst is still the copy of src that entry records.  Updates entry when only the mtime
+    of src changed but its content didn't.
+    """
+    if entry is None or entry.get("source") != src:
+        return False
+    try:
+        dst_stat = os.stat(dst)
+    except OSError:
+        return False
+    if dst_stat.st_size != entry.get("size") or dst_stat.st_mtime_ns != entry.get("copy_mtime"):
+        return False
+    if src_stat.st_size != entry["size"]:
+        return False
+    if src_stat.st_mtime_ns == entry.get("mtime"):
+        return True
+    if file_hash(src) != entry.get("hash"):
+        return False
+    entry["mtime"] = src_stat.st_mtime_ns
+    return True
+
+
+def copy_textures(copy_set, directory, link='COPY', report=print):
+    """
+    Copies the (source, destination) pairs of copy_set that changed since the last export into
+    directory, keeping the manifest there up to date.  link is one of LINK_MODES: with 'HARDLINK' or
+    'REFLINK', files are linked instead of copied where the filesystem allows it.
+    Returns the number of files copied and the number skipped as unchanged.
+    """
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    loaded = json.dumps(manifest, sort_keys=True)
+    copied = skipped = 0
+
+    for src, dst in sorted(copy_set):
+        src = os.path.abspath(src)
+        dst = os.path.abspath(dst)
+        try:
+            src_stat = os.stat(src)
+        except OSError:
+            report("missing %r, not copying" % src)
+            continue
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            skipped += 1
+            continue
+
+        key = os.path.relpath(dst, directory)
+        entry = manifest.get(key)
+        if is_unchanged(entry, src, src_stat, dst):
+            skipped += 1
+            continue
+
+        try:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if os.path.lexists(dst):
+                os.remove(dst)
+            digest = place_file(src, dst, link)
+        except OSError as e:
+            report("could not copy %r to %r: %s" % (src, dst, e))
+            manifest.pop(key, None)
+            continue
+        manifest[key] = {"source": src,
+                         "size": src_stat.st_size,
+                         "mtime": src_stat.st_mtime_ns,
+                         "hash": digest,
+                         "copy_mtime": os.stat(dst).st_mtime_ns,
+                         }
+        copied += 1
+
+    # an unchanged manifest is left alone, like the other files of an unchanged export
+    if json.dumps(manifest, sort_keys=True) != loaded:
+        save_manifest(manifest_path, manifest)
+    return copied, skipped
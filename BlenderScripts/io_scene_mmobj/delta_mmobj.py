@@ -0,0 +1,274 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Delta files: the vertex rows of an export whose topology didn't change since the full file was written.
+
+When only positions (and normals) changed, the exporter writes file.mmobj.delta next to file.mmobj
+instead of rewriting it.  The delta holds the size and sha1 of the full file it applies to, the
+number style of its rows (see format_mmobj), and the v and vn rows in the order the full file has
+them.  Merging replaces those lines of the full file and gives exactly the file a full export would
+have written.
+
+An animation exported with shared topology is a full file of its first frame and file.mmobj.anim, a
+stream of the rows of every frame in the same form.
+
+Does not need blender; merge from a command line with:
+
+    python delta_mmobj.py [--output merged.mmobj] file.mmobj
+    python delta_mmobj.py --frame N [--output frame.mmobj] file.mmobj
+
+Without --output the full file is updated in place and the delta is removed.  With --frame, the
+rows of that frame of the animation stream are put in instead.
+"""
+
+import hashlib
+import os
+import struct
+import sys
+
+import numpy as np
+
+if __package__:
+    from .format_mmobj import NUMBER_STYLES, format_rows
+else:
+    # run as a script
+    from format_mmobj import NUMBER_STYLES, format_rows
+
+DELTA_SUFFIX = ".delta"
+ANIMATION_SUFFIX = ".anim"
+
+MAGIC = b"MMOBJDLT"
+ANIMATION_MAGIC = b"MMOBJANI"
+VERSION = 2
+
+# magic, version, size of the full file, its sha1, number style, number of blocks
+HEADER = struct.Struct('<8sIQ20sBI')
+# magic, version, size of the full file, its sha1, number style; frames follow until the end of the file
+ANIMATION_HEADER = struct.Struct('<8sIQ20sB')
+# frame number, number of blocks; the blocks follow
+FRAME = struct.Struct('<iI')
+# length of the row format, dtype code, rows, columns; the format and the rows follow
+BLOCK = struct.Struct('<HcII')
+
+DTYPES = {b'f': np.dtype('<f4'), b'd': np.dtype('<f8')}
+
+
+class DeltaError(Exception):
+    pass
+
+
+def delta_path(path):
+    return path + DELTA_SUFFIX
+
+
+def animation_path(path):
+    return path + ANIMATION_SUFFIX
+
+
+def dtype_code(values):
+    return b'f' if values.dtype == np.float32 else b'd'
+
+
+def style_code(style):
+    return NUMBER_STYLES.index(style)
+
+
+def code_style(code):
+    if code >= len(NUMBER_STYLES):
+        raise DeltaError("unknown number style %d" % code)
+    return NUMBER_STYLES[code]
+
+
+def encode_blocks(blocks):
+    """
+    Returns the bytes of blocks, which are (row format, 2d float array) in file order.
+    """
+    parts = []
+    for fmt, values in blocks:
+        code = dtype_code(values)
+        fmt = fmt.encode("utf8")
+        parts.append(BLOCK.pack(len(fmt), code, values.shape[0], values.shape[1]))
+        parts.append(fmt)
+        parts.append(np.ascontiguousarray(values, dtype=DTYPES[code]).tobytes())
+    return b''.join(parts)
+
+
+def encode_delta(base_size, base_sha1, blocks, style='FIXED'):
+    """
+    Returns the bytes of a delta for the full file of base_size bytes and the digest base_sha1, whose
+    rows are written in style.
+    """
+    header = HEADER.pack(MAGIC, VERSION, base_size, base_sha1, style_code(style), len(blocks))
+    return header + encode_blocks(blocks)
+
+
+def encode_frame(frame, blocks):
+    return FRAME.pack(frame, len(blocks)) + encode_blocks(blocks)
+
+
+def decode_blocks(data, pos, num_blocks):
+    """
+    Returns the num_blocks blocks at pos in data, and the position after them.
+    """
+    blocks = []
+    for _ in range(num_blocks):
+        if pos + BLOCK.size > len(data):
+            raise DeltaError("delta is truncated")
+        fmt_len, code, rows, cols = BLOCK.unpack_from(data, pos)
+        pos += BLOCK.size
+        fmt = data[pos:pos + fmt_len].decode("utf8")
+        pos += fmt_len
+        dtype = DTYPES.get(code)
+        if dtype is None:
+            raise DeltaError("unknown value type %r" % code)
+        size = rows * cols * dtype.itemsize
+        if pos + size > len(data):
+            raise DeltaError("delta is truncated")
+        blocks.append((fmt, np.frombuffer(data, dtype, rows * cols, pos).reshape(rows, cols)))
+        pos += size
+    return blocks, pos
+
+
+def decode_delta(data):
+    """
+    Returns the base size, base sha1, number style and the (row format, array) blocks of a delta.
+    """
+    if len(data) < HEADER.size:
+        raise DeltaError("delta is truncated")
+    magic, version, base_size, base_sha1, style, num_blocks = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise DeltaError("not a version %d mmobj delta" % VERSION)
+    blocks, _ = decode_blocks(data, HEADER.size, num_blocks)
+    return base_size, base_sha1, code_style(style), blocks
+
+
+def decode_animation(data):
+    """
+    Returns the base size, base sha1, number style and a {frame: blocks} dict of an animation stream.
+    """
+    if len(data) < ANIMATION_HEADER.size:
+        raise DeltaError("animation is truncated")
+    magic, version, base_size, base_sha1, style = ANIMATION_HEADER.unpack_from(data)
+    if magic != ANIMATION_MAGIC or version != VERSION:
+        raise DeltaError("not a version %d mmobj animation" % VERSION)
+    pos = ANIMATION_HEADER.size
+    frames = {}
+    while pos < len(data):
+        if pos + FRAME.size > len(data):
+            raise DeltaError("animation is truncated")
+        frame, num_blocks = FRAME.unpack_from(data, pos)
+        frames[frame], pos = decode_blocks(data, pos + FRAME.size, num_blocks)
+    return base_size, base_sha1, code_style(style), frames
+
+
+def line_prefix(fmt):
+    """
+    The keyword and space that start the lines of a row format, e.g. b'v '.
+    """
+    return fmt.split(' ', 1)[0].encode("utf8") + b' '
+
+
+def merge(base, delta, frame=None):
+    """
+    Returns the bytes of the full file base with the rows of the delta bytes put in.  With frame, delta
+    is an animation stream and the rows of that frame are put in.
+    """
+    if frame is None:
+        base_size, base_sha1, style, blocks = decode_delta(delta)
+    else:
+        base_size, base_sha1, style, frames = decode_animation(delta)
+        if frame not in frames:
+            raise DeltaError("the animation has no frame %d" % frame)
+        blocks = frames[frame]
+    if len(base) != base_size or hashlib.sha1(base).digest() != base_sha1:
+        raise DeltaError("the delta was written for a different version of the file")
+
+    # the new lines of every keyword, in file order
+    new_lines = {}
+    for fmt, values in blocks:
+        lines = new_lines.setdefault(line_prefix(fmt), [])
+        for text in format_rows(fmt, values, style):
+            lines.extend(text.encode("utf8").splitlines(True))
+
+    used = dict.fromkeys(new_lines, 0)
+    merged = []
+    for line in base.splitlines(True):
+        prefix = line[:line.find(b' ') + 1]
+        lines = new_lines.get(prefix)
+        if lines is not None:
+            if used[prefix] >= len(lines):
+                raise DeltaError("the file has more %r lines than the delta" % prefix.decode("utf8"))
+            line = lines[used[prefix]]
+            used[prefix] += 1
+        merged.append(line)
+
+    for prefix, lines in new_lines.items():
+        if used[prefix] != len(lines):
+            raise DeltaError("the delta has more %r lines than the file" % prefix.decode("utf8"))
+    return b''.join(merged)
+
+
+def merge_file(path, output=None, frame=None):
+    """
+    Applies path's delta, if it has one, and writes the full file to output.  Without output, path
+    itself is updated and the delta removed.  With frame, that frame of path's animation stream is
+    applied instead.  Returns True if there was a delta or animation.
+    """
+    source = delta_path(path) if frame is None else animation_path(path)
+    if not os.path.exists(source):
+        return False
+    with open(path, 'rb') as f:
+        base = f.read()
+    with open(source, 'rb') as f:
+        delta = f.read()
+    merged = merge(base, delta, frame)
+
+    target = output or path
+    with open(target + ".tmp", 'wb') as f:
+        f.write(merged)
+    os.replace(target + ".tmp", target)
+    if output is None and frame is None:
+        os.remove(source)
+    return True
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Apply the position delta of an mmobj file")
+    parser.add_argument("path", help="the full mmobj file; its delta is path + %r" % DELTA_SUFFIX)
+    parser.add_argument("--output", default=None, help="write the merged file here instead of updating path")
+    parser.add_argument("--frame", type=int, default=None,
+                        help="apply this frame of the animation stream, path + %r" % ANIMATION_SUFFIX)
+    args = parser.parse_args(argv)
+
+    try:
+        merged = merge_file(args.path, args.output, args.frame)
+    except (OSError, DeltaError) as e:
+        sys.stderr.write("%s: %s\n" % (args.path, e))
+        return 1
+    if not merged:
+        sys.stderr.write("%s has no %s\n" % (args.path, "delta" if args.frame is None else "animation"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,12 +18,25 @@
 
 # <pep8 compliant>
 
+import copy
 import os
 import time
 
+import numpy as np
+
 import bpy
 import mathutils
 import bpy_extras.io_utils
+from bpy.app.handlers import persistent
+
+from .cache_mmobj import ArrayCache
+from .copy_mmobj import copy_textures
+from .delta_mmobj import animation_path
+from .snapshot_dat import (DECL_SUFFIX, IB_SUFFIX, VB_SUFFIX, SnapshotMesh, apply_xforms, encode, ib_bytes,
+                           read_decl, vb_bytes)
+from .vcache_mmobj import reorder_triangles
+from .weights_mmobj import BLEND_DROP_REPORT, BLEND_INFLUENCES, blend_index_table, top_blend_weights
+from .write_mmobj import AnimationWriter, BlockWriter, ChangedFile, DeltaWriter, PipelinedWriter
 
 
 def name_compat(name):
@@ -42,6 +55,670 @@ def mesh_triangulate(me):
     bm.free()
 
 
+def loop_triangles(me):
+    """
+    Returns the faces of me split into triangles of their own loops, as (polygon index, loop indices)
+    of every triangle, or None if the faces are all triangles already.  Blender's tessellation gives
+    the triangles of ngons, which are matched back to the polygon's loops; quads are split along their
+    shorter diagonal.  If that matching fails, me is triangulated with bmesh instead and None is
+    returned.
+    """
+    num_polys = len(me.polygons)
+    loop_total = np.empty(num_polys, dtype=np.int32)
+    me.polygons.foreach_get("loop_total", loop_total)
+    if (loop_total == 3).all():
+        return None
+
+    loop_start = np.empty(num_polys, dtype=np.int32)
+    me.polygons.foreach_get("loop_start", loop_start)
+    loop_vert = np.empty(len(me.loops), dtype=np.int32)
+    me.loops.foreach_get("vertex_index", loop_vert)
+
+    # polygons are tessellated in order, one face for triangles and quads and n-2 triangles otherwise
+    me.calc_tessface()
+    tess_count = np.where(loop_total <= 4, 1, loop_total - 2)
+    if len(me.tessfaces) != int(tess_count.sum()):
+        mesh_triangulate(me)
+        return None
+    tess_verts = np.empty(len(me.tessfaces) * 4, dtype=np.int32)
+    me.tessfaces.foreach_get("vertices_raw", tess_verts)
+    tess_verts.shape = (-1, 4)
+    tess_poly = np.repeat(np.arange(num_polys), tess_count)
+
+    # find the loop of every tessellated corner from its (polygon, vertex)
+    num_verts = len(me.vertices)
+    loop_keys = np.repeat(np.arange(num_polys, dtype=np.int64), loop_total) * num_verts + loop_vert
+    order = np.argsort(loop_keys, kind='mergesort')
+    sorted_keys = loop_keys[order]
+    corner_keys = tess_poly[:, None] * num_verts + tess_verts
+    pos = np.minimum(np.searchsorted(sorted_keys, corner_keys), len(sorted_keys) - 1)
+    corner_loops = order[pos]
+    is_quad = loop_total[tess_poly] == 4
+    found = sorted_keys[pos] == corner_keys
+    found[~is_quad, 3] = True
+    if not found.all():
+        mesh_triangulate(me)
+        return None
+
+    # triangles keep their loops as they are
+    is_tri = loop_total[tess_poly] == 3
+    corner_loops[is_tri, :3] = loop_start[tess_poly[is_tri], None] + np.arange(3)
+
+    co = np.empty(num_verts * 3, dtype=np.float32)
+    me.vertices.foreach_get("co", co)
+    co.shape = (num_verts, 3)
+    quads = corner_loops[is_quad]
+    quad_verts = loop_vert[quads]
+    diag02 = ((co[quad_verts[:, 0]] - co[quad_verts[:, 2]]) ** 2).sum(axis=1)
+    diag13 = ((co[quad_verts[:, 1]] - co[quad_verts[:, 3]]) ** 2).sum(axis=1)
+    split02 = (diag02 <= diag13)[:, None]
+    first = np.where(split02, quads[:, [0, 1, 2]], quads[:, [0, 1, 3]])
+    second = np.where(split02, quads[:, [0, 2, 3]], quads[:, [1, 2, 3]])
+
+    # quads give two triangles in a row, everything else one
+    per_face = np.where(is_quad, 2, 1)
+    face_starts = np.cumsum(per_face) - per_face
+    triangles = np.empty((int(per_face.sum()), 3), dtype=np.int64)
+    triangles[face_starts[~is_quad]] = corner_loops[~is_quad, :3]
+    triangles[face_starts[is_quad]] = first
+    triangles[face_starts[is_quad] + 1] = second
+    return np.repeat(tess_poly, per_face), triangles
+
+
+class MeshArrays:
+    """
+    The mesh data that the exporter needs, read with bulk foreach_get calls into flat typed arrays,
+    so that the later stages don't create an RNA wrapper for every vertex, face and loop.
+    uv and normals are per loop, and None unless asked for.
+    """
+    def __init__(self, me, use_uv=True, use_normals=True):
+        num_verts = len(me.vertices)
+        num_polys = len(me.polygons)
+        num_loops = len(me.loops)
+
+        self.co = np.empty(num_verts * 3, dtype=np.float32)
+        me.vertices.foreach_get("co", self.co)
+        self.co.shape = (num_verts, 3)
+
+        self.loop_start = np.empty(num_polys, dtype=np.int32)
+        me.polygons.foreach_get("loop_start", self.loop_start)
+        self.loop_total = np.empty(num_polys, dtype=np.int32)
+        me.polygons.foreach_get("loop_total", self.loop_total)
+        self.material_index = np.empty(num_polys, dtype=np.int32)
+        me.polygons.foreach_get("material_index", self.material_index)
+        self.use_smooth = np.empty(num_polys, dtype=bool)
+        me.polygons.foreach_get("use_smooth", self.use_smooth)
+
+        self.loop_vert = np.empty(num_loops, dtype=np.int32)
+        me.loops.foreach_get("vertex_index", self.loop_vert)
+
+        self.uv = None
+        if use_uv and len(me.uv_layers):
+            self.uv = np.empty(num_loops * 2, dtype=np.float32)
+            me.uv_layers.active.data.foreach_get("uv", self.uv)
+            self.uv.shape = (num_loops, 2)
+
+        # split normals must have been calculated already
+        self.normals = None
+        if use_normals:
+            self.normals = np.empty(num_loops * 3, dtype=np.float32)
+            me.loops.foreach_get("normal", self.normals)
+            self.normals.shape = (num_loops, 3)
+
+        # the polygon of me that every face came from
+        self.poly_index = np.arange(num_polys)
+
+    def apply_triangles(self, poly_index, triangles):
+        """
+        Replaces the faces with triangles of loop indices, as returned by loop_triangles.
+        The triangles get their loops' own data, so a triangle's corners are loops of their own.
+        """
+        corners = triangles.ravel()
+        self.loop_vert = self.loop_vert[corners]
+        if self.uv is not None:
+            self.uv = self.uv[corners]
+        if self.normals is not None:
+            self.normals = self.normals[corners]
+        self.loop_start = np.arange(0, len(corners), 3, dtype=np.int32)
+        self.loop_total = np.full(len(triangles), 3, dtype=np.int32)
+        self.material_index = self.material_index[poly_index]
+        self.use_smooth = self.use_smooth[poly_index]
+        self.poly_index = poly_index
+
+    def transformed(self, matrix):
+        """
+        Returns a copy with the positions and normals transformed by matrix, sharing the other arrays.
+        """
+        matrix = np.array([list(row) for row in matrix], dtype=np.float64)
+        arrays = copy.copy(self)
+        arrays.co = (self.co.dot(matrix[:3, :3].T) + matrix[:3, 3]).astype(np.float32)
+        if self.normals is not None:
+            normals = self.normals.dot(np.linalg.inv(matrix[:3, :3]))
+            lengths = np.sqrt((normals * normals).sum(axis=1))[:, None]
+            lengths[lengths == 0.0] = 1.0
+            arrays.normals = (normals / lengths).astype(np.float32)
+        return arrays
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.co, self.loop_start, self.loop_total, self.material_index,
+                                      self.use_smooth, self.loop_vert, self.uv, self.normals, self.poly_index)
+                   if a is not None)
+
+
+def ordered_loops(loop_start, loop_total, face_order):
+    """
+    Returns the indices of all loops, face by face in face_order.
+    """
+    starts = loop_start[face_order]
+    totals = loop_total[face_order]
+    offsets = np.cumsum(totals) - totals
+    return np.arange(int(totals.sum())) + np.repeat(starts - offsets, totals)
+
+
+def round_keys(values, ndigits=4):
+    """
+    Rounds an array the same way python's round(v, ndigits) does.  Scaling and rounding in numpy only
+    differs from it for values within float error of a half way case, so those are redone one by one.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    keys = np.rint(scaled) / scale
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    flat_keys = keys.reshape(-1)
+    flat_values = values.reshape(-1)
+    for i in ties.tolist():
+        flat_keys[i] = round(float(flat_values[i]), ndigits)
+    return keys
+
+
+def unique_rows(keys):
+    """
+    Numbers the distinct rows of keys in order of first appearance, as the dict based dedup would.
+    Returns the index of the first occurrence of each distinct row, and the number of every row.
+    -0.0 and 0.0 count as the same value.
+    """
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # np.unique only takes rows (axis=0) from numpy 1.13 on; sort them with lexsort instead, which is
+    # stable, so the first row of every run of equal rows is its first occurrence
+    keys = np.asarray(keys, dtype=np.float64).reshape(len(keys), -1) + 0.0
+    sorted_rows = np.lexsort(keys.T[::-1])
+    sorted_keys = keys[sorted_rows]
+    starts = np.ones(len(keys), dtype=bool)
+    starts[1:] = (sorted_keys[1:] != sorted_keys[:-1]).any(axis=1)
+    first = sorted_rows[starts]
+    inverse = np.empty(len(keys), dtype=np.int64)
+    inverse[sorted_rows] = np.cumsum(starts) - 1
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[inverse.reshape(-1)]
+
+
+def vertex_group_arrays(me):
+    """
+    Returns the vertex group memberships of me as flat arrays: the number of groups of every vertex,
+    and the group index and weight of every membership, vertex by vertex.  There is no bulk access
+    to these, so this is the one loop over the vertices.
+    """
+    counts = []
+    groups = []
+    weights = []
+    for vert in me.vertices:
+        vgroups = vert.groups
+        counts.append(len(vgroups))
+        for g in vgroups:
+            groups.append(g.group)
+            weights.append(g.weight)
+    return (np.array(counts, dtype=np.int64), np.array(groups, dtype=np.int64),
+            np.array(weights, dtype=np.float64))
+
+
+class ExtractedMesh:
+    """
+    What the exporter writes for one object, read from its evaluated mesh.  Holds no blender data, so
+    that it can be kept for later exports while the object doesn't change.
+    face_images has the image name of every face (None for faces without one), or is None without uvs.
+    group_arrays are the vertex group memberships as returned by vertex_group_arrays, or None.
+    """
+    def __init__(self, arrays, face_images, smooth_groups, material_names, loose_edges, group_names,
+                 group_arrays):
+        self.arrays = arrays
+        self.face_images = face_images
+        self.smooth_groups = smooth_groups
+        self.material_names = material_names
+        self.loose_edges = loose_edges
+        self.group_names = group_names
+        self.group_arrays = group_arrays
+
+    @property
+    def nbytes(self):
+        size = self.arrays.nbytes
+        if self.loose_edges is not None:
+            size += self.loose_edges.nbytes
+        if self.group_arrays is not None:
+            size += sum(a.nbytes for a in self.group_arrays)
+        # rough size of the per face lists
+        if self.face_images is not None:
+            size += 8 * len(self.face_images)
+        return size + 8 * len(self.smooth_groups)
+
+    def transformed(self, matrix):
+        """
+        Returns a copy of an object space mesh placed by matrix; only the positions and normals are new.
+        """
+        extracted = copy.copy(self)
+        extracted.arrays = self.arrays.transformed(matrix)
+        return extracted
+
+
+def extract_mesh(scene, ob, matrix, use_modifiers, use_triangles, use_uv, use_normals, use_edges,
+                 use_smooth_groups, use_smooth_groups_bitflags):
+    """
+    Evaluates ob, transformed by matrix, and returns an ExtractedMesh of it, or None if it has no mesh
+    or nothing to write.
+    """
+    try:
+        me = ob.to_mesh(scene, use_modifiers, 'PREVIEW', calc_tessface=False)
+    except RuntimeError:
+        me = None
+
+    if me is None:
+        return None
+
+    try:
+        me.transform(matrix)
+
+        # split into triangles of the mesh's own loops when the arrays are read, unless they are
+        # triangles already
+        triangles = loop_triangles(me) if use_triangles else None
+
+        face_images = None
+        if use_uv and len(me.uv_textures) > 0:
+            face_images = [tface.image.name if tface.image else None for tface in me.uv_textures.active.data]
+
+        num_edges = len(me.edges) if use_edges else 0
+        if not (len(me.polygons) + num_edges + len(me.vertices)):  # Make sure there is somthing to write
+            return None
+
+        if use_normals and len(me.polygons):
+            me.calc_normals_split()
+            # No need to call me.free_normals_split later, as this mesh is deleted anyway!
+
+        arrays = MeshArrays(me, face_images is not None, use_normals and len(me.polygons))
+        if triangles is not None:
+            arrays.apply_triangles(*triangles)
+            if face_images is not None:
+                face_images = [face_images[i] for i in arrays.poly_index.tolist()]
+
+        smooth_groups = ()
+        if (use_smooth_groups or use_smooth_groups_bitflags) and len(me.polygons):
+            smooth_groups, smooth_groups_tot = me.calc_smooth_groups(use_smooth_groups_bitflags)
+            if smooth_groups_tot <= 1:
+                smooth_groups = ()
+            else:
+                smooth_groups = [smooth_groups[i] for i in arrays.poly_index.tolist()]
+
+        loose_edges = None
+        if use_edges:
+            loose_edges = np.array([ed.vertices[:] for ed in me.edges if ed.is_loose], dtype=np.int64).reshape(-1, 2)
+
+        group_names = ob.vertex_groups.keys()
+        group_arrays = vertex_group_arrays(me) if group_names else None
+
+        return ExtractedMesh(arrays, face_images, smooth_groups, [m.name if m else None for m in me.materials],
+                             loose_edges, group_names, group_arrays)
+    finally:
+        # clean up
+        bpy.data.meshes.remove(me)
+
+
+# total size of the meshes kept between exports
+MESH_CACHE_BUDGET = 512 * 1024 * 1024
+
+# extracted meshes of recent exports, keyed by mesh_cache_key; entries of an object are dropped when
+# blender updates its data
+mesh_cache = ArrayCache(MESH_CACHE_BUDGET)
+
+
+def instance_key(ob, use_modifiers):
+    """
+    Instances with the same key have the same mesh in object space: objects without modifiers or shape
+    keys share it through their mesh datablock, vertex groups and materials, other objects only with
+    themselves.
+    """
+    me = ob.data
+    if (use_modifiers and len(ob.modifiers)) or me is None or getattr(me, "shape_keys", None) is not None:
+        return ob.name
+    return (me.as_pointer(), tuple(ob.vertex_groups.keys()),
+            tuple(slot.material.name if slot.material else None for slot in ob.material_slots))
+
+
+def modifier_settings(mod):
+    """
+    The values of a modifier's settings, with the datablocks it uses by name, and for an armature
+    modifier the pose and placement of its armature.
+    """
+    values = []
+    for prop in mod.bl_rna.properties:
+        if prop.identifier == 'rna_type' or prop.type == 'COLLECTION':
+            continue
+        value = getattr(mod, prop.identifier)
+        if prop.type == 'POINTER':
+            # nested settings structs aren't compared, only the datablocks it refers to
+            value = value.name if isinstance(value, bpy.types.ID) else None
+        elif prop.type == 'ENUM' and prop.is_enum_flag:
+            value = tuple(sorted(value))
+        elif getattr(prop, "array_length", 0):
+            value = tuple(np.asarray(value, dtype=np.float64).ravel().tolist())
+        values.append(value)
+    if mod.type == 'ARMATURE' and mod.object is not None and mod.object.pose is not None:
+        values.append(tuple(tuple(row) for row in mod.object.matrix_world))
+        values.append(tuple(tuple(tuple(row) for row in bone.matrix_basis) for bone in mod.object.pose.bones))
+    return tuple(values)
+
+
+def mesh_cache_key(ob, matrix, options):
+    """
+    The cache key of ob's mesh: the object and mesh datablock, the settings of its modifier stack, the
+    matrix it is exported with and the export options that change what is read.  Edits of the mesh
+    itself only reach the cache through mesh_cache_update.
+    """
+    modifiers = tuple((mod.name, mod.type, modifier_settings(mod)) for mod in ob.modifiers)
+    data = ob.data.as_pointer() if ob.data is not None else 0
+    return (ob.name, data, modifiers, tuple(tuple(row) for row in matrix), tuple(options))
+
+
+def forget_object(name):
+    mesh_cache.discard_if(lambda key: key[0] == name)
+
+
+@persistent
+def mesh_cache_update(scene):
+    if not len(mesh_cache):
+        return
+    for name in {key[0] for key in mesh_cache.keys()}:
+        ob = scene.objects.get(name)
+        # objects of other scenes, like the sources of dupli groups, get no update flags here, so their
+        # edits would go unseen
+        if ob is None or ob.is_updated_data or (ob.data is not None and ob.data.is_updated):
+            forget_object(name)
+
+
+@persistent
+def mesh_cache_clear(*args):
+    # datablocks are reallocated on undo and file load
+    mesh_cache.clear()
+
+
+CACHE_HANDLERS = (
+    (bpy.app.handlers.scene_update_post, mesh_cache_update),
+    (bpy.app.handlers.undo_post, mesh_cache_clear),
+    (bpy.app.handlers.redo_post, mesh_cache_clear),
+    (bpy.app.handlers.load_post, mesh_cache_clear),
+)
+
+
+def add_cache_handlers():
+    for handlers, func in CACHE_HANDLERS:
+        if func not in handlers:
+            handlers.append(func)
+
+
+def remove_cache_handlers():
+    for handlers, func in CACHE_HANDLERS:
+        if func in handlers:
+            handlers.remove(func)
+    mesh_cache.clear()
+
+
+# custom property of the objects that are exported again whenever they change; holds the target
+# filepath and the export options
+AUTO_EXPORT_PROPERTY = "mmobj_auto_export"
+
+# name of every tracked object: its target filepath
+auto_export_objects = {}
+
+# target filepath: time of the latest change that isn't exported yet
+auto_export_changes = {}
+
+# set during an auto export, so that the updates it causes itself aren't taken as changes
+auto_export_running = False
+
+
+def object_changed(ob):
+    """
+    Whether blender updated ob's transform, geometry, vertex weights or materials in this scene update.
+    """
+    if ob.is_updated or ob.is_updated_data:
+        return True
+    if ob.data is not None and ob.data.is_updated:
+        return True
+    return any(slot.material is not None and slot.material.is_updated for slot in ob.material_slots)
+
+
+@persistent
+def auto_export_update(scene):
+    if auto_export_running:
+        return
+    now = time.time()
+    for name, filepath in auto_export_objects.items():
+        ob = scene.objects.get(name)
+        if ob is not None and object_changed(ob):
+            auto_export_changes[filepath] = now
+
+
+def start_auto_export(scene):
+    """
+    Starts tracking the objects of scene that have auto export options.
+    Returns the targets they are exported to.
+    """
+    auto_export_objects.clear()
+    auto_export_changes.clear()
+    for ob in scene.objects:
+        options = ob.get(AUTO_EXPORT_PROPERTY)
+        if options is not None:
+            auto_export_objects[ob.name] = options["filepath"]
+    if auto_export_update not in bpy.app.handlers.scene_update_post:
+        bpy.app.handlers.scene_update_post.append(auto_export_update)
+    return sorted(set(auto_export_objects.values()))
+
+
+def stop_auto_export():
+    if auto_export_update in bpy.app.handlers.scene_update_post:
+        bpy.app.handlers.scene_update_post.remove(auto_export_update)
+    auto_export_objects.clear()
+    auto_export_changes.clear()
+
+
+def due_auto_exports(delay):
+    """
+    Returns the targets whose latest change is at least delay seconds old, and forgets their changes.
+    """
+    now = time.time()
+    due = sorted(filepath for filepath, changed in auto_export_changes.items() if now - changed >= delay)
+    for filepath in due:
+        del auto_export_changes[filepath]
+    return due
+
+
+def auto_export(context, filepath):
+    """
+    Exports the tracked objects whose target is filepath, with the options stored on them.  Objects that
+    didn't change since the last export aren't read again, and an unchanged file isn't rewritten.
+    """
+    global auto_export_running
+
+    scene = context.scene
+    objects = [scene.objects[name] for name, target in sorted(auto_export_objects.items())
+               if target == filepath and name in scene.objects]
+    if not objects:
+        return
+
+    keywords = objects[0][AUTO_EXPORT_PROPERTY].to_dict()
+    # the game only reads the mmobj, so it is always written whole; older options may ask for a delta
+    keywords.pop("delta_mode", None)
+    global_matrix = (mathutils.Matrix.Scale(keywords.pop("global_scale"), 4) *
+                     bpy_extras.io_utils.axis_conversion(to_forward=keywords.pop("axis_forward"),
+                                                         to_up=keywords.pop("axis_up"),
+                                                         ).to_4x4())
+    auto_export_running = True
+    try:
+        save(None, context, global_matrix=global_matrix, objects=objects, use_cache=True, **keywords)
+    finally:
+        auto_export_running = False
+
+
+# decimals of the positions, uvs, normals and blend weights written, unless the number style is SHORTEST
+DEFAULT_DECIMALS = (6, 6, 6, 6)
+
+
+class RowFormats:
+    """
+    The formats of the rows of floats an export writes, with the decimals chosen for each kind.
+    """
+    def __init__(self, decimals=DEFAULT_DECIMALS):
+        position, uv, normal, weight = decimals
+        self.position = 'v' + (' %%.%df' % position) * 3 + '\n'
+        self.uv = 'vt' + (' %%.%df' % uv) * 2 + '\n'
+        self.normal = 'vn' + (' %%.%df' % normal) * 3 + '\n'
+        self.blend_pair = ' %%d/%%0.%df' % weight
+
+    def delta(self, mode):
+        """
+        The rows that a delta export may write on their own, for an EXPORT_DELTA mode.
+        """
+        if mode == 'POSITIONS':
+            return (self.position,)
+        return (self.position, self.normal)
+
+
+class BufferExport:
+    """
+    Collects the faces an export writes, and packs them into the vertex layout of a snapshot's
+    _VBDecl.dat, as the runtime would fill the mod's vertex buffer from the mmobj.  Corners with the same
+    position, uv and normal share a vertex, numbered by first use; faces are split into triangle fans.
+    With vertex_cache, the triangles of the index buffer are reordered for a GPU's vertex cache (see
+    vcache_mmobj).
+    """
+    def __init__(self, decl_path, vertex_cache=False):
+        self.decl_path = decl_path
+        self.vertex_cache = vertex_cache
+        self.elements = read_decl(decl_path)
+        self.pos_xforms = []
+        self.uv_xforms = []
+        self._objects = []
+
+    def add(self, positions, uvs, normals, blend_index, blend_weight, corners, face_totals):
+        """
+        Adds the faces of one object.  corners holds the position, uv and normal row of every corner,
+        face by face; uvs, normals and the blend arrays may be None.
+        """
+        self._objects.append((positions, uvs, normals, blend_index, blend_weight, corners, face_totals))
+
+    def add_xforms(self, pos_xforms, uv_xforms):
+        # the runtime reverses every transform named in the file, once
+        for xform in pos_xforms:
+            if xform not in self.pos_xforms:
+                self.pos_xforms.append(xform)
+        for xform in uv_xforms:
+            if xform not in self.uv_xforms:
+                self.uv_xforms.append(xform)
+
+    def mesh(self):
+        """
+        Returns the collected faces as a SnapshotMesh of unique vertices, in the space the game draws.
+        """
+        has_uvs = any(obj[1] is not None for obj in self._objects)
+        has_normals = any(obj[2] is not None for obj in self._objects)
+        has_blend = any(obj[3] is not None for obj in self._objects)
+
+        positions, uvs, normals, blend_indices, blend_weights = [], [], [], [], []
+        keys, totals = [], []
+        num_positions = num_uvs = num_normals = 0
+        for obj_positions, obj_uvs, obj_normals, blend_index, blend_weight, corners, face_totals in self._objects:
+            # missing rows are all zero, with every corner on the one row
+            if obj_uvs is None:
+                obj_uvs = np.zeros((1, 2))
+            if obj_normals is None:
+                obj_normals = np.zeros((1, 3))
+            if blend_index is None:
+                blend_index = np.zeros((len(obj_positions), BLEND_INFLUENCES), dtype=np.int64)
+                blend_weight = np.zeros((len(obj_positions), BLEND_INFLUENCES))
+                blend_weight[:, 0] = 1.0
+            positions.append(obj_positions)
+            uvs.append(obj_uvs)
+            normals.append(obj_normals)
+            blend_indices.append(blend_index)
+            blend_weights.append(blend_weight)
+            keys.append(corners + [num_positions, num_uvs, num_normals])
+            totals.append(face_totals)
+            num_positions += len(obj_positions)
+            num_uvs += len(obj_uvs)
+            num_normals += len(obj_normals)
+
+        keys = np.concatenate(keys) if keys else np.zeros((0, 3), dtype=np.int64)
+        totals = np.concatenate(totals) if totals else np.zeros(0, dtype=np.int64)
+        first, vertex_ids = unique_rows(keys)
+        vertex_keys = keys[first]
+
+        mesh = SnapshotMesh()
+        mesh.elements = self.elements
+        mesh.positions = np.concatenate(positions).astype(np.float32)[vertex_keys[:, 0]]
+        if has_uvs:
+            mesh.uvs = np.concatenate(uvs).astype(np.float32)[vertex_keys[:, 1]]
+        if has_normals:
+            mesh.normals = np.concatenate(normals).astype(np.float32)[vertex_keys[:, 2]]
+        if has_blend:
+            mesh.blend_indices = np.concatenate(blend_indices).astype(np.uint8)[vertex_keys[:, 0]]
+            weights = np.concatenate(blend_weights).astype(np.float32)[vertex_keys[:, 0]]
+            # as MeshUtil.readObj does: the game needs weights that sum to one
+            missing = np.float32(1.0) - weights.sum(axis=1)
+            weights[:, 0] += np.maximum(missing, 0.0)
+            mesh.blend_weights = weights
+
+        # a fan of every face: its first corner, then each following pair
+        num_tris = np.maximum(totals - 2, 0)
+        face_start = np.repeat(np.cumsum(totals) - totals, num_tris)
+        rank = np.arange(int(num_tris.sum())) - np.repeat(np.cumsum(num_tris) - num_tris, num_tris)
+        fans = np.column_stack((face_start, face_start + rank + 1, face_start + rank + 2))
+        mesh.triangles = vertex_ids[fans]
+        if self.vertex_cache:
+            mesh.triangles, before, after = reorder_triangles(mesh.triangles, len(mesh.positions))
+            print("%s: index buffer vertex cache miss ratio %.3f, %.3f with the triangles reordered"
+                  % (os.path.basename(self.decl_path), before, after))
+
+        apply_xforms(mesh, [x.encode("utf8") for x in self.pos_xforms], [x.encode("utf8") for x in self.uv_xforms],
+                     reverse=True)
+        return mesh
+
+    def write(self, filepath, reverse_normals=False):
+        """
+        Writes the _VB.dat and _IB.dat files for the mmobj at filepath, and a copy of the declaration
+        as its _VBDecl.dat.  Files that already hold the same bytes are kept.
+        """
+        mesh = self.mesh()
+        vertices = encode(self.elements, mesh, reverse_normals)
+        base = os.path.splitext(filepath)[0]
+        with open(self.decl_path, 'rb') as f:
+            decl = f.read()
+        outputs = [(base + VB_SUFFIX, vb_bytes(vertices)), (base + IB_SUFFIX, ib_bytes(mesh.triangles, len(vertices)))]
+        if os.path.abspath(self.decl_path) != os.path.abspath(base + DECL_SUFFIX):
+            outputs.append((base + DECL_SUFFIX, decl))
+        for path, data in outputs:
+            out = ChangedFile(path)
+            try:
+                out.write(data)
+            except Exception:
+                out.discard()
+                raise
+            out.close()
+        print("OBJ Export: packed %d vertices and %d triangles into %r" % (len(vertices), len(mesh.triangles),
+                                                                          base + VB_SUFFIX))
+
+
 def write_mtl(scene, filepath, path_mode, copy_set, mtl_dict):
     from mathutils import Color
 
@@ -54,115 +731,123 @@ def write_mtl(scene, filepath, path_mode, copy_set, mtl_dict):
     source_dir = os.path.dirname(bpy.data.filepath)
     dest_dir = os.path.dirname(filepath)
 
-    file = open(filepath, "w", encoding="utf8", newline="\n")
-    fw = file.write
+    file = ChangedFile(filepath)
 
-    fw('# Blender MTL File: %r\n' % (os.path.basename(bpy.data.filepath) or "None"))
-    fw('# Material Count: %i\n' % len(mtl_dict))
+    def fw(text):
+        file.write(text.encode("utf8"))
 
-    mtl_dict_values = list(mtl_dict.values())
-    mtl_dict_values.sort(key=lambda m: m[0])
+    try:
+        fw('# Blender MTL File: %r\n' % (os.path.basename(bpy.data.filepath) or "None"))
+        fw('# Material Count: %i\n' % len(mtl_dict))
 
-    # Write material/image combinations we have used.
-    # Using mtl_dict.values() directly gives un-predictable order.
-    for mtl_mat_name, mat, face_img in mtl_dict_values:
+        mtl_dict_values = list(mtl_dict.values())
+        mtl_dict_values.sort(key=lambda m: m[0])
 
-        # Get the Blender data for the material and the image.
-        # Having an image named None will make a bug, dont do it :)
+        # Write material/image combinations we have used.
+        # Using mtl_dict.values() directly gives un-predictable order.
+        for mtl_mat_name, mat, face_img in mtl_dict_values:
 
-        fw('\nnewmtl %s\n' % mtl_mat_name)  # Define a new material: matname_imgname
+            # Get the Blender data for the material and the image.
+            # Having an image named None will make a bug, dont do it :)
+
+            fw('\nnewmtl %s\n' % mtl_mat_name)  # Define a new material: matname_imgname
+
+            if mat:
+                # convert from blenders spec to 0 - 1000 range.
+                if mat.specular_shader == 'WARDISO':
+                    tspec = (0.4 - mat.specular_slope) / 0.0004
+                else:
+                    tspec = (mat.specular_hardness - 1) * 1.9607843137254901
+                fw('Ns %.6f\n' % tspec)
+                del tspec
+
+                fw('Ka %.6f %.6f %.6f\n' % (mat.ambient * world_amb)[:])  # Ambient, uses mirror color,
+                fw('Kd %.6f %.6f %.6f\n' % (mat.diffuse_intensity * mat.diffuse_color)[:])  # Diffuse
+                fw('Ks %.6f %.6f %.6f\n' % (mat.specular_intensity * mat.specular_color)[:])  # Specular
+                if hasattr(mat, "raytrace_transparency") and hasattr(mat.raytrace_transparency, "ior"):
+                    fw('Ni %.6f\n' % mat.raytrace_transparency.ior)  # Refraction index
+                else:
+                    fw('Ni %.6f\n' % 1.0)
+                fw('d %.6f\n' % mat.alpha)  # Alpha (obj uses 'd' for dissolve)
+
+                # 0 to disable lighting, 1 for ambient & diffuse only (specular color set to black), 2 for full lighting.
+                if mat.use_shadeless:
+                    fw('illum 0\n')  # ignore lighting
+                elif mat.specular_intensity == 0:
+                    fw('illum 1\n')  # no specular.
+                else:
+                    fw('illum 2\n')  # light normaly
 
-        if mat:
-            # convert from blenders spec to 0 - 1000 range.
-            if mat.specular_shader == 'WARDISO':
-                tspec = (0.4 - mat.specular_slope) / 0.0004
-            else:
-                tspec = (mat.specular_hardness - 1) * 1.9607843137254901
-            fw('Ns %.6f\n' % tspec)
-            del tspec
-
-            fw('Ka %.6f %.6f %.6f\n' % (mat.ambient * world_amb)[:])  # Ambient, uses mirror color,
-            fw('Kd %.6f %.6f %.6f\n' % (mat.diffuse_intensity * mat.diffuse_color)[:])  # Diffuse
-            fw('Ks %.6f %.6f %.6f\n' % (mat.specular_intensity * mat.specular_color)[:])  # Specular
-            if hasattr(mat, "raytrace_transparency") and hasattr(mat.raytrace_transparency, "ior"):
-                fw('Ni %.6f\n' % mat.raytrace_transparency.ior)  # Refraction index
-            else:
-                fw('Ni %.6f\n' % 1.0)
-            fw('d %.6f\n' % mat.alpha)  # Alpha (obj uses 'd' for dissolve)
-
-            # 0 to disable lighting, 1 for ambient & diffuse only (specular color set to black), 2 for full lighting.
-            if mat.use_shadeless:
-                fw('illum 0\n')  # ignore lighting
-            elif mat.specular_intensity == 0:
-                fw('illum 1\n')  # no specular.
             else:
+                #write a dummy material here?
+                fw('Ns 0\n')
+                fw('Ka %.6f %.6f %.6f\n' % world_amb[:])  # Ambient, uses mirror color,
+                fw('Kd 0.8 0.8 0.8\n')
+                fw('Ks 0.8 0.8 0.8\n')
+                fw('d 1\n')  # No alpha
                 fw('illum 2\n')  # light normaly
 
-        else:
-            #write a dummy material here?
-            fw('Ns 0\n')
-            fw('Ka %.6f %.6f %.6f\n' % world_amb[:])  # Ambient, uses mirror color,
-            fw('Kd 0.8 0.8 0.8\n')
-            fw('Ks 0.8 0.8 0.8\n')
-            fw('d 1\n')  # No alpha
-            fw('illum 2\n')  # light normaly
-
-        # Write images!
-        if face_img:  # We have an image on the face!
-            filepath = face_img.filepath
-            if filepath:  # may be '' for generated images
-                # write relative image path
-                filepath = bpy_extras.io_utils.path_reference(filepath, source_dir, dest_dir,
-                                                              path_mode, "", copy_set, face_img.library)
-                fw('map_Kd %s\n' % filepath)  # Diffuse mapping image
-                del filepath
-            else:
-                # so we write the materials image.
-                face_img = None
-
-        if mat:  # No face image. if we havea material search for MTex image.
-            image_map = {}
-            # backwards so topmost are highest priority
-            for mtex in reversed(mat.texture_slots):
-                if mtex and mtex.texture and mtex.texture.type == 'IMAGE':
-                    image = mtex.texture.image
-                    if image:
-                        # texface overrides others
-                        if      (mtex.use_map_color_diffuse and
-                                (face_img is None) and
-                                (mtex.use_map_warp is False) and
-                                (mtex.texture_coords != 'REFLECTION')):
-                            image_map["map_Kd"] = image
-                        if mtex.use_map_ambient:
-                            image_map["map_Ka"] = image
-                        # this is the Spec intensity channel but Ks stands for specular Color
-                        '''
-                        if mtex.use_map_specular:
-                            image_map["map_Ks"] = image
-                        '''
-                        if mtex.use_map_color_spec:  # specular color
-                            image_map["map_Ks"] = image
-                        if mtex.use_map_hardness:  # specular hardness/glossiness
-                            image_map["map_Ns"] = image
-                        if mtex.use_map_alpha:
-                            image_map["map_d"] = image
-                        if mtex.use_map_translucency:
-                            image_map["map_Tr"] = image
-                        if mtex.use_map_normal:
-                            image_map["map_Bump"] = image
-                        if mtex.use_map_displacement:
-                            image_map["disp"] = image                      
-                        if mtex.use_map_color_diffuse and (mtex.texture_coords == 'REFLECTION'):
-                            image_map["refl"] = image
-                        if mtex.use_map_emit:
-                            image_map["map_Ke"] = image
-
-            for key, image in sorted(image_map.items()):
-                filepath = bpy_extras.io_utils.path_reference(image.filepath, source_dir, dest_dir,
-                                                              path_mode, "", copy_set, image.library)
-                fw('%s %s\n' % (key, repr(filepath)[1:-1]))
+            # Write images!
+            if face_img:  # We have an image on the face!
+                filepath = face_img.filepath
+                if filepath:  # may be '' for generated images
+                    # write relative image path
+                    filepath = bpy_extras.io_utils.path_reference(filepath, source_dir, dest_dir,
+                                                                  path_mode, "", copy_set, face_img.library)
+                    fw('map_Kd %s\n' % filepath)  # Diffuse mapping image
+                    del filepath
+                else:
+                    # so we write the materials image.
+                    face_img = None
+
+            if mat:  # No face image. if we havea material search for MTex image.
+                image_map = {}
+                # backwards so topmost are highest priority
+                for mtex in reversed(mat.texture_slots):
+                    if mtex and mtex.texture and mtex.texture.type == 'IMAGE':
+                        image = mtex.texture.image
+                        if image:
+                            # texface overrides others
+                            if      (mtex.use_map_color_diffuse and
+                                    (face_img is None) and
+                                    (mtex.use_map_warp is False) and
+                                    (mtex.texture_coords != 'REFLECTION')):
+                                image_map["map_Kd"] = image
+                            if mtex.use_map_ambient:
+                                image_map["map_Ka"] = image
+                            # this is the Spec intensity channel but Ks stands for specular Color
+                            '''
+                            if mtex.use_map_specular:
+                                image_map["map_Ks"] = image
+                            '''
+                            if mtex.use_map_color_spec:  # specular color
+                                image_map["map_Ks"] = image
+                            if mtex.use_map_hardness:  # specular hardness/glossiness
+                                image_map["map_Ns"] = image
+                            if mtex.use_map_alpha:
+                                image_map["map_d"] = image
+                            if mtex.use_map_translucency:
+                                image_map["map_Tr"] = image
+                            if mtex.use_map_normal:
+                                image_map["map_Bump"] = image
+                            if mtex.use_map_displacement:
+                                image_map["disp"] = image                      
+                            if mtex.use_map_color_diffuse and (mtex.texture_coords == 'REFLECTION'):
+                                image_map["refl"] = image
+                            if mtex.use_map_emit:
+                                image_map["map_Ke"] = image
+
+                for key, image in sorted(image_map.items()):
+                    filepath = bpy_extras.io_utils.path_reference(image.filepath, source_dir, dest_dir,
+                                                                  path_mode, "", copy_set, image.library)
+                    fw('%s %s\n' % (key, repr(filepath)[1:-1]))
+    except Exception:
+        file.discard()
+        raise
 
     file.close()
+    if not file.changed:
+        print("MTL Export: %r is unchanged, kept the existing file" % file.path)
 
 
 def test_nurbs_compat(ob):
@@ -259,24 +944,62 @@ def write_file(filepath, objects, scene,
                EXPORT_CURVE_AS_NURBS=True,
                EXPORT_GLOBAL_MATRIX=None,
                EXPORT_PATH_MODE='AUTO',
+               EXPORT_BACKGROUND=False,
+               on_done=None,
+               EXPORT_CACHE=False,
+               EXPORT_TEXTURE_LINK='COPY',
+               EXPORT_DELTA='OFF',
+               writer=None,
+               EXPORT_NUMBER_STYLE='FIXED',
+               EXPORT_DECIMALS=DEFAULT_DECIMALS,
+               EXPORT_BLEND_PADDING=True,
+               EXPORT_BUFFER_DECL='',
+               EXPORT_REVERSE_NORMALS=False,
+               EXPORT_VERTEX_CACHE=False,
                ):
     """
     Basic write function. The context and options must be already set
     This can be accessed externaly
     eg.
     write( 'c:\\test\\foobar.obj', Blender.Object.GetSelected() ) # Using default options.
+
+    With EXPORT_BACKGROUND the file is formatted and written on worker threads, and this returns as
+    soon as the meshes have been read; on_done(error) is called on a worker thread when it is written.
+    Returns the writer, whose wait() gives the error, if any.
+
+    With EXPORT_CACHE, the data read from each object is kept, and reused by later exports until blender
+    updates the object.
+
+    The .mmobj and .mtl files are only replaced when their content changed.
+    Textures are only copied when they changed since the last export into the same directory;
+    EXPORT_TEXTURE_LINK can make them hard links or reflinks instead of copies.
+
+    With EXPORT_DELTA 'POSITIONS' or 'NORMALS', an export that only changed the positions (and the
+    normals) since the last full export to filepath in this session only writes those, to a delta next
+    to the file (see delta_mmobj).  The file is written on the calling thread then.  With 'POSITIONS',
+    a move that changes the exported normals writes the whole file, as exports with normals mostly do.
+
+    EXPORT_NUMBER_STYLE is how floats are written, one of format_mmobj.NUMBER_STYLES, and EXPORT_DECIMALS
+    the decimals of positions, uvs, normals and blend weights for the styles that round.  Without
+    EXPORT_BLEND_PADDING, #vbld lines only list the influences a vertex has, instead of always four;
+    the game's reader can't load that.
+
+    EXPORT_BUFFER_DECL, if set, is the _VBDecl.dat of the reference the mod replaces; the exported faces
+    are then also packed into that vertex layout, in _VB.dat and _IB.dat files next to the mmobj (see
+    BufferExport).  EXPORT_REVERSE_NORMALS writes their byte normals as the ReverseNormals game profile
+    setting does.
+
+    With EXPORT_VERTEX_CACHE, the triangles of that _IB.dat are reordered for the GPU's vertex cache.
+    The mmobj keeps its face order: the game draws mods without an index buffer, so no order of them
+    reuses a transformed vertex.
+
+    writer, if given, takes the output instead of a new writer for filepath.
     """
 
     if EXPORT_GLOBAL_MATRIX is None:
         EXPORT_GLOBAL_MATRIX = mathutils.Matrix()
 
-    def veckey3d(v):
-        return round(v.x, 4), round(v.y, 4), round(v.z, 4)
-
-    def veckey2d(v):
-        return round(v[0], 4), round(v[1], 4)
-
-    def findVertexGroupName(face, vWeightMap):
+    def findVertexGroupName(face_verts, vWeightMap):
         """
         Searches the vertexDict to see what groups is assigned to a given face.
         We use a frequency system in order to sort out the name because a given vetex can
@@ -286,7 +1009,7 @@ def write_file(filepath, objects, scene,
         of vertices is the face's group
         """
         weightDict = {}
-        for vert_index in face.vertices:
+        for vert_index in face_verts:
             vWeights = vWeightMap[vert_index]
             for vGroupName, weight in vWeights:
                 weightDict[vGroupName] = weightDict.get(vGroupName, 0.0) + weight
@@ -300,8 +1023,19 @@ def write_file(filepath, objects, scene,
 
     time1 = time.time()
 
-    file = open(filepath, "w", encoding="utf8", newline="\n")
-    fw = file.write
+    row_formats = RowFormats(EXPORT_DECIMALS)
+    buffers = BufferExport(EXPORT_BUFFER_DECL, EXPORT_VERTEX_CACHE) if EXPORT_BUFFER_DECL else None
+    if writer is not None:
+        out = writer
+        EXPORT_BACKGROUND = False
+    elif EXPORT_DELTA != 'OFF':
+        out = DeltaWriter(filepath, row_formats.delta(EXPORT_DELTA), on_done, style=EXPORT_NUMBER_STYLE)
+        EXPORT_BACKGROUND = False
+    elif EXPORT_BACKGROUND:
+        out = PipelinedWriter(filepath, on_done, style=EXPORT_NUMBER_STYLE)
+    else:
+        out = BlockWriter(filepath, on_done, style=EXPORT_NUMBER_STYLE)
+    fw = out.write
 
     # Write Header
     fw('# Blender v%s OBJ File: %r\n' % (bpy.app.version_string, os.path.basename(bpy.data.filepath)))
@@ -315,8 +1049,6 @@ def write_file(filepath, objects, scene,
     # Initialize totals, these are updated each object
     totverts = totuvco = totno = 1
 
-    face_vert_index = 1
-
     # A Dict of Materials
     # (material.name, image.name):matname_imagename # matname_imagename has gaps removed.
     mtl_dict = {}
@@ -331,437 +1063,410 @@ def write_file(filepath, objects, scene,
     indexedGroupDict = {}
     indexedGroupList = []
 
-    # Get all meshes
-    for ob_main in objects:
-
-        # ignore dupli children
-        if ob_main.parent and ob_main.parent.dupli_type in {'VERTS', 'FACES'}:
-            # XXX
-            print(ob_main.name, 'is a dupli child - ignoring')
-            continue
-
-        obs = []
-        if ob_main.dupli_type != 'NONE':
-            # XXX
-            print('creating dupli_list on', ob_main.name)
-            ob_main.dupli_list_create(scene)
-
-            obs = [(dob.object, dob.matrix) for dob in ob_main.dupli_list]
-
-            # XXX debug print
-            print(ob_main.name, 'has', len(obs), 'dupli children')
-        else:
-            obs = [(ob_main, ob_main.matrix_world)]
-           
-        for ob, ob_mat in obs:
-            uv_unique_count = no_unique_count = 0
-
-            # Nurbs curve support
-            if EXPORT_CURVE_AS_NURBS and test_nurbs_compat(ob):
-                ob_mat = EXPORT_GLOBAL_MATRIX * ob_mat
-                totverts += write_nurb(fw, ob, ob_mat)
+    # export options that change what is read from a mesh
+    extract_options = (EXPORT_APPLY_MODIFIERS, EXPORT_TRI, EXPORT_UV, EXPORT_NORMALS, EXPORT_EDGES,
+                       EXPORT_SMOOTH_GROUPS, EXPORT_SMOOTH_GROUPS_BITFLAGS)
+    if EXPORT_CACHE:
+        add_cache_handlers()
+
+    def get_extracted(ob, matrix):
+        if EXPORT_CACHE:
+            cache_key = mesh_cache_key(ob, matrix, extract_options)
+            extracted = mesh_cache.get(cache_key)
+            if extracted is not None:
+                return extracted
+        extracted = extract_mesh(scene, ob, matrix, *extract_options)
+        if EXPORT_CACHE and extracted is not None:
+            mesh_cache.put(cache_key, extracted, extracted.nbytes)
+        return extracted
+
+    try:
+        # Get all meshes, in the order of their names, so the vertex group indices and materials are
+        # numbered the same way whatever order blender lists the objects in.
+        for ob_main in sorted(objects, key=lambda ob: ob.name):
+
+            # ignore dupli children
+            if ob_main.parent and ob_main.parent.dupli_type in {'VERTS', 'FACES'}:
+                # XXX
+                print(ob_main.name, 'is a dupli child - ignoring')
                 continue
-            # END NURBS
-
-            try:
-                me = ob.to_mesh(scene, EXPORT_APPLY_MODIFIERS, 'PREVIEW', calc_tessface=False)
-            except RuntimeError:
-                me = None
-
-            if me is None:
-                continue
-
-            me.transform(EXPORT_GLOBAL_MATRIX * ob_mat)
-
-            if EXPORT_TRI:
-                # _must_ do this first since it re-allocs arrays
-                mesh_triangulate(me)
-
-            if EXPORT_UV:
-                faceuv = len(me.uv_textures) > 0
-                if faceuv:
-                    uv_texture = me.uv_textures.active.data[:]
-                    uv_layer = me.uv_layers.active.data[:]
-            else:
-                faceuv = False
-
-            me_verts = me.vertices[:]
-
-            # Make our own list so it can be sorted to reduce context switching
-            face_index_pairs = [(face, index) for index, face in enumerate(me.polygons)]
-            # faces = [ f for f in me.tessfaces ]
-
-            if EXPORT_EDGES:
-                edges = me.edges
-            else:
-                edges = []
-
-            if not (len(face_index_pairs) + len(edges) + len(me.vertices)):  # Make sure there is somthing to write
-
-                # clean up
-                bpy.data.meshes.remove(me)
-
-                continue  # dont bother with this mesh.
-
-            if EXPORT_NORMALS and face_index_pairs:
-                me.calc_normals_split()
-                # No need to call me.free_normals_split later, as this mesh is deleted anyway!
-                loops = me.loops
-            else:
-                loops = []
 
-            if (EXPORT_SMOOTH_GROUPS or EXPORT_SMOOTH_GROUPS_BITFLAGS) and face_index_pairs:
-                smooth_groups, smooth_groups_tot = me.calc_smooth_groups(EXPORT_SMOOTH_GROUPS_BITFLAGS)
-                if smooth_groups_tot <= 1:
-                    smooth_groups, smooth_groups_tot = (), 0
-            else:
-                smooth_groups, smooth_groups_tot = (), 0
-
-            materials = me.materials[:]
-            material_names = [m.name if m else None for m in materials]
+            obs = []
+            instance_meshes = {}
+            if ob_main.dupli_type != 'NONE':
+                # XXX
+                print('creating dupli_list on', ob_main.name)
+                ob_main.dupli_list_create(scene)
 
-            # avoid bad index errors
-            if not materials:
-                materials = [None]
-                material_names = [name_compat(None)]
+                obs = [(dob.object, dob.matrix) for dob in ob_main.dupli_list]
 
-            # Sort by Material, then images
-            # so we dont over context switch in the obj file.
-            if EXPORT_KEEP_VERT_ORDER:
-                pass
+                # XXX debug print
+                print(ob_main.name, 'has', len(obs), 'dupli children')
             else:
-                if faceuv:
+                obs = [(ob_main, ob_main.matrix_world)]
+           
+            for ob, ob_mat in obs:
+                uv_unique_count = no_unique_count = 0
+                uv_rows = no_rows = blend_index = blend_weight = None
+
+                # Nurbs curve support
+                if EXPORT_CURVE_AS_NURBS and test_nurbs_compat(ob):
+                    ob_mat = EXPORT_GLOBAL_MATRIX * ob_mat
+                    totverts += write_nurb(fw, ob, ob_mat)
+                    continue
+                # END NURBS
+
+                if ob_main.dupli_type != 'NONE':
+                    # every unique mesh is read once in object space, and each instance only places it
+                    key = instance_key(ob, EXPORT_APPLY_MODIFIERS)
+                    if key not in instance_meshes:
+                        instance_meshes[key] = get_extracted(ob, mathutils.Matrix())
+                    extracted = instance_meshes[key]
+                    if extracted is not None:
+                        extracted = extracted.transformed(EXPORT_GLOBAL_MATRIX * ob_mat)
+                else:
+                    extracted = get_extracted(ob, EXPORT_GLOBAL_MATRIX * ob_mat)
+                if extracted is None:
+                    continue  # dont bother with this mesh.
+
+                arrays = extracted.arrays
+                face_images = extracted.face_images
+                faceuv = face_images is not None
+                smooth_groups = extracted.smooth_groups
+                num_verts = len(arrays.co)
+                loop_start = arrays.loop_start.tolist()
+                loop_total = arrays.loop_total.tolist()
+                loop_vert_arr = arrays.loop_vert.astype(np.int64)
+                loop_vert = arrays.loop_vert.tolist()
+
+                material_names = extracted.material_names
+                materials = [bpy.data.materials.get(name) if name is not None else None for name in material_names]
+
+                # avoid bad index errors
+                if not materials:
+                    materials = [None]
+                    material_names = [name_compat(None)]
+
+                # Sort by Material, then images
+                # so we dont over context switch in the obj file.
+                face_order = np.arange(len(loop_start))
+                if not EXPORT_KEEP_VERT_ORDER:
+                    # np.lexsort is stable and takes its most significant key last
+                    use_smooth = arrays.use_smooth
                     if smooth_groups:
-                        sort_func = lambda a: (a[0].material_index,
-                                               hash(uv_texture[a[1]].image),
-                                               smooth_groups[a[1]] if a[0].use_smooth else False)
+                        smooth_groups_arr = np.asarray(smooth_groups)
+                        if faceuv or len(materials) > 1:
+                            smooth_key = np.where(use_smooth, smooth_groups_arr, 0)
+                        else:
+                            smooth_key = np.where(use_smooth, smooth_groups_arr, smooth_groups_arr[0])
                     else:
-                        sort_func = lambda a: (a[0].material_index,
-                                               hash(uv_texture[a[1]].image),
-                                               a[0].use_smooth)
-                elif len(materials) > 1:
-                    if smooth_groups:
-                        sort_func = lambda a: (a[0].material_index,
-                                               smooth_groups[a[1]] if a[0].use_smooth else False)
+                        smooth_key = use_smooth
+
+                    if faceuv:
+                        # rank of the image name, unlike hash() the same in every session
+                        _, image_key = np.unique(["" if name is None else name for name in face_images],
+                                                 return_inverse=True)
+                        sort_keys = (smooth_key, image_key, arrays.material_index)
+                    elif len(materials) > 1:
+                        sort_keys = (smooth_key, arrays.material_index)
                     else:
-                        sort_func = lambda a: (a[0].material_index,
-                                               a[0].use_smooth)
-                else:
-                    # no materials
-                    if smooth_groups:
-                        sort_func = lambda a: smooth_groups[a[1] if a[0].use_smooth else False]
+                        # no materials
+                        sort_keys = (smooth_key,)
+                    face_order = np.lexsort(sort_keys)
+                face_order = face_order.tolist()
+
+                # Set the default mat to no material and no image.
+                contextMat = 0, 0  # Can never be this, so we will label a new material the first chance we get.
+                contextSmooth = None  # Will either be true or false,  set bad to force initialization switch.
+
+                if EXPORT_BLEN_OBS or EXPORT_GROUP_BY_OB:
+                    name1 = ob.name
+                    name2 = ob.data.name
+                    if name1 == name2:
+                        obnamestring = name_compat(name1)
                     else:
-                        sort_func = lambda a: a[0].use_smooth
-
-                face_index_pairs.sort(key=sort_func)
-
-                del sort_func
-
-            # Set the default mat to no material and no image.
-            contextMat = 0, 0  # Can never be this, so we will label a new material the first chance we get.
-            contextSmooth = None  # Will either be true or false,  set bad to force initialization switch.
+                        obnamestring = '%s_%s' % (name_compat(name1), name_compat(name2))
 
-            if EXPORT_BLEN_OBS or EXPORT_GROUP_BY_OB:
-                name1 = ob.name
-                name2 = ob.data.name
-                if name1 == name2:
-                    obnamestring = name_compat(name1)
-                else:
-                    obnamestring = '%s_%s' % (name_compat(name1), name_compat(name2))
-
-                if EXPORT_BLEN_OBS:
-                    fw('o %s\n' % obnamestring)  # Write Object name
-                else:  # if EXPORT_GROUP_BY_OB:
-                    fw('g %s\n' % obnamestring)
-
-            # Vert
-            for v in me_verts:
-                fw('v %.6f %.6f %.6f\n' % v.co[:])
-
-            # UV
-            if faceuv:
-                # in case removing some of these dont get defined.
-                uv = f_index = uv_index = uv_key = uv_val = uv_ls = None
-
-                uv_face_mapping = [None] * len(face_index_pairs)
-
-                uv_dict = {}
-                uv_get = uv_dict.get
-                for f, f_index in face_index_pairs:
-                    uv_ls = uv_face_mapping[f_index] = []
-                    for uv_index, l_index in enumerate(f.loop_indices):
-                        uv = uv_layer[l_index].uv
-                        uv_key = veckey2d(uv)
-                        uv_val = uv_get(uv_key)
-                        if uv_val is None:
-                            uv_val = uv_dict[uv_key] = uv_unique_count
-                            fw('vt %.6f %.6f\n' % uv[:])
-                            uv_unique_count += 1
-                        uv_ls.append(uv_val)
-
-                del uv_dict, uv, f_index, uv_index, uv_ls, uv_get, uv_key, uv_val
-                # Only need uv_unique_count and uv_face_mapping
-
-            # NORMAL, Smooth/Non smoothed.
-            if EXPORT_NORMALS:
-                no_key = no_val = None
-                normals_to_idx = {}
-                no_get = normals_to_idx.get
-                loops_to_normals = [0] * len(loops)
-                for f, f_index in face_index_pairs:
-                    for l_idx in f.loop_indices:
-                        no_key = veckey3d(loops[l_idx].normal)
-                        no_val = no_get(no_key)
-                        if no_val is None:
-                            no_val = normals_to_idx[no_key] = no_unique_count
-                            fw('vn %.6f %.6f %.6f\n' % no_key)
-                            no_unique_count += 1
-                        loops_to_normals[l_idx] = no_val
-                del normals_to_idx, no_get, no_key, no_val
-            else:
-                loops_to_normals = []
-
-            if not faceuv:
-                f_image = None
+                    if EXPORT_BLEN_OBS:
+                        fw('o %s\n' % obnamestring)  # Write Object name
+                    else:  # if EXPORT_GROUP_BY_OB:
+                        fw('g %s\n' % obnamestring)
 
-            # XXX
-            if EXPORT_POLYGROUPS:
-                # Retrieve the list of vertex groups
-                vertGroupNames = ob.vertex_groups.keys()
-                if vertGroupNames:
-                    currentVGroup = ''
-                    # Create a dictionary keyed by face id and listing, for each vertex, the vertex groups it belongs to
-                    vgroupsMap = [[] for _i in range(len(me_verts))]
-                    for v_idx, v_ls in enumerate(vgroupsMap):
-                        v_ls[:] = [(vertGroupNames[g.group], g.weight) for g in me_verts[v_idx].groups]
-
-            for f, f_index in face_index_pairs:
-                f_smooth = f.use_smooth
-                if f_smooth and smooth_groups:
-                    f_smooth = smooth_groups[f_index]
-                f_mat = min(f.material_index, len(materials) - 1)
-
-                if faceuv:
-                    tface = uv_texture[f_index]
-                    f_image = tface.image
+                # Vert
+                out.write_rows(row_formats.position, arrays.co)
 
-                # MAKE KEY
-                if faceuv and f_image:  # Object is always true.
-                    key = material_names[f_mat], f_image.name
-                else:
-                    key = material_names[f_mat], None  # No image, use None instead.
+                if not faceuv:
+                    f_image = None
 
-                # Write the vertex group
+                # XXX
                 if EXPORT_POLYGROUPS:
+                    # Retrieve the list of vertex groups
+                    vertGroupNames = extracted.group_names
                     if vertGroupNames:
-                        # find what vertext group the face belongs to
-                        vgroup_of_face = findVertexGroupName(f, vgroupsMap)
-                        if vgroup_of_face != currentVGroup:
-                            currentVGroup = vgroup_of_face
-                            fw('g %s\n' % vgroup_of_face)
-
-                # CHECK FOR CONTEXT SWITCH
-                if key == contextMat:
-                    pass  # Context already switched, dont do anything
-                else:
-                    if key[0] is None and key[1] is None:
-                        # Write a null material, since we know the context has changed.
-                        if EXPORT_GROUP_BY_MAT:
-                            # can be mat_image or (null)
-                            fw("g %s_%s\n" % (name_compat(ob.name), name_compat(ob.data.name)))  # can be mat_image or (null)
-                        if EXPORT_MTL:
-                            fw("usemtl (null)\n")  # mat, image
-
+                        currentVGroup = ''
+                        # Create a dictionary keyed by face id and listing, for each vertex, the vertex groups it belongs to
+                        counts, groups, weights = extracted.group_arrays
+                        memberships = list(zip([vertGroupNames[g] for g in groups.tolist()], weights.tolist()))
+                        ends = np.cumsum(counts).tolist()
+                        vgroupsMap = [memberships[end - count:end] for end, count in zip(ends, counts.tolist())]
+                        del memberships
+
+                use_smooth = arrays.use_smooth.tolist()
+                material_index = arrays.material_index.tolist()
+
+                # lines that switch context, with the position in face_order of the face they go before;
+                # the faces between them are written in blocks afterwards
+                context_lines = []
+                for f_pos, f_index in enumerate(face_order):
+                    f_smooth = use_smooth[f_index]
+                    if f_smooth and smooth_groups:
+                        f_smooth = smooth_groups[f_index]
+                    f_mat = min(material_index[f_index], len(materials) - 1)
+
+                    if faceuv:
+                        f_image = face_images[f_index]
+
+                    # MAKE KEY
+                    if faceuv and f_image:  # Object is always true.
+                        key = material_names[f_mat], f_image
                     else:
-                        mat_data = mtl_dict.get(key)
-                        if not mat_data:
-                            # First add to global dict so we can export to mtl
-                            # Then write mtl
-
-                            # Make a new names from the mat and image name,
-                            # converting any spaces to underscores with name_compat.
-
-                            # If none image dont bother adding it to the name
-                            # Try to avoid as much as possible adding texname (or other things)
-                            # to the mtl name (see [#32102])...
-                            mtl_name = "%s" % name_compat(key[0])
-                            if mtl_rev_dict.get(mtl_name, None) not in {key, None}:
-                                if key[1] is None:
-                                    tmp_ext = "_NONE"
-                                else:
-                                    tmp_ext = "_%s" % name_compat(key[1])
-                                i = 0
-                                while mtl_rev_dict.get(mtl_name + tmp_ext, None) not in {key, None}:
-                                    i += 1
-                                    tmp_ext = "_%3d" % i
-                                mtl_name += tmp_ext
-                            mat_data = mtl_dict[key] = mtl_name, materials[f_mat], f_image
-                            mtl_rev_dict[mtl_name] = key
-
-                        if EXPORT_GROUP_BY_MAT:
-                            fw("g %s_%s_%s\n" % (name_compat(ob.name), name_compat(ob.data.name), mat_data[0]))  # can be mat_image or (null)
-                        if EXPORT_MTL:
-                            fw("usemtl %s\n" % mat_data[0])  # can be mat_image or (null)
-
-                contextMat = key
-                if f_smooth != contextSmooth:
-                    if f_smooth:  # on now off
-                        if smooth_groups:
-                            f_smooth = smooth_groups[f_index]
-                            fw('s %d\n' % f_smooth)
-                        else:
-                            fw('s 1\n')
-                    else:  # was off now on
-                        fw('s off\n')
-                    contextSmooth = f_smooth
-
-                #f_v = [(vi, me_verts[v_idx]) for vi, v_idx in enumerate(f.vertices)]
-                f_v = [(vi, me_verts[v_idx], l_idx) for vi, (v_idx, l_idx) in enumerate(zip(f.vertices, f.loop_indices))]
+                        key = material_names[f_mat], None  # No image, use None instead.
+
+                    f_loops = range(loop_start[f_index], loop_start[f_index] + loop_total[f_index])
+
+                    # Write the vertex group
+                    if EXPORT_POLYGROUPS:
+                        if vertGroupNames:
+                            # find what vertext group the face belongs to
+                            vgroup_of_face = findVertexGroupName([loop_vert[l_idx] for l_idx in f_loops], vgroupsMap)
+                            if vgroup_of_face != currentVGroup:
+                                currentVGroup = vgroup_of_face
+                                context_lines.append((f_pos, 'g %s\n' % vgroup_of_face))
+
+                    # CHECK FOR CONTEXT SWITCH
+                    if key == contextMat:
+                        pass  # Context already switched, dont do anything
+                    else:
+                        if key[0] is None and key[1] is None:
+                            # Write a null material, since we know the context has changed.
+                            if EXPORT_GROUP_BY_MAT:
+                                # can be mat_image or (null)
+                                context_lines.append((f_pos, "g %s_%s\n" % (name_compat(ob.name), name_compat(ob.data.name))))  # can be mat_image or (null)
+                            if EXPORT_MTL:
+                                context_lines.append((f_pos, "usemtl (null)\n"))  # mat, image
 
-                fw('f')
+                        else:
+                            mat_data = mtl_dict.get(key)
+                            if not mat_data:
+                                # First add to global dict so we can export to mtl
+                                # Then write mtl
+
+                                # Make a new names from the mat and image name,
+                                # converting any spaces to underscores with name_compat.
+
+                                # If none image dont bother adding it to the name
+                                # Try to avoid as much as possible adding texname (or other things)
+                                # to the mtl name (see [#32102])...
+                                mtl_name = "%s" % name_compat(key[0])
+                                if mtl_rev_dict.get(mtl_name, None) not in {key, None}:
+                                    if key[1] is None:
+                                        tmp_ext = "_NONE"
+                                    else:
+                                        tmp_ext = "_%s" % name_compat(key[1])
+                                    i = 0
+                                    while mtl_rev_dict.get(mtl_name + tmp_ext, None) not in {key, None}:
+                                        i += 1
+                                        tmp_ext = "_%3d" % i
+                                    mtl_name += tmp_ext
+                                image = bpy.data.images.get(key[1]) if key[1] is not None else None
+                                mat_data = mtl_dict[key] = mtl_name, materials[f_mat], image
+                                mtl_rev_dict[mtl_name] = key
+
+                            if EXPORT_GROUP_BY_MAT:
+                                context_lines.append((f_pos, "g %s_%s_%s\n" % (name_compat(ob.name), name_compat(ob.data.name), mat_data[0])))  # can be mat_image or (null)
+                            if EXPORT_MTL:
+                                context_lines.append((f_pos, "usemtl %s\n" % mat_data[0]))  # can be mat_image or (null)
+
+                    contextMat = key
+                    if f_smooth != contextSmooth:
+                        if f_smooth:  # on now off
+                            if smooth_groups:
+                                f_smooth = smooth_groups[f_index]
+                                context_lines.append((f_pos, 's %d\n' % f_smooth))
+                            else:
+                                context_lines.append((f_pos, 's 1\n'))
+                        else:  # was off now on
+                            context_lines.append((f_pos, 's off\n'))
+                        contextSmooth = f_smooth
+
+                # loops in the order their faces are written; vt and vn are numbered by first use
+                face_order_arr = np.asarray(face_order, dtype=np.int64)
+                loops_in_order = ordered_loops(arrays.loop_start, arrays.loop_total, face_order_arr)
+
+                # UV
                 if faceuv:
-                    if EXPORT_NORMALS:
-                        for vi, v, li in f_v:
-                            fw(" %d/%d/%d" %
-                                       (totverts + v.index,
-                                        totuvco + uv_face_mapping[f_index][vi],
-                                        totno + loops_to_normals[li],
-                                        ))  # vert, uv, normal
-                    else:  # No Normals
-                        for vi, v, li in f_v:
-                            fw(" %d/%d" % (
-                                       totverts + v.index,
-                                       totuvco + uv_face_mapping[f_index][vi],
-                                       ))  # vert, uv
-
-                    face_vert_index += len(f_v)
-
-                else:  # No UV's
-                    if EXPORT_NORMALS:
-                        for vi, v, li in f_v:
-                            fw(" %d//%d" % (totverts + v.index, totno + loops_to_normals[li]))
-                    else:  # No Normals
-                        for vi, v, li in f_v:
-                            fw(" %d" % (totverts + v.index))
-
-                fw('\n')
-
-            vertGroupNames = ob.vertex_groups.keys()
-            blendGroupPrefix = "Index."
-            posTransformPrefix = "PosTransform."
-            uvTransformPrefix = "UVTransform."
+                    # uv index of every loop
+                    first, uv_ids = unique_rows(round_keys(arrays.uv[loops_in_order]))
+                    loops_to_uvs = np.zeros(len(loop_vert), dtype=np.int64)
+                    loops_to_uvs[loops_in_order] = uv_ids
+                    uv_unique_count = len(first)
+                    uv_rows = arrays.uv[loops_in_order[first]]
+                    out.write_rows(row_formats.uv, uv_rows)
+                    del first, uv_ids
+                    # Only need uv_unique_count and loops_to_uvs
+
+                # NORMAL, Smooth/Non smoothed.
+                if EXPORT_NORMALS:
+                    loops_to_normals = np.zeros(len(loop_vert), dtype=np.int64)
+                    if arrays.normals is not None:
+                        no_keys = round_keys(arrays.normals[loops_in_order])
+                        first, no_ids = unique_rows(no_keys)
+                        loops_to_normals[loops_in_order] = no_ids
+                        no_unique_count = len(first)
+                        no_rows = no_keys[first]
+                        out.write_rows(row_formats.normal, no_rows)
+                        del no_keys, first, no_ids
+
+                if faceuv and EXPORT_NORMALS:
+                    corner_fmt = " %d/%d/%d"  # vert, uv, normal
+                    corners = (loop_vert_arr, totuvco + loops_to_uvs, totno + loops_to_normals)
+                elif faceuv:
+                    corner_fmt = " %d/%d"  # vert, uv
+                    corners = (loop_vert_arr, totuvco + loops_to_uvs)
+                elif EXPORT_NORMALS:
+                    corner_fmt = " %d//%d"
+                    corners = (loop_vert_arr, totno + loops_to_normals)
+                else:
+                    corner_fmt = " %d"
+                    corners = (loop_vert_arr,)
+                corners = np.column_stack([c[loops_in_order] for c in corners])
+                corners[:, 0] += totverts
+                face_totals = arrays.loop_total[face_order_arr]
+                face_corners = np.r_[0, np.cumsum(face_totals)]
+
+                f_pos = 0
+                for next_pos, text in context_lines + [(len(face_order), '')]:
+                    if next_pos > f_pos:
+                        out.write_lists('f', corner_fmt, face_totals[f_pos:next_pos],
+                                        corners[face_corners[f_pos]:face_corners[next_pos]])
+                        f_pos = next_pos
+                    fw(text)
+                del context_lines, corners
+
+                vertGroupNames = extracted.group_names
+                blendGroupPrefix = "Index."
+                posTransformPrefix = "PosTransform."
+                uvTransformPrefix = "UVTransform."
             
-            if vertGroupNames:
-                pos_xforms = []
-                uv_xforms = []
-                for gname in vertGroupNames:
-                    if gname.startswith(posTransformPrefix):
-                        pos_xforms.append(gname.replace(posTransformPrefix, ""))
-                    elif gname.startswith(uvTransformPrefix):
-                        uv_xforms.append(gname.replace(uvTransformPrefix, ""))
-
-                for gname in vertGroupNames:
-                    if (not (gname in indexedGroupDict)):
-                        indexedGroupList.append(gname)
-                        indexedGroupDict[gname] = len(indexedGroupList) - 1
-                        print("adding group " + gname + " to dict with index " + str(indexedGroupDict[gname]))
-
-                vertBlendLines = []
-                vertIndexLines = []
-                
-                for i,vert in enumerate(me_verts):
-                    weightvals = []
-
-                    grpIndices = []
-                    for g in vert.groups:
-                        gname = vertGroupNames[g.group]
-
-                        grpIndices.append(indexedGroupDict[gname])
-                        
-                        if gname.startswith(blendGroupPrefix):
-                            # ignore zero weight groups
-                            if float(g.weight) < 0.0001:
-                                continue
-                            # the actual index value could get out of sync with the blender group index,
-                            # so extract the index from the group name
-                            blendindex = gname.strip()
-                            blendindex = blendindex[len(blendGroupPrefix):]
-                            # remove optional group annotation suffix
-                            dotIdx = blendindex.find(".")
-                            if dotIdx != -1:
-                                blendindex = blendindex[0:dotIdx]
-                            # remove zeropad
-                            blendindex = int(blendindex)
-                            pair = (blendindex,g.weight)
-                            weightvals.append(pair)
-
-                    if (len(grpIndices) == 0):
-                        # ungrouped vert, but every vert needs to have a group to preserve the index ordering, so add a dummy 
-                        grpIndices.append(-1) 
-                        
-                    gline = " ".join(map(str,grpIndices))
-                    vertIndexLines.append(gline)
-
-                    def sortByWeight(pair):
-                        idx,weight = pair
-                        return -weight
-                        
-                    weightvals = sorted(weightvals, key = sortByWeight)
-                    # need 4 weights, so pad them out with dummy values if we have fewer.
-                    # reuse one of the actually used indices, may help cache performance.
-                    dummy = (0,0.0)
-                    if len(weightvals) > 0:
-                        fstidx,fstweight = weightvals[0]
-                        dummy = (fstidx,0.0)
-                    while len(weightvals) < 4:
-                        weightvals.append(dummy)
-                    line = ""
-                    for pair in weightvals:
-                        line += '%d/%0.6f ' % pair
-                    line.strip()
-                    vertBlendLines.append(line)
-
-                for line in vertIndexLines:
-                    fw('#vg ' + line + '\n')
-                for line in vertBlendLines:
-                    fw('#vbld ' + line + '\n')
-
-                if len(pos_xforms) > 0: 
-                    fw("#pos_xforms " + ' '.join(pos_xforms) + '\n')
-                if len(uv_xforms) > 0:
-                    fw("#uv_xforms " + ' '.join(uv_xforms) + '\n') 
-                        
-            # Write edges.
-            if EXPORT_EDGES:
-                for ed in edges:
-                    if ed.is_loose:
-                        fw('l %d %d\n' % (totverts + ed.vertices[0], totverts + ed.vertices[1]))
-
-            # Make the indices global rather then per mesh
-            totverts += len(me_verts)
-            totuvco += uv_unique_count
-            totno += no_unique_count
-
-            # clean up
-            bpy.data.meshes.remove(me)
-
-        if ob_main.dupli_type != 'NONE':
-            ob_main.dupli_list_clear()
-
-    # write named vertex groups last (just once)
-    for gname in indexedGroupList:
-        fw('#vgn ' + gname + '\n')       
-
-    file.close()
-
-    # Now we have all our materials, save them
-    if EXPORT_MTL:
-        write_mtl(scene, mtlfilepath, EXPORT_PATH_MODE, copy_set, mtl_dict)
-
-    # copy all collected files.
-    bpy_extras.io_utils.path_reference_copy(copy_set)
-
-    print("OBJ Export time: %.2f" % (time.time() - time1))
+                if vertGroupNames:
+                    pos_xforms = []
+                    uv_xforms = []
+                    for gname in vertGroupNames:
+                        if gname.startswith(posTransformPrefix):
+                            pos_xforms.append(gname.replace(posTransformPrefix, ""))
+                        elif gname.startswith(uvTransformPrefix):
+                            uv_xforms.append(gname.replace(uvTransformPrefix, ""))
+
+                    for gname in vertGroupNames:
+                        if (not (gname in indexedGroupDict)):
+                            indexedGroupList.append(gname)
+                            indexedGroupDict[gname] = len(indexedGroupList) - 1
+                            print("adding group " + gname + " to dict with index " + str(indexedGroupDict[gname]))
+
+                    counts, groups, weights = extracted.group_arrays
+
+                    # every vertex lists all its groups, or -1 so that the lines stay in vertex order
+                    global_index = np.array([indexedGroupDict[gname] for gname in vertGroupNames], dtype=np.int64)
+                    line_counts = np.maximum(counts, 1)
+                    line_values = np.full(int(line_counts.sum()), -1, dtype=np.int64)
+                    line_starts = np.cumsum(line_counts) - line_counts
+                    member_rank = np.arange(len(groups)) - np.repeat(np.cumsum(counts) - counts, counts)
+                    line_values[np.repeat(line_starts, counts) + member_rank] = global_index[groups]
+                    out.write_lists('#vg', ' %d', line_counts, line_values)
+
+                    blend_index, blend_weight, dropped = top_blend_weights(
+                        counts, groups, weights, blend_index_table(vertGroupNames, blendGroupPrefix))
+                    blend_pairs = np.empty((len(counts), 2 * BLEND_INFLUENCES))
+                    blend_pairs[:, 0::2] = blend_index
+                    blend_pairs[:, 1::2] = blend_weight
+                    if EXPORT_BLEND_PADDING:
+                        out.write_rows('#vbld' + row_formats.blend_pair * BLEND_INFLUENCES + ' \n', blend_pairs)
+                    else:
+                        # the padding has zero weights, and every vertex keeps at least one pair
+                        num_pairs = np.maximum((blend_weight > 0.0).sum(axis=1), 1)
+                        kept = np.arange(BLEND_INFLUENCES) < num_pairs[:, None]
+                        out.write_lists('#vbld', row_formats.blend_pair, num_pairs,
+                                        blend_pairs.reshape(-1, 2)[kept.ravel()])
+
+                    num_dropped = int(np.count_nonzero(dropped))
+                    if num_dropped:
+                        significant = np.flatnonzero(dropped > BLEND_DROP_REPORT)
+                        print("%s: %d vertices have more than %d blend influences, %d lost more than %d%% of their weight"
+                              % (ob.name, num_dropped, BLEND_INFLUENCES, len(significant), BLEND_DROP_REPORT * 100))
+                        if len(significant):
+                            worst = int(significant[np.argmax(dropped[significant])])
+                            print("\tworst is vertex %d, which lost %.1f%%" % (worst, dropped[worst] * 100))
+                    del line_values, blend_pairs
+
+                    if len(pos_xforms) > 0: 
+                        fw("#pos_xforms " + ' '.join(pos_xforms) + '\n')
+                    if len(uv_xforms) > 0:
+                        fw("#uv_xforms " + ' '.join(uv_xforms) + '\n') 
+                    if buffers is not None:
+                        buffers.add_xforms(pos_xforms, uv_xforms)
+
+                if buffers is not None:
+                    buffer_corners = np.zeros((len(loops_in_order), 3), dtype=np.int64)
+                    buffer_corners[:, 0] = loop_vert_arr[loops_in_order]
+                    if uv_rows is not None:
+                        buffer_corners[:, 1] = loops_to_uvs[loops_in_order]
+                    if no_rows is not None:
+                        buffer_corners[:, 2] = loops_to_normals[loops_in_order]
+                    buffers.add(arrays.co, uv_rows, no_rows, blend_index, blend_weight, buffer_corners, face_totals)
+
+                # Write edges.
+                if extracted.loose_edges is not None and len(extracted.loose_edges):
+                    out.write_rows('l %d %d\n', totverts + extracted.loose_edges)
+
+                # Make the indices global rather then per mesh
+                totverts += num_verts
+                totuvco += uv_unique_count
+                totno += no_unique_count
+
+            if ob_main.dupli_type != 'NONE':
+                ob_main.dupli_list_clear()
+
+        # write named vertex groups last (just once)
+        for gname in indexedGroupList:
+            fw('#vgn ' + gname + '\n')
+
+        # Now we have all our materials, save them
+        if EXPORT_MTL:
+            write_mtl(scene, mtlfilepath, EXPORT_PATH_MODE, copy_set, mtl_dict)
+    except Exception as e:
+        out.abort(e)
+        raise
+
+    # copy all collected files that changed, once the mmobj is written.
+    def copy_files():
+        copied, skipped = copy_textures(copy_set, os.path.dirname(os.path.abspath(filepath)), EXPORT_TEXTURE_LINK)
+        if copied or skipped:
+            print("OBJ Export: %d textures copied, %d unchanged" % (copied, skipped))
+
+    out.call(copy_files)
+    if buffers is not None:
+        out.call(buffers.write, filepath, EXPORT_REVERSE_NORMALS)
+    out.close()
+
+    if EXPORT_BACKGROUND:
+        print("OBJ Export: meshes read in %.2f, writing in the background" % (time.time() - time1))
+    else:
+        print("OBJ Export time: %.2f" % (time.time() - time1))
+        if isinstance(out, DeltaWriter) and out.wrote_delta:
+            print("OBJ Export: topology unchanged, wrote the delta of %r" % filepath)
+        if not out.changed:
+            print("OBJ Export: %r is unchanged, kept the existing file" % filepath)
+    return out
 
 
 def _write(context, filepath,
@@ -783,6 +1488,19 @@ def _write(context, filepath,
               EXPORT_ANIMATION,
               EXPORT_GLOBAL_MATRIX,
               EXPORT_PATH_MODE,
+              EXPORT_BACKGROUND=False,
+              on_done=None,
+              EXPORT_CACHE=False,
+              EXPORT_TEXTURE_LINK='COPY',
+              objects=None,
+              EXPORT_DELTA='OFF',
+              EXPORT_ANIMATION_STREAM='OFF',
+              EXPORT_NUMBER_STYLE='FIXED',
+              EXPORT_DECIMALS=DEFAULT_DECIMALS,
+              EXPORT_BLEND_PADDING=True,
+              EXPORT_BUFFER_DECL='',
+              EXPORT_REVERSE_NORMALS=False,
+              EXPORT_VERTEX_CACHE=False,
               ):  # Not used
 
     base_name, ext = os.path.splitext(filepath)
@@ -790,6 +1508,10 @@ def _write(context, filepath,
 
     scene = context.scene
 
+    # The edit mesh is only written back when leaving edit mode, without blender flagging an update first.
+    if context.edit_object is not None:
+        forget_object(context.edit_object.name)
+
     # Exit edit mode before exporting, so current object states are exported properly.
     if bpy.ops.object.mode_set.poll():
         bpy.ops.object.mode_set(mode='OBJECT')
@@ -802,22 +1524,35 @@ def _write(context, filepath,
     else:
         scene_frames = [orig_frame]  # Dont export an animation.
 
+    # Frames that share their topology go to one full file and a stream of their vertex rows.
+    animation = None
+    if EXPORT_ANIMATION and EXPORT_ANIMATION_STREAM != 'OFF':
+        animation = AnimationWriter(filepath, RowFormats(EXPORT_DECIMALS).delta(EXPORT_ANIMATION_STREAM),
+                                    style=EXPORT_NUMBER_STYLE)
+
     # Loop through all frames in the scene and export.
-    for frame in scene_frames:
-        if EXPORT_ANIMATION:  # Add frame to the filepath.
+    # In the background, a frame is written while the next one is read; only the last one reports to
+    # on_done, the others are waited for here.
+    writer = None
+    for frame_index, frame in enumerate(scene_frames):
+        if EXPORT_ANIMATION and animation is None:  # Add frame to the filepath.
             context_name[2] = '_%.6d' % frame
 
         scene.frame_set(frame, 0.0)
-        if EXPORT_SEL_ONLY:
-            objects = context.selected_objects
+        if objects is not None:
+            frame_objects = objects
+        elif EXPORT_SEL_ONLY:
+            frame_objects = context.selected_objects
         else:
-            objects = scene.objects
+            frame_objects = scene.objects
 
         full_path = ''.join(context_name)
 
+        previous_writer = writer
+
         # erm... bit of a problem here, this can overwrite files when exporting frames. not too bad.
         # EXPORT THE FILE.
-        write_file(full_path, objects, scene,
+        writer = write_file(full_path, frame_objects, scene,
                    EXPORT_TRI,
                    EXPORT_EDGES,
                    EXPORT_SMOOTH_GROUPS,
@@ -834,10 +1569,39 @@ def _write(context, filepath,
                    EXPORT_CURVE_AS_NURBS,
                    EXPORT_GLOBAL_MATRIX,
                    EXPORT_PATH_MODE,
+                   EXPORT_BACKGROUND,
+                   on_done if frame_index == len(scene_frames) - 1 and animation is None else None,
+                   EXPORT_CACHE,
+                   EXPORT_TEXTURE_LINK,
+                   EXPORT_DELTA,
+                   animation.frame(frame) if animation is not None else None,
+                   EXPORT_NUMBER_STYLE,
+                   EXPORT_DECIMALS,
+                   EXPORT_BLEND_PADDING,
+                   # a streamed animation's buffers are of its full file, the first frame
+                   EXPORT_BUFFER_DECL if animation is None or frame_index == 0 else '',
+                   EXPORT_REVERSE_NORMALS,
+                   EXPORT_VERTEX_CACHE,
                    )
 
+        if previous_writer is not None:
+            error = previous_writer.wait()
+            if error is not None:
+                raise error
+
     scene.frame_set(orig_frame, 0.0)
 
+    if animation is not None:
+        try:
+            animation.close()
+        except Exception as e:
+            if on_done is not None:
+                on_done(e)
+            raise
+        print("OBJ Export: %d frames streamed to %r" % (animation.num_frames, animation_path(filepath)))
+        if on_done is not None:
+            on_done(None)
+
     # Restore old active scene.
 #   orig_scene.makeCurrent()
 #   Window.WaitCursor(0)
@@ -868,8 +1632,42 @@ def save(operator, context, filepath="",
          use_selection=True,
          use_animation=False,
          global_matrix=None,
-         path_mode='AUTO'
+         path_mode='AUTO',
+         use_background=False,
+         on_done=None,
+         use_cache=False,
+         texture_link='COPY',
+         objects=None,
+         delta_mode='OFF',
+         animation_stream='OFF',
+         number_style='FIXED',
+         position_decimals=6,
+         uv_decimals=6,
+         normal_decimals=6,
+         weight_decimals=6,
+         use_blend_padding=True,
+         buffer_decl='',
+         use_reverse_normals=False,
+         use_vertex_cache=False,
          ):
+    """
+    Exports the scene.  With use_background, this returns once the meshes have been read, and the file
+    is written on worker threads; on_done(error) is called from one of them when it is finished.
+    With use_cache, objects that haven't changed since an earlier export aren't read again.
+    texture_link is how copied textures are put in place: 'COPY', 'HARDLINK' or 'REFLINK'.
+    objects, if given, are exported instead of the selected objects or the whole scene.
+    With delta_mode 'POSITIONS' or 'NORMALS', exports that only moved vertices write a delta file
+    instead of the whole file; auto exports ignore it.
+    With use_animation and animation_stream 'POSITIONS' or 'NORMALS', the first frame is written to
+    filepath and the positions (and normals) of every frame to one animation stream next to it; the
+    frames must all have the same topology.
+    number_style is how floats are written: 'FIXED' with the given decimals, 'TRIM' the same without
+    trailing zeros, or 'SHORTEST' with as few decimals as read back exactly as float32.  Without
+    use_blend_padding, #vbld lines leave out zero weight influences, which the game can't read.
+    With buffer_decl, the path of a reference's _VBDecl.dat, the mesh is also written as vertex and index
+    buffers in that layout next to filepath; use_reverse_normals matches the ReverseNormals game setting.
+    use_vertex_cache reorders the triangles of those index buffers for the GPU's vertex cache.
+    """
 
     _write(context, filepath,
            EXPORT_TRI=use_triangles,
@@ -890,6 +1688,19 @@ def save(operator, context, filepath="",
            EXPORT_ANIMATION=use_animation,
            EXPORT_GLOBAL_MATRIX=global_matrix,
            EXPORT_PATH_MODE=path_mode,
+           EXPORT_BACKGROUND=use_background,
+           on_done=on_done,
+           EXPORT_CACHE=use_cache,
+           EXPORT_TEXTURE_LINK=texture_link,
+           objects=objects,
+           EXPORT_DELTA=delta_mode,
+           EXPORT_ANIMATION_STREAM=animation_stream,
+           EXPORT_NUMBER_STYLE=number_style,
+           EXPORT_DECIMALS=(position_decimals, uv_decimals, normal_decimals, weight_decimals),
+           EXPORT_BLEND_PADDING=use_blend_padding,
+           EXPORT_BUFFER_DECL=buffer_decl,
+           EXPORT_REVERSE_NORMALS=use_reverse_normals,
+           EXPORT_VERTEX_CACHE=use_vertex_cache,
            )
 
     return {'FINISHED'}
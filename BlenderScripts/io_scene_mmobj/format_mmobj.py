@@ -0,0 +1,197 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Formats arrays of rows as mmobj text, one % operation per block of rows.
+
+The floats of a row format are written in one of NUMBER_STYLES:
+FIXED   as the format says, e.g. 0.500000 for %.6f
+TRIM    as the format says, without trailing zeros: 0.5, and 0 for 0.000000
+SHORTEST  with as few decimals as read back as the same float32, the type the runtime reads them
+        as, whatever the format's precision.  Lossless, but values that need all 9 digits of a
+        float32 get longer than with 6 decimals.
+None of them writes exponents, so every mmobj reader parses the numbers.
+
+Does not need blender, or the rest of the addon.
+"""
+
+import re
+
+import numpy as np
+
+# rows or lines formatted with a single % operation
+FORMAT_CHUNK = 65536
+
+NUMBER_STYLES = ('FIXED', 'TRIM', 'SHORTEST')
+
+# decimals at most written in the SHORTEST style, enough for the smallest float32
+MAX_DECIMALS = 45
+
+# a % conversion of a row format: its precision, with the point, and its type
+CONVERSION = re.compile(r'%[-+ #0]*\d*(\.\d*)?([a-zA-Z%])')
+
+# |value| * 10 ** decimals beyond which TRIM asks %f for the digits; float64 holds integers exactly below it
+EXACT_DIGITS = 2.0 ** 52
+
+
+def conversion_decimals(precision):
+    """
+    The decimals a float conversion writes, from its precision as CONVERSION finds it.
+    """
+    return int(precision[1:] or 0) if precision else 6
+
+
+def trimmed_decimals(values, decimals):
+    """
+    Returns for every element of the float array values the decimals %.{decimals}f writes, less the
+    zeros it ends with.
+    """
+    exact = values.astype(np.float64)
+    scaled = np.abs(exact) * 10.0 ** decimals
+    exact_digits = scaled < EXACT_DIGITS
+    digits = np.where(exact_digits, np.round(scaled), 0.0).astype(np.int64)
+    trimmed = np.full(values.shape, decimals, dtype=np.int64)
+    zeros = np.ones(values.shape, dtype=bool)
+    for k in range(1, decimals + 1):
+        zeros &= digits % 10 ** k == 0
+        trimmed -= zeros
+
+    # near a tie the product can round the other way than %f does, and huge values lose digits; ask %f
+    with np.errstate(invalid='ignore'):
+        fraction = scaled - np.floor(scaled)
+        ask = ~(np.abs(fraction - 0.5) > 1e-9 * np.maximum(scaled, 1.0)) | ~exact_digits
+    for i in np.flatnonzero(ask & np.isfinite(exact)):
+        text = ('%.*f' % (decimals, exact[i])).rstrip('0')
+        trimmed[i] = len(text) - text.index('.') - 1 if '.' in text else 0
+    return trimmed
+
+
+def shortest_decimals(values):
+    """
+    Returns for every element of the float32 array values the fewest decimals that %.*f needs to write
+    it so that it reads back as the same float32.
+    """
+    exact = values.astype(np.float64)
+    decimals = np.full(values.shape, MAX_DECIMALS, dtype=np.int64)
+    todo = np.isfinite(exact)
+    for d in range(MAX_DECIMALS):
+        if not todo.any():
+            break
+        found = todo & (np.round(exact, d).astype(np.float32) == values)
+        decimals[found] = d
+        todo &= ~found
+
+    # np.round can land on the other side of a tie than the decimal rounding of %f; check the text
+    check = np.flatnonzero(np.isfinite(exact))
+    while len(check):
+        pairs = np.empty(2 * len(check), dtype=object)
+        pairs[0::2] = decimals[check].tolist()
+        pairs[1::2] = exact[check].tolist()
+        back = np.array((('%.*f ' * len(check)) % tuple(pairs.tolist())).split(), dtype=np.float32)
+        check = check[(back != values[check]) & (decimals[check] < MAX_DECIMALS)]
+        decimals[check] += 1
+    return decimals
+
+
+def has_floats(fmt):
+    return any(kind in 'fF' for _, kind in CONVERSION.findall(fmt))
+
+
+def decimal_args(fmt, values, style):
+    """
+    Returns fmt with its float conversions made %.*f, and the rows of values with the decimals every
+    float is written with in style put in front of it.  SHORTEST makes the floats float32.
+    """
+    conversions = [(precision, kind) for precision, kind in CONVERSION.findall(fmt) if kind != '%']
+    fmt = CONVERSION.sub(lambda m: '%.*f' if m.group(2) in 'fF' else m.group(0), fmt)
+
+    num_floats = sum(kind in 'fF' for _, kind in conversions)
+    args = np.empty((len(values), len(conversions) + num_floats), dtype=object)
+    pos = 0
+    for col, (precision, kind) in enumerate(conversions):
+        column = values[:, col]
+        if kind in 'fF':
+            if style == 'SHORTEST':
+                column = column.astype(np.float32)
+                decimals = shortest_decimals(column)
+            else:
+                decimals = trimmed_decimals(column, conversion_decimals(precision))
+            args[:, pos] = decimals.tolist()
+            pos += 1
+        args[:, pos] = column.tolist()
+        pos += 1
+    return fmt, args
+
+
+def format_block(fmt, values, style='FIXED'):
+    """
+    Returns fmt applied to every row of the 2d array values, with the floats in style.
+    """
+    if style != 'FIXED' and has_floats(fmt):
+        fmt, values = decimal_args(fmt, values, style)
+    return (fmt * len(values)) % tuple(values.ravel().tolist())
+
+
+def format_rows(fmt, values, style='FIXED'):
+    """
+    Yields fmt applied to every row of the 2d array values, one string per chunk of rows.
+    """
+    values = np.asarray(values)
+    for start in range(0, len(values), FORMAT_CHUNK):
+        yield format_block(fmt, values[start:start + FORMAT_CHUNK], style)
+
+
+def format_list_block(head, item_fmt, counts, values, style='FIXED'):
+    """
+    Returns lines of head followed by counts[i] items each.
+    values has a row for every item, in order, holding what item_fmt takes.
+    """
+    if style != 'FIXED' and has_floats(item_fmt):
+        item_fmt, values = decimal_args(item_fmt, values, style)
+    line_fmts = {}
+    fmts = []
+    for count in counts:
+        line_fmt = line_fmts.get(count)
+        if line_fmt is None:
+            line_fmt = line_fmts[count] = head + item_fmt * count + '\n'
+        fmts.append(line_fmt)
+    return ''.join(fmts) % tuple(values.ravel().tolist())
+
+
+def list_chunks(counts, values):
+    """
+    Splits counts and the item rows in values into chunks of FORMAT_CHUNK lines.
+    """
+    counts = counts.tolist()
+    item = 0
+    for start in range(0, len(counts), FORMAT_CHUNK):
+        chunk = counts[start:start + FORMAT_CHUNK]
+        num_items = sum(chunk)
+        yield chunk, values[item:item + num_items]
+        item += num_items
+
+
+def format_lists(head, item_fmt, counts, values, style='FIXED'):
+    """
+    Yields lines of head followed by counts[i] items each, one string per chunk of lines.
+    values has a row for every item, in order, holding what item_fmt takes.
+    """
+    for chunk, chunk_values in list_chunks(counts, values):
+        yield format_list_block(head, item_fmt, chunk, chunk_values, style)
@@ -37,11 +37,22 @@ import os
 import time
 import bpy
 import mathutils
+import numpy as np
 from bpy_extras.io_utils import unpack_list, unpack_face_list
 from bpy_extras.image_utils import load_image
 import bpy
 from bpy import context
 
+from .parse_mmobj import ImportCancelled, line_value, parse
+from . import proxy_mmobj, snapshot_dat, watch_mmobj
+
+# rough number of faces or weights to process between yields when building a mesh in slices
+BUILD_SLICE = 4096
+
+# threads parse_many parses files on; the parser holds the GIL, so more of them only overlap more reads
+PARSE_THREADS = 4
+
+
 def mesh_untessellate(me, fgon_edges):
     import bmesh
     bm = bmesh.new()
@@ -61,27 +72,58 @@ def mesh_untessellate(me, fgon_edges):
     bm.free()
 
 
-def line_value(line_split):
+class ImportCache:
     """
-    Returns 1 string represneting the value for this line
-    None will be returned if theres only 1 word
+    Images, materials, material libraries and directory listings shared between the files of a
+    multi-file import, so that each is resolved only once.
     """
-    length = len(line_split)
-    if length == 1:
-        return None
-
-    elif length == 2:
-        return line_split[1]
-
-    elif length > 2:
-        return b' '.join(line_split[1:])
-
-
-def obj_image_load(imagepath, DIR, recursive, relpath):
+    def __init__(self):
+        self.images = {}  # (imagepath, DIR, recursive, relpath): image
+        self.materials = {}  # (DIR, material libs, material name): (material, image)
+        self.mtl_lines = {}  # mtl path: lines
+        self.dir_index = {}  # DIR: {lowercase file name: path}
+
+    def read_mtl(self, mtlpath):
+        lines = self.mtl_lines.get(mtlpath)
+        if lines is None:
+            with open(mtlpath, 'rb') as mtl:
+                lines = self.mtl_lines[mtlpath] = mtl.readlines()
+        return lines
+
+    def find_file(self, DIR, filename):
+        """
+        Looks for filename anywhere below DIR, walking the tree only the first time DIR is searched.
+        """
+        index = self.dir_index.get(DIR)
+        if index is None:
+            index = self.dir_index[DIR] = {}
+            for dirpath, dirnames, filenames in os.walk(DIR):
+                for name in filenames:
+                    index.setdefault(name.lower(), os.path.join(dirpath, name))
+        return index.get(os.path.basename(filename).lower())
+
+
+def obj_image_load(imagepath, DIR, recursive, relpath, cache=None):
     """
     Mainly uses comprehensiveImageLoad
     but tries to replace '_' with ' ' for Max's exporter replaces spaces with underscores.
     """
+    if cache is not None:
+        key = imagepath, DIR, recursive, relpath
+        if key not in cache.images:
+            image = None
+            if recursive and not os.path.exists(os.path.join(DIR, imagepath)):
+                # use the cached directory index rather than having load_image walk the tree again
+                for name in (imagepath.replace(b'_', b' '), imagepath):
+                    found = cache.find_file(DIR, name)
+                    if found:
+                        image = load_image(found, DIR, relpath=relpath)
+                        break
+            if image is None:
+                image = obj_image_load(imagepath, DIR, False, relpath)
+            cache.images[key] = image
+        return cache.images[key]
+
     if b'_' in imagepath:
         image = load_image(imagepath.replace(b'_', b' '), DIR, recursive=recursive, relpath=relpath)
         if image:
@@ -92,10 +134,11 @@ def obj_image_load(imagepath, DIR, recursive, relpath):
 
 def create_materials(filepath, relpath,
                      material_libs, unique_materials, unique_material_images,
-                     use_image_search, float_func):
+                     use_image_search, float_func, cache=None):
     """
     Create all the used materials in this obj,
     assign colors and images to the materials from all referenced material libs
+    If a cache is given, materials already made for the same name and material libs are reused.
     """
     DIR = os.path.dirname(filepath)
     context_material_vars = set()
@@ -108,7 +151,7 @@ def create_materials(filepath, relpath,
         texture = bpy.data.textures.new(name=type, type='IMAGE')
 
         # Absolute path - c:\.. etc would work here
-        image = obj_image_load(imagepath, DIR, use_image_search, relpath)
+        image = obj_image_load(imagepath, DIR, use_image_search, relpath, cache)
 
         if image is not None:
             texture.image = image
@@ -187,15 +230,22 @@ def create_materials(filepath, relpath,
     del temp_mtl
 
     #Create new materials
+    new_materials = {}
+    cache_key = DIR, tuple(sorted(material_libs))
     for name in unique_materials:  # .keys()
         if name is not None:
-            unique_materials[name] = bpy.data.materials.new(name.decode('utf-8', "replace"))
+            if cache is not None and (cache_key, name) in cache.materials:
+                unique_materials[name], unique_material_images[name] = cache.materials[cache_key, name]
+                continue
+            unique_materials[name] = new_materials[name] = bpy.data.materials.new(name.decode('utf-8', "replace"))
             unique_material_images[name] = None  # assign None to all material images to start with, add to later.
 
     unique_materials[None] = None
     unique_material_images[None] = None
 
     for libname in material_libs:
+        if not new_materials:
+            break  # everything came from the cache
         # print(libname)
         mtlpath = os.path.join(DIR, libname)
         if not os.path.exists(mtlpath):
@@ -203,7 +253,10 @@ def create_materials(filepath, relpath,
         else:
             #print('\t\tloading mtl: %e' % mtlpath)
             context_material = None
-            mtl = open(mtlpath, 'rb')
+            if cache is not None:
+                mtl = cache.read_mtl(mtlpath)
+            else:
+                mtl = open(mtlpath, 'rb')
             for line in mtl:  # .readlines():
                 line = line.strip()
                 if not line or line.startswith(b'#'):
@@ -214,7 +267,7 @@ def create_materials(filepath, relpath,
 
                 if line_id == b'newmtl':
                     context_material_name = line_value(line_split)
-                    context_material = unique_materials.get(context_material_name)
+                    context_material = new_materials.get(context_material_name)
                     context_material_vars.clear()
 
                 elif context_material:
@@ -373,20 +426,32 @@ def create_materials(filepath, relpath,
                             load_material_image(context_material, context_material_name, img_filepath, 'refl')
                     else:
                         print("\t%r:%r (ignored)" % (filepath, line))
-            mtl.close()
+            if cache is None:
+                mtl.close()
 
+    if cache is not None:
+        for name, material in new_materials.items():
+            cache.materials[cache_key, name] = material, unique_material_images[name]
 
-def split_mesh(verts_loc, faces, unique_materials, filepath, SPLIT_OB_OR_GROUP):
+
+def split_mesh(verts_loc, faces, unique_materials, filepath, SPLIT_OB_OR_GROUP, weighted_groups=None):
     """
     Takes vert_loc and faces, and separates into multiple sets of
-    (verts_loc, faces, unique_materials, dataname)
+    (verts_loc, faces, unique_materials, dataname, weighted_groups)
+
+    The vertex remap for each split is an index array, so the blend weights (and the face indices)
+    are carried through it with array gathers instead of per-vertex dict lookups.  Each split keeps
+    its vertices in file order.
     """
 
     filename = os.path.splitext((os.path.basename(filepath)))[0]
 
+    if weighted_groups is None:
+        weighted_groups = {}
+
     if not SPLIT_OB_OR_GROUP or not faces:
         # use the filename for the object name since we aren't chopping up the mesh.
-        return [(verts_loc, faces, unique_materials, filename)]
+        return [(verts_loc, faces, unique_materials, filename, weighted_groups)]
 
     def key_to_name(key):
         # if the key is a tuple, join it to make a string
@@ -405,60 +470,129 @@ def split_mesh(verts_loc, faces, unique_materials, filepath, SPLIT_OB_OR_GROUP):
 
         if oldkey != key:
             # Check the key has changed.
-            try:
-                verts_split, faces_split, unique_materials_split, vert_remap = face_split_dict[key]
-            except KeyError:
-                faces_split = []
-                verts_split = []
-                unique_materials_split = {}
-                vert_remap = {}
+            faces_split = face_split_dict.setdefault(key, [])
+            oldkey = key
+
+        faces_split.append(face)
 
-                face_split_dict[key] = (verts_split, faces_split, unique_materials_split, vert_remap)
+    verts_loc_arr = np.array(verts_loc, dtype=np.float64).reshape(-1, 3)
+    remap = np.empty(len(verts_loc), dtype=np.int64)
 
-            oldkey = key
+    # (vertex indices, weights) per blend group, built once and gathered for each split
+    group_arrays = {gname: (np.fromiter(group_verts.keys(), dtype=np.int64, count=len(group_verts)),
+                            np.fromiter(group_verts.values(), dtype=np.float64, count=len(group_verts)))
+                    for gname, group_verts in weighted_groups.items()}
 
-        face_vert_loc_indices = face[0]
+    splits = []
+    for key, faces_split in face_split_dict.items():
+        face_lens = [len(face[0]) for face in faces_split]
+        flat = np.fromiter((i for face in faces_split for i in face[0]), dtype=np.int64, count=sum(face_lens))
 
-        # Remap verts to new vert list and add where needed
-        for enum, i in enumerate(face_vert_loc_indices):
-            map_index = vert_remap.get(i)
-            if map_index is None:
-                map_index = len(verts_split)
-                vert_remap[i] = map_index  # set the new remapped index so we only add once and can reference next time.
-                verts_split.append(verts_loc[i])  # add the vert to the local verts
+        used = np.unique(flat)
+        remap.fill(-1)
+        remap[used] = np.arange(len(used))
 
-            face_vert_loc_indices[enum] = map_index  # remap to the local index
+        # remap to the local indices
+        flat = remap[flat].tolist()
+        pos = 0
+        for face, face_len in zip(faces_split, face_lens):
+            face[0][:] = flat[pos:pos + face_len]
+            pos += face_len
 
+        unique_materials_split = {}
+        for face in faces_split:
             matname = face[2]
             if matname and matname not in unique_materials_split:
                 unique_materials_split[matname] = unique_materials[matname]
 
-        faces_split.append(face)
+        weighted_groups_split = {}
+        for gname, (group_idx, group_weights) in group_arrays.items():
+            split_idx = remap[group_idx]
+            keep = split_idx >= 0
+            if keep.any():
+                weighted_groups_split[gname] = dict(zip(split_idx[keep].tolist(), group_weights[keep].tolist()))
+
+        splits.append((verts_loc_arr[used].tolist(), faces_split, unique_materials_split, key_to_name(key),
+                       weighted_groups_split))
+
+    return splits
+
+
+def set_custom_normals(me, faces, verts_nor):
+    """
+    Sets the mesh's custom split normals from the normal indices of the faces it was built from, with a
+    single bulk call.  Loops are matched to face corners by polygon and vertex index, since building the
+    mesh may have rotated the corners; if ngons were dissolved (so polygons no longer match faces one to
+    one), each vertex gets the normal of the last corner that uses it.  Corners without a normal get a
+    zero vector, which leaves blender's own normal in place.
+    """
+    num_corners = sum(len(f[0]) for f in faces)
+    corner_verts = np.fromiter((i for f in faces for i in f[0]), dtype=np.int64, count=num_corners)
+    corner_nors = np.fromiter((i for f in faces for i in (f[5] or [-1] * len(f[0]))), dtype=np.int64,
+                              count=num_corners)
+    nor_array = np.vstack((np.array(verts_nor, dtype=np.float32).reshape(-1, 3), np.zeros((1, 3), np.float32)))
+    corner_nors[(corner_nors < 0) | (corner_nors >= len(verts_nor))] = len(verts_nor)
+
+    num_loops = len(me.loops)
+    loop_verts = np.empty(num_loops, dtype=np.int32)
+    me.loops.foreach_get("vertex_index", loop_verts)
+    num_verts = len(me.vertices)
+
+    if len(me.polygons) == len(faces):
+        corner_faces = np.repeat(np.arange(len(faces)), [len(f[0]) for f in faces])
+        loop_totals = np.empty(len(me.polygons), dtype=np.int32)
+        me.polygons.foreach_get("loop_total", loop_totals)
+        loop_faces = np.repeat(np.arange(len(me.polygons)), loop_totals)
+
+        corner_keys = corner_faces * num_verts + corner_verts
+        order = np.argsort(corner_keys, kind='mergesort')
+        sorted_keys = corner_keys[order]
+        loop_keys = loop_faces * num_verts + loop_verts
+        found = np.minimum(np.searchsorted(sorted_keys, loop_keys), len(sorted_keys) - 1)
+        loop_nors = np.where(sorted_keys[found] == loop_keys, corner_nors[order[found]], len(verts_nor))
+    else:
+        vert_nors = np.full(num_verts, len(verts_nor), dtype=np.int64)
+        vert_nors[corner_verts] = corner_nors
+        loop_nors = vert_nors[loop_verts]
+
+    me.use_auto_smooth = True
+    me.normals_split_custom_set(nor_array[loop_nors])
+
 
-    # remove one of the itemas and reorder
-    return [(value[0], value[1], value[2], key_to_name(key)) for key, value in list(face_split_dict.items())]
-
-
-def create_mesh(new_objects,
-                has_ngons,
-                use_ngons,
-                use_edges,
-                verts_loc,
-                verts_tex,
-                faces,
-                unique_materials,
-                unique_material_images,
-                unique_smooth_groups,
-                vertex_groups,
-                weighted_groups,
-                pos_xforms,
-                uv_xforms,
-                dataname,
-                ):
+def create_mesh(new_objects, *args):
     """
     Takes all the data gathered and generates a mesh, adding the new object to new_objects
     deals with ngons, sharp edges and assigning materials
     """
+    for _progress in create_mesh_iter(new_objects, [], *args):
+        pass
+
+
+def create_mesh_iter(new_objects,
+                     new_meshes,
+                     has_ngons,
+                     use_ngons,
+                     use_edges,
+                     verts_loc,
+                     verts_tex,
+                     faces,
+                     unique_materials,
+                     unique_material_images,
+                     unique_smooth_groups,
+                     vertex_groups,
+                     weighted_groups,
+                     pos_xforms,
+                     uv_xforms,
+                     dataname,
+                     verts_nor=None,
+                     ):
+    """
+    Generator version of create_mesh; yields the fraction of the mesh built so far every BUILD_SLICE
+    faces or weights, so that the caller can spread the work over several UI updates.  Validating the
+    mesh, joining the tessellated faces back into ngons and setting custom normals are single steps
+    between two yields, whose time grows with the mesh.
+    The mesh is appended to new_meshes as soon as it exists, so that a cancelled build can remove it.
+    """
     from bpy_extras.mesh_utils import ngon_tessellate
 
     if not has_ngons:
@@ -484,6 +618,7 @@ def create_mesh(new_objects,
          context_material,
          context_smooth_group,
          context_object,
+         face_vert_nor_indices,
          ) = faces[f_idx]
 
         len_face_vert_loc_indices = len(face_vert_loc_indices)
@@ -533,6 +668,10 @@ def create_mesh(new_objects,
                                context_material,
                                context_smooth_group,
                                context_object,
+                               [face_vert_nor_indices[ngon[0]],
+                                face_vert_nor_indices[ngon[1]],
+                                face_vert_nor_indices[ngon[2]],
+                                ] if face_vert_nor_indices else [],
                               )
                              for ngon in ngon_face_indices]
                             )
@@ -575,6 +714,10 @@ def create_mesh(new_objects,
         materials[index] = unique_materials[name]
 
     me = bpy.data.meshes.new(dataname.decode('utf-8', "replace"))
+    new_meshes.append(me)
+
+    work_total = max(len(faces) + sum(len(g) for g in weighted_groups.values()), 1)
+    work_done = 0
 
     # make sure the list isnt too big
     for material in materials:
@@ -599,6 +742,9 @@ def create_mesh(new_objects,
     me_faces = me.tessfaces
 
     for i, face in enumerate(faces):
+        if i % BUILD_SLICE == 0 and i:
+            yield (work_done + i) / work_total
+
         if len(face[0]) < 2:
             pass  # raise Exception("bad face")
         elif len(face[0]) == 2:
@@ -613,6 +759,7 @@ def create_mesh(new_objects,
              context_material,
              context_smooth_group,
              context_object,
+             face_vert_nor_indices,
              ) = face
 
             if context_smooth_group:
@@ -655,6 +802,7 @@ def create_mesh(new_objects,
 #                for ii, uv in enumerate(blender_face.uv):
 #                    uv.x, uv.y=  verts_tex[face_vert_tex_indices[ii]]
     del me_faces
+    work_done += len(faces)
 #     del ALPHA
 
     if use_edges and not edges:
@@ -698,6 +846,9 @@ def create_mesh(new_objects,
 
     mesh_untessellate(me, fgon_edges)
 
+    if verts_nor:
+        set_custom_normals(me, faces, verts_nor)
+
     # XXX slow
 #     if unique_smooth_groups and sharp_edges:
 #         for sharp_edge in sharp_edges.keys():
@@ -727,8 +878,19 @@ def create_mesh(new_objects,
     for group_name in sorted_groups:
         group_verts = weighted_groups[group_name]
         group = ob.vertex_groups.new(group_name.decode('utf-8', "replace"))
-        for vidx, vweight in group_verts.items():
-            group.add([vidx], vweight, 'ADD')
+        vidxs = np.fromiter(group_verts.keys(), dtype=np.int64, count=len(group_verts))
+        weights = np.fromiter(group_verts.values(), dtype=np.float64, count=len(group_verts))
+        added = 0
+        for run_vidxs, weight in weight_runs(vidxs, weights):
+            group.add(run_vidxs, weight, 'REPLACE')
+            added += len(run_vidxs)
+            if added >= BUILD_SLICE:
+                work_done += added
+                added = 0
+                yield work_done / work_total
+        work_done += added
+    if weighted_groups:
+        yield work_done / work_total
 
     # create transforms as vertex groups so that its possible (albeit hacky) to edit/delete them in blender.
     # a key-value storage would be more appropriate but I don't think blender has anything like that.
@@ -742,6 +904,97 @@ def create_mesh(new_objects,
         xform = "UVTransform." + xform
         group = ob.vertex_groups.new(xform)
 
+
+def weight_runs(vidxs, weights):
+    """
+    Yields the vertices of vidxs that share a weight, as a list, with that weight, so that a vertex
+    group gets one group.add call per distinct weight rather than one per vertex.
+    """
+    if not len(weights):
+        return
+    order = np.argsort(weights, kind='mergesort')
+    vidxs, weights = vidxs[order], weights[order]
+    starts = np.flatnonzero(np.r_[True, weights[1:] != weights[:-1]])
+    ends = np.r_[starts[1:], len(weights)]
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        yield vidxs[start:end].tolist(), float(weights[start])
+
+
+def add_blend_groups(ob, blend_indices, blend_weights):
+    """
+    Creates the Index.NN vertex groups from per vertex (n, 4) blend index and weight arrays, adding the
+    vertices that share a weight in one batch.
+    """
+    weighted = blend_weights > 0.0
+    for blend_index in np.unique(blend_indices[weighted]).tolist():
+        group = ob.vertex_groups.new("Index.%02d" % blend_index)
+        # like the parser, a later slot with the same index replaces an earlier one
+        for slot in range(blend_indices.shape[1]):
+            vidxs = np.flatnonzero(weighted[:, slot] & (blend_indices[:, slot] == blend_index))
+            for run_vidxs, weight in weight_runs(vidxs, blend_weights[vidxs, slot]):
+                group.add(run_vidxs, weight, 'REPLACE')
+
+
+def create_mesh_from_arrays(new_objects,
+                            new_meshes,
+                            positions,
+                            triangles,
+                            uvs,
+                            blend_indices,
+                            blend_weights,
+                            material,
+                            image,
+                            pos_xforms,
+                            uv_xforms,
+                            dataname,
+                            ):
+    """
+    Builds a triangle mesh object from numpy arrays with bulk foreach_set calls: positions (n, 3),
+    triangles (m, 3), and optional per vertex uvs (n, 2), blend indices and weights (n, 4).
+    """
+    num_verts = len(positions)
+    num_tris = len(triangles)
+
+    me = bpy.data.meshes.new(dataname)
+    new_meshes.append(me)
+    if material is not None:
+        me.materials.append(material)
+
+    me.vertices.add(num_verts)
+    me.loops.add(num_tris * 3)
+    me.polygons.add(num_tris)
+
+    me.vertices.foreach_set("co", np.ascontiguousarray(positions, dtype=np.float32).ravel())
+    loop_verts = np.ascontiguousarray(triangles, dtype=np.int32).ravel()
+    me.loops.foreach_set("vertex_index", loop_verts)
+    me.polygons.foreach_set("loop_start", np.arange(0, num_tris * 3, 3, dtype=np.int32))
+    me.polygons.foreach_set("loop_total", np.full(num_tris, 3, dtype=np.int32))
+    me.polygons.foreach_set("use_smooth", np.ones(num_tris, dtype=bool))
+
+    if uvs is not None and num_tris:
+        uv_texture = me.uv_textures.new()
+        me.uv_layers[0].data.foreach_set("uv", np.ascontiguousarray(uvs[loop_verts], dtype=np.float32).ravel())
+        if image is not None:
+            for tface in uv_texture.data:
+                tface.image = image
+
+    me.update(calc_edges=True)
+    me.validate()
+
+    ob = bpy.data.objects.new(me.name, me)
+    new_objects.append(ob)
+
+    if blend_indices is not None:
+        add_blend_groups(ob, blend_indices, blend_weights)
+
+    for xform in pos_xforms:
+        ob.vertex_groups.new("PosTransform." + xform.decode('utf-8', "replace"))
+    for xform in uv_xforms:
+        ob.vertex_groups.new("UVTransform." + xform.decode('utf-8', "replace"))
+
+    return ob
+
+
 def create_nurbs(context_nurbs, vert_loc, new_objects):
     """
     Add nurbs object to blender, only support one type at the moment
@@ -815,348 +1068,89 @@ def create_nurbs(context_nurbs, vert_loc, new_objects):
     new_objects.append(ob)
 
 
-def strip_slash(line_split):
-    if line_split[-1][-1] == 92:  # '\' char
-        if len(line_split[-1]) == 1:
-            line_split.pop()  # remove the \ item
-        else:
-            line_split[-1] = line_split[-1][:-1]  # remove the \ from the end last number
-        return True
-    return False
 
 
-def get_float_func(filepath):
+def build_objects(data,
+                  new_objects,
+                  new_meshes,
+                  use_ngons=True,
+                  use_edges=True,
+                  use_split_objects=True,
+                  use_split_groups=True,
+                  use_image_search=True,
+                  relpath=None,
+                  cache=None,
+                  ):
     """
-    find the float function for this obj file
-    - whether to replace commas or not
+    Creates the materials, meshes and objects for parsed MMObjData, without linking them to the scene.
+    This is a generator that yields the fraction built so far; created objects and meshes are added to
+    new_objects and new_meshes as they are made.
     """
-    file = open(filepath, 'rb')
-    for line in file:  # .readlines():
-        line = line.lstrip()
-        if line.startswith(b'v'):  # vn vt v
-            if b',' in line:
-                file.close()
-                return lambda f: float(f.replace(b',', b'.'))
-            elif b'.' in line:
-                file.close()
-                return float
-
-    file.close()
-    # in case all vert values were ints
-    return float
-
+    filepath = data.filepath
 
-def load(operator, context, filepath,
-         global_clamp_size=0.0,
-         use_ngons=True,
-         use_smooth_groups=True,
-         use_edges=True,
-         use_split_objects=True,
-         use_split_groups=True,
-         use_image_search=True,
-         use_groups_as_vgroups=False,
-         relpath=None,
-         global_matrix=None,
-         ):
-    """
-    Called by the user interface or another script.
-    load_obj(path) - should give acceptable results.
-    This function passes the file and sends the data off
-        to be split into objects and then converted into mesh objects
-    """
-    print('\nimporting obj %r' % filepath)
-
-    filepath = os.fsencode(filepath)
-
-    if global_matrix is None:
-        global_matrix = mathutils.Matrix()
-
-    if use_split_objects or use_split_groups:
-        use_groups_as_vgroups = False
-
-    time_main = time.time()
-
-    verts_loc = []
-    verts_tex = []
-    faces = []  # tuples of the faces
-    material_libs = []  # filanems to material libs this uses
-    vertex_groups = {}  # when use_groups_as_vgroups is true
-
-    # used by modelmod to create weighted-index vgroups:
-    verts_blenddata_idx = 0
-    weighted_groups = {}
-    pos_xforms = []
-    uv_xforms = []
-
-    # Get the string to float conversion func for this file- is 'float' for almost all files.
-    float_func = get_float_func(filepath)
-
-    # Context variables
-    context_material = None
-    context_smooth_group = None
-    context_object = None
-    context_vgroup = None
-
-    # Nurbs
-    context_nurbs = {}
-    nurbs = []
-    context_parm = b''  # used by nurbs too but could be used elsewhere
-
-    has_ngons = False
-    # has_smoothgroups= False - is explicit with len(unique_smooth_groups) being > 0
-
-    # Until we can use sets
-    unique_materials = {}
-    unique_material_images = {}
-    unique_smooth_groups = {}
-    # unique_obects= {} - no use for this variable since the objects are stored in the face.
-
-    # when there are faces that end with \
-    # it means they are multiline-
-    # since we use xreadline we cant skip to the next line
-    # so we need to know whether
-    context_multi_line = b''
-
-    print("\tparsing obj file...")
     time_sub = time.time()
 
-    def zeropad(s,n):
-        while (len(s) < n):
-            s = b'0' + s
-        return s
-#     time_sub= sys.time()
-
-    file = open(filepath, 'rb')
-    for line in file:  # .readlines():
-        line_split = line.split()
-
-        if not line_split:
-            continue
-
-        line_start = line_split[0]  # we compare with this a _lot_
-
-        if line_start == b'v':
-            verts_loc.append((float_func(line_split[1]), float_func(line_split[2]), float_func(line_split[3])))
-
-        elif line_start == b'#vbld' or context_multi_line == b'#vbld':
-            groups = line_split[1:]
-            vidx = verts_blenddata_idx
-            verts_blenddata_idx += 1
-            for g in groups:
-                idx,weight = g.split(b'/')
-                weight = float_func(weight)
-                if (weight > 0.0):
-                    gname = b'Index.' + zeropad(idx,2)
-                    weighted_groups.setdefault(gname, {})
-                    weighted_groups[gname][vidx] = weight
-                
-            context_multi_line = b''
-        elif line_start == b'#pos_xforms' or context_multi_line == b'#pos_xforms':
-            # don't interpret this, its just baggage that needs to be passed through by the exporter.
-            pos_xforms = line_split[1:]
-            context_multi_line = b''
-        elif line_start == b'#uv_xforms' or context_multi_line == b'#uv_xforms':
-            # don't interpret this, its just baggage that needs to be passed through by the exporter.
-            uv_xforms = line_split[1:]
-            context_multi_line = b''
-            
-        elif line_start == b'vn':
-            pass
-
-        elif line_start == b'vt':
-            verts_tex.append((float_func(line_split[1]), float_func(line_split[2])))
-
-        # Handel faces lines (as faces) and the second+ lines of fa multiline face here
-        # use 'f' not 'f ' because some objs (very rare have 'fo ' for faces)
-        elif line_start == b'f' or context_multi_line == b'f':
-            if context_multi_line:
-                # use face_vert_loc_indices and face_vert_tex_indices previously defined and used the obj_face
-                pass
-
-            else:
-                line_split = line_split[1:]
-                face_vert_loc_indices = []
-                face_vert_tex_indices = []
-
-                # Instance a face
-                faces.append((face_vert_loc_indices,
-                              face_vert_tex_indices,
-                              context_material,
-                              context_smooth_group,
-                              context_object,
-                              ))
-
-            if strip_slash(line_split):
-                context_multi_line = b'f'
-            else:
-                context_multi_line = b''
-
-            for v in line_split:
-                obj_vert = v.split(b'/')
-                vert_loc_index = int(obj_vert[0]) - 1
-                # Add the vertex to the current group
-                # *warning*, this wont work for files that have groups defined around verts
-                if use_groups_as_vgroups and context_vgroup:
-                    vertex_groups[context_vgroup].append(vert_loc_index)
-
-                # Make relative negative vert indices absolute
-                if vert_loc_index < 0:
-                    vert_loc_index = len(verts_loc) + vert_loc_index + 1
-
-                face_vert_loc_indices.append(vert_loc_index)
-
-                if len(obj_vert) > 1 and obj_vert[1]:
-                    # formatting for faces with normals and textures us
-                    # loc_index/tex_index/nor_index
-
-                    vert_tex_index = int(obj_vert[1]) - 1
-                    # Make relative negative vert indices absolute
-                    if vert_tex_index < 0:
-                        vert_tex_index = len(verts_tex) + vert_tex_index + 1
-
-                    face_vert_tex_indices.append(vert_tex_index)
-                else:
-                    # dummy
-                    face_vert_tex_indices.append(0)
+    print('\tloading materials and images...')
+    create_materials(filepath, relpath, data.material_libs, data.unique_materials, data.unique_material_images,
+                     use_image_search, data.float_func, cache)
 
-            if len(face_vert_loc_indices) > 4:
-                has_ngons = True
+    time_new = time.time()
+    print("%.4f sec" % (time_new - time_sub))
+    time_sub = time_new
 
-        elif use_edges and (line_start == b'l' or context_multi_line == b'l'):
-            # very similar to the face load function above with some parts removed
+    yield 0.0
 
-            if context_multi_line:
-                # use face_vert_loc_indices and face_vert_tex_indices previously defined and used the obj_face
-                pass
+    verts_loc = data.verts_loc
+    verts_blenddata_idx = data.verts_blenddata_idx
 
-            else:
-                line_split = line_split[1:]
-                face_vert_loc_indices = []
-                face_vert_tex_indices = []
-
-                # Instance a face
-                faces.append((face_vert_loc_indices,
-                              face_vert_tex_indices,
-                              context_material,
-                              context_smooth_group,
-                              context_object,
-                              ))
-
-            if strip_slash(line_split):
-                context_multi_line = b'l'
-            else:
-                context_multi_line = b''
-
-            # isline = line_start == b'l'  # UNUSED
-
-            for v in line_split:
-                obj_vert = v.split(b'/')
-                vert_loc_index = int(obj_vert[0]) - 1
-
-                # Make relative negative vert indices absolute
-                if vert_loc_index < 0:
-                    vert_loc_index = len(verts_loc) + vert_loc_index + 1
-
-                face_vert_loc_indices.append(vert_loc_index)
-
-        elif line_start == b's':
-            if use_smooth_groups:
-                context_smooth_group = line_value(line_split)
-                if context_smooth_group == b'off':
-                    context_smooth_group = None
-                elif context_smooth_group:  # is not None
-                    unique_smooth_groups[context_smooth_group] = None
-
-        elif line_start == b'o':
-            if use_split_objects:
-                context_object = line_value(line_split)
-                # unique_obects[context_object]= None
-
-        elif line_start == b'g':
-            if use_split_groups:
-                context_object = line_value(line.split())
-                # print 'context_object', context_object
-                # unique_obects[context_object]= None
-            elif use_groups_as_vgroups:
-                context_vgroup = line_value(line.split())
-                if context_vgroup and context_vgroup != b'(null)':
-                    vertex_groups.setdefault(context_vgroup, [])
-                else:
-                    context_vgroup = None  # dont assign a vgroup
-
-        elif line_start == b'usemtl':
-            context_material = line_value(line.split())
-            unique_materials[context_material] = None
-        elif line_start == b'mtllib':  # usemap or usemat
-            material_libs = list(set(material_libs) | set(line.split()[1:]))  # can have multiple mtllib filenames per line, mtllib can appear more than once, so make sure only occurance of material exists
-
-            # Nurbs support
-        elif line_start == b'cstype':
-            context_nurbs[b'cstype'] = line_value(line.split())  # 'rat bspline' / 'bspline'
-        elif line_start == b'curv' or context_multi_line == b'curv':
-            curv_idx = context_nurbs[b'curv_idx'] = context_nurbs.get(b'curv_idx', [])  # in case were multiline
-
-            if not context_multi_line:
-                context_nurbs[b'curv_range'] = float_func(line_split[1]), float_func(line_split[2])
-                line_split[0:3] = []  # remove first 3 items
-
-            if strip_slash(line_split):
-                context_multi_line = b'curv'
-            else:
-                context_multi_line = b''
-
-            for i in line_split:
-                vert_loc_index = int(i) - 1
+    print('\tbuilding geometry...\n\tverts:%i faces:%i materials: %i smoothgroups:%i ...' % (len(verts_loc), len(data.faces), len(data.unique_materials), len(data.unique_smooth_groups)))
+    # Split the mesh by objects/materials, may
+    if use_split_objects or use_split_groups:
+        SPLIT_OB_OR_GROUP = True
+    else:
+        SPLIT_OB_OR_GROUP = False
 
-                if vert_loc_index < 0:
-                    vert_loc_index = len(verts_loc) + vert_loc_index + 1
+    # MMObj: if the array counts mismatch, then the groups will point at the wrong verts
+    if verts_blenddata_idx > 0 and len(verts_loc) != verts_blenddata_idx:
+        raise Exception("blend data count does not match vertex count, blend weights are invalid (vert count: %i, blend data count: %i)" % (len(verts_loc), verts_blenddata_idx))
 
-                curv_idx.append(vert_loc_index)
+    splits = split_mesh(verts_loc, data.faces, data.unique_materials, filepath, SPLIT_OB_OR_GROUP, data.weighted_groups)
+    for split_index, (verts_loc_split, faces_split, unique_materials_split, dataname, weighted_groups_split) in enumerate(splits):
+        # Create meshes from the data, warning 'vertex_groups' wont support splitting
+        for progress in create_mesh_iter(new_objects,
+                                         new_meshes,
+                                         data.has_ngons,
+                                         use_ngons,
+                                         use_edges,
+                                         verts_loc_split,
+                                         data.verts_tex,
+                                         faces_split,
+                                         unique_materials_split,
+                                         data.unique_material_images,
+                                         data.unique_smooth_groups,
+                                         data.vertex_groups,
+                                         weighted_groups_split,
+                                         data.pos_xforms,
+                                         data.uv_xforms,
+                                         dataname,
+                                         data.verts_nor,
+                                         ):
+            yield (split_index + progress) / len(splits)
 
-        elif line_start == b'parm' or context_multi_line == b'parm':
-            if context_multi_line:
-                context_multi_line = b''
-            else:
-                context_parm = line_split[1]
-                line_split[0:2] = []  # remove first 2
+    # nurbs support
+    for context_nurbs in data.nurbs:
+        create_nurbs(context_nurbs, verts_loc, new_objects)
 
-            if strip_slash(line_split):
-                context_multi_line = b'parm'
-            else:
-                context_multi_line = b''
-
-            if context_parm.lower() == b'u':
-                context_nurbs.setdefault(b'parm_u', []).extend([float_func(f) for f in line_split])
-            elif context_parm.lower() == b'v':  # surfaces not supported yet
-                context_nurbs.setdefault(b'parm_v', []).extend([float_func(f) for f in line_split])
-            # else: # may want to support other parm's ?
-
-        elif line_start == b'deg':
-            context_nurbs[b'deg'] = [int(i) for i in line.split()[1:]]
-        elif line_start == b'end':
-            # Add the nurbs curve
-            if context_object:
-                context_nurbs[b'name'] = context_object
-            nurbs.append(context_nurbs)
-            context_nurbs = {}
-            context_parm = b''
-
-        ''' # How to use usemap? depricated?
-        elif line_start == b'usema': # usemap or usemat
-            context_image= line_value(line_split)
-        '''
-
-    file.close()
     time_new = time.time()
     print("%.4f sec" % (time_new - time_sub))
-    time_sub = time_new
 
-    print('\tloading materials and images...')
-    create_materials(filepath, relpath, material_libs, unique_materials, unique_material_images, use_image_search, float_func)
 
-    time_new = time.time()
-    print("%.4f sec" % (time_new - time_sub))
-    time_sub = time_new
+def link_objects(context, new_objects, global_clamp_size=0.0, global_matrix=None):
+    """
+    Links new objects into the scene (selecting only them), smooths them and applies the clamp size.
+    """
+    if global_matrix is None:
+        global_matrix = mathutils.Matrix()
 
     # deselect all
     if bpy.ops.object.select_all.poll():
@@ -1164,41 +1158,6 @@ def load(operator, context, filepath,
 
     scene = context.scene
 #     scn.objects.selected = []
-    new_objects = []  # put new objects here
-
-    print('\tbuilding geometry...\n\tverts:%i faces:%i materials: %i smoothgroups:%i ...' % (len(verts_loc), len(faces), len(unique_materials), len(unique_smooth_groups)))
-    # Split the mesh by objects/materials, may
-    if use_split_objects or use_split_groups:
-        SPLIT_OB_OR_GROUP = True
-    else:
-        SPLIT_OB_OR_GROUP = False
-
-    for verts_loc_split, faces_split, unique_materials_split, dataname in split_mesh(verts_loc, faces, unique_materials, filepath, SPLIT_OB_OR_GROUP):
-        # MMObj: split_mesh doesn't know how to split the weight groups, so if the array counts mismatch, then the groups will point at the wrong verts
-        if verts_blenddata_idx > 0 and len(verts_loc_split) != verts_blenddata_idx:
-            raise Exception("split changed vertex count and thus blend weights are invalid: retry with mesh split options disabled (orig vert count: %i, new count: %i)" % (verts_blenddata_idx, len(verts_loc_split)))
-            
-        # Create meshes from the data, warning 'vertex_groups' wont support splitting
-        create_mesh(new_objects,
-                    has_ngons,
-                    use_ngons,
-                    use_edges,
-                    verts_loc_split,
-                    verts_tex,
-                    faces_split,
-                    unique_materials_split,
-                    unique_material_images,
-                    unique_smooth_groups,
-                    vertex_groups,
-                    weighted_groups,
-                    pos_xforms,
-                    uv_xforms,
-                    dataname,
-                    )
-
-    # nurbs support
-    for context_nurbs in nurbs:
-        create_nurbs(context_nurbs, verts_loc, new_objects)
 
     # Create new obj
     for obj in new_objects:
@@ -1216,7 +1175,7 @@ def load(operator, context, filepath,
     context_py = context.copy()
     context_py["selected_editable_objects"] = list(selected_editable_objects)
     bpy.ops.object.shade_smooth(context_py)
-        
+
     scene.update()
 
     axis_min = [1000000000] * 3
@@ -1242,7 +1201,570 @@ def load(operator, context, filepath,
         for obj in new_objects:
             obj.scale = scale, scale, scale
 
+
+def build(context, datas,
+          new_objects,
+          new_meshes,
+          global_clamp_size=0.0,
+          use_ngons=True,
+          use_edges=True,
+          use_split_objects=True,
+          use_split_groups=True,
+          use_image_search=True,
+          relpath=None,
+          global_matrix=None,
+          cache=None,
+          use_shape_keys=False,
+          proxy_object=None,
+          ):
+    """
+    Creates blender objects from a list of parsed MMObjData and links them all into the scene at the end,
+    so the scene is only updated once.  This is a generator that yields the fraction built so far.
+    With use_shape_keys, files with the same topology as an earlier file (see MMObjData.topology_key) are
+    added to that file's mesh as shape keys instead of becoming meshes of their own.
+    If proxy_object is given (see create_proxy), the built mesh replaces its proxy mesh instead of being
+    linked as a new object.
+    """
+    basis_objects = {}  # topology key: object
+    for data_index, data in enumerate(datas):
+        if use_shape_keys and not (use_split_objects or use_split_groups):
+            key = data.topology_key()
+            ob = basis_objects.get(key)
+            if ob is not None:
+                add_shape_key(ob, data)
+                yield (data_index + 1) / len(datas)
+                continue
+            first_new = len(new_objects)
+
+        for progress in build_objects(data, new_objects, new_meshes,
+                                      use_ngons=use_ngons,
+                                      use_edges=use_edges,
+                                      use_split_objects=use_split_objects,
+                                      use_split_groups=use_split_groups,
+                                      use_image_search=use_image_search,
+                                      relpath=relpath,
+                                      cache=cache,
+                                      ):
+            yield (data_index + progress) / len(datas)
+
+        if use_shape_keys and not (use_split_objects or use_split_groups):
+            meshes = [ob for ob in new_objects[first_new:] if ob.type == 'MESH']
+            if len(meshes) == 1 and len(meshes[0].data.vertices) == len(data.verts_loc):
+                basis_objects[key] = meshes[0]
+
+    if proxy_object is not None:
+        replace_proxy(context, proxy_object, new_objects)
+    if proxy_object is None or new_objects:
+        link_objects(context, new_objects, global_clamp_size, global_matrix)
+    yield 1.0
+
+
+# bounding box corners, as (min, max) selectors per axis
+BOX_CORNERS = np.array([(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)])
+
+# import options that a proxy keeps for building its full mesh later
+PROXY_OPTIONS = ("use_ngons", "use_smooth_groups", "use_edges", "use_image_search", "use_normals")
+
+
+def create_proxy(filepath, max_triangles=proxy_mmobj.PROXY_TRIANGLES, **options):
+    """
+    Returns an (unlinked) preview object for filepath (str) built from a sample of its triangles (see
+    proxy_mmobj), with the corners of the full mesh's bounds as loose vertices so that it frames and
+    clamps like the full mesh.  The import options are kept on the object for building the full mesh
+    later (see load).
+    """
+    time_main = time.time()
+    proxy = proxy_mmobj.read_proxy(filepath, max_triangles)
+
+    lo, hi = proxy.bounds
+    corners = np.where(BOX_CORNERS, hi, lo).astype(np.float32)
+    positions = np.vstack((proxy.positions, corners))
+
+    new_objects = []
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    ob = create_mesh_from_arrays(new_objects, [], positions, proxy.triangles,
+                                 None, None, None, None, None, [], [], name)
+    ob.show_bounds = True
+
+    proxy_options = {key: options[key] for key in PROXY_OPTIONS if key in options}
+    proxy_options["filepath"] = filepath
+    ob["mmobj_proxy"] = proxy_options
+
+    print("\tproxy of %r: %i of ~%i triangles in %.4f sec" % (filepath, len(proxy.triangles),
+                                                              proxy.num_triangles, time.time() - time_main))
+    return ob
+
+
+def replace_proxy(context, proxy_object, new_objects):
+    """
+    Moves the first mesh in new_objects into proxy_object in place of its proxy mesh, along with its
+    vertex groups, and removes the object that was built for it.  proxy_object keeps its name,
+    transform, selection and anything else the user changed while the full mesh was being built.
+    """
+    built = next((ob for ob in new_objects if ob.type == 'MESH'), None)
+    if built is None:
+        return
+    new_objects.remove(built)
+
+    proxy_object.vertex_groups.clear()
+    for group in built.vertex_groups:
+        proxy_object.vertex_groups.new(group.name)
+
+    me = built.data
+    me.polygons.foreach_set("use_smooth", np.ones(len(me.polygons), dtype=bool))
+    proxy_mesh = proxy_object.data
+    proxy_object.data = me
+    proxy_object.show_bounds = False
+    bpy.data.objects.remove(built)
+    if proxy_mesh.users == 0:
+        bpy.data.meshes.remove(proxy_mesh)
+    if "mmobj_proxy" in proxy_object:
+        del proxy_object["mmobj_proxy"]
+    context.scene.update()
+
+
+def add_shape_key(ob, data):
+    """
+    Adds the positions of data to ob's mesh as a shape key named after its file, with one bulk
+    coordinate set.  The first key added also creates the basis key.
+    """
+    if ob.data.shape_keys is None:
+        ob.shape_key_add(name="Basis", from_mix=False)
+    name = os.path.splitext(os.path.basename(data.filepath))[0].decode('utf-8', "replace")
+    key_block = ob.shape_key_add(name=name, from_mix=False)
+    key_block.data.foreach_set("co", np.array(data.verts_loc, dtype=np.float32).ravel())
+    print("\tadded %r to %r as a shape key" % (name, ob.name))
+
+
+def parse_many(filepaths, progress=None, cancel=None, **parse_options):
+    """
+    Parses several files on a pool of worker threads; returns their MMObjData in the same order.
+    The parser is pure python, so this is concurrent but not parallel: the threads take turns on one
+    core, and only reading the files overlaps.  Processes would be parallel, but started from blender
+    they are new blender instances.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if len(filepaths) == 1:
+        return [parse(filepaths[0], progress=progress, cancel=cancel, **parse_options)]
+
+    fractions = [0.0] * len(filepaths)
+
+    def parse_one(index):
+        def file_progress(fraction):
+            fractions[index] = fraction
+            if progress is not None:
+                progress(sum(fractions) / len(fractions))
+        return parse(filepaths[index], progress=file_progress, cancel=cancel, **parse_options)
+
+    with ThreadPoolExecutor(max_workers=min(len(filepaths), PARSE_THREADS)) as pool:
+        return list(pool.map(parse_one, range(len(filepaths))))
+
+
+def remove_partial(context, datas, new_objects, new_meshes):
+    """
+    Removes everything that a cancelled or failed build created.
+    """
+    scene = context.scene
+    for ob in new_objects:
+        if ob.name in scene.objects:
+            scene.objects.unlink(ob)
+        obdata = ob.data
+        bpy.data.objects.remove(ob)
+        if obdata is not None and obdata.users == 0 and obdata.name in bpy.data.curves:
+            bpy.data.curves.remove(obdata)
+    for me in new_meshes:
+        if me.users == 0:
+            bpy.data.meshes.remove(me)
+    removed = set()
+    # images that load_image made for this build's textures and face images
+    images = {}
+    for data in datas or ():
+        for image in data.unique_material_images.values():
+            if image is not None:
+                images[image.as_pointer()] = image
+        for mat in data.unique_materials.values():
+            if mat is None or mat.users != 0 or mat.as_pointer() in removed:
+                continue
+            removed.add(mat.as_pointer())
+            for mtex in mat.texture_slots:
+                if mtex and mtex.texture and mtex.texture.users == 1:
+                    tex = mtex.texture
+                    if getattr(tex, "image", None) is not None:
+                        images[tex.image.as_pointer()] = tex.image
+                    mtex.texture = None
+                    bpy.data.textures.remove(tex)
+            bpy.data.materials.remove(mat)
+    for image in images.values():
+        if image.users == 0:
+            bpy.data.images.remove(image)
+    del new_objects[:]
+    del new_meshes[:]
+
+
+def load(operator, context, filepath,
+         global_clamp_size=0.0,
+         use_ngons=True,
+         use_smooth_groups=True,
+         use_edges=True,
+         use_split_objects=True,
+         use_split_groups=True,
+         use_image_search=True,
+         use_groups_as_vgroups=False,
+         relpath=None,
+         global_matrix=None,
+         filepaths=None,
+         use_shape_keys=False,
+         use_normals=False,
+         proxy_object=None,
+         ):
+    """
+    Called by the user interface or another script.
+    load_obj(path) - should give acceptable results.
+    This function passes the file and sends the data off
+        to be split into objects and then converted into mesh objects
+    If filepaths is given, all of those files are imported instead of filepath: they are parsed
+    concurrently (see parse_many) and share images and materials.  With use_shape_keys, files that only differ from an earlier
+    one in their positions become shape keys of its mesh.  With use_normals, the file's vn normals are applied
+    as custom split normals.  If proxy_object is given, filepath is built into it in place of its proxy mesh.
+    """
+    if not filepaths:
+        filepaths = [filepath]
+
+    print('\nimporting obj %s' % ", ".join(repr(f) for f in filepaths))
+
+    filepaths = [os.fsencode(f) for f in filepaths]
+
+    if proxy_object is not None:
+        use_split_objects = use_split_groups = use_shape_keys = False
+
+    if use_split_objects or use_split_groups:
+        use_groups_as_vgroups = False
+
+    time_main = time.time()
+
+    print("\tparsing obj file...")
+    time_sub = time.time()
+    datas = parse_many(filepaths,
+                       use_smooth_groups=use_smooth_groups,
+                       use_edges=use_edges,
+                       use_split_objects=use_split_objects,
+                       use_split_groups=use_split_groups,
+                       use_groups_as_vgroups=use_groups_as_vgroups,
+                       use_normals=use_normals,
+                       )
+    time_new = time.time()
+    print("%.4f sec" % (time_new - time_sub))
+
+    new_objects = []  # put new objects here
+    for _progress in build(context, datas, new_objects, [],
+                           global_clamp_size=global_clamp_size,
+                           use_ngons=use_ngons,
+                           use_edges=use_edges,
+                           use_split_objects=use_split_objects,
+                           use_split_groups=use_split_groups,
+                           use_image_search=use_image_search,
+                           relpath=relpath,
+                           global_matrix=global_matrix,
+                           cache=ImportCache() if len(datas) > 1 else None,
+                           use_shape_keys=use_shape_keys,
+                           proxy_object=proxy_object,
+                           ):
+        pass
+
     time_new = time.time()
 
-    print("finished importing: %r in %.4f sec." % (filepath, (time_new - time_main)))
+    print("finished importing: %s in %.4f sec." % (", ".join(repr(f) for f in filepaths), (time_new - time_main)))
     return {'FINISHED'}
+
+
+def snapshot_material(filepath, use_image_search, relpath):
+    """
+    Returns (material, image) from the .mtl that the snapshot wrote with its mmobj, or (None, None).
+    """
+    unique_materials = {b'(null)': None}
+    unique_material_images = {}
+    mmobj_path = os.fsencode(snapshot_dat.snapshot_basename(filepath)) + b'.mmobj'
+    if not os.path.exists(os.path.splitext(mmobj_path)[0] + b'.mtl'):
+        return None, None
+    create_materials(mmobj_path, relpath, [], unique_materials, unique_material_images,
+                     use_image_search, float)
+    return unique_materials[b'(null)'], unique_material_images[b'(null)']
+
+
+def load_snapshot_dat(operator, context, filepath,
+                      global_clamp_size=0.0,
+                      use_snapshot_xforms=True,
+                      use_image_search=True,
+                      relpath=None,
+                      global_matrix=None,
+                      ):
+    """
+    Imports a snapshot from its raw _VBDecl.dat, _VB.dat and _IB.dat files instead of its mmobj.
+    The buffers are mapped and decoded as arrays, which is much faster than parsing the mmobj text.
+    If use_snapshot_xforms is set, the transforms recorded in the snapshot's mmobj are applied so the result
+    is in the same space (and has the same transform groups) as an import of that mmobj.
+    """
+    print('\nimporting snapshot buffers %r' % filepath)
+    time_main = time.time()
+
+    mesh = snapshot_dat.read_snapshot(filepath)
+    base = snapshot_dat.snapshot_basename(filepath)
+
+    pos_xforms, uv_xforms = [], []
+    if use_snapshot_xforms:
+        pos_xforms, uv_xforms = snapshot_dat.read_xforms(base + ".mmobj")
+        snapshot_dat.apply_xforms(mesh, pos_xforms, uv_xforms)
+
+    print('\tverts:%i triangles:%i decoded in %.4f sec' % (len(mesh.positions), len(mesh.triangles),
+                                                           time.time() - time_main))
+
+    material, image = snapshot_material(filepath, use_image_search, relpath)
+
+    new_objects = []
+    create_mesh_from_arrays(new_objects, [],
+                            mesh.positions,
+                            mesh.triangles,
+                            mesh.uvs,
+                            mesh.blend_indices,
+                            mesh.blend_weights,
+                            material,
+                            image,
+                            pos_xforms,
+                            uv_xforms,
+                            os.path.basename(base),
+                            )
+    link_objects(context, new_objects, global_clamp_size, global_matrix)
+
+    print("finished importing: %r in %.4f sec." % (filepath, time.time() - time_main))
+    return {'FINISHED'}
+
+
+class BackgroundImport:
+    """
+    Drives an import without blocking blender: the files are parsed on worker threads (which
+    never touch bpy), then the meshes are built on the main thread a slice at a time by calling
+    step() from a modal operator's timer events.
+    """
+    def __init__(self, filepath,
+                 global_clamp_size=0.0,
+                 use_ngons=True,
+                 use_smooth_groups=True,
+                 use_edges=True,
+                 use_split_objects=True,
+                 use_split_groups=True,
+                 use_image_search=True,
+                 use_groups_as_vgroups=False,
+                 relpath=None,
+                 global_matrix=None,
+                 filepaths=None,
+                 use_shape_keys=False,
+                 use_normals=False,
+                 proxy_object=None,
+                 ):
+        import threading
+
+        if proxy_object is not None:
+            use_split_objects = use_split_groups = use_shape_keys = False
+
+        if use_split_objects or use_split_groups:
+            use_groups_as_vgroups = False
+
+        self.filepaths = [os.fsencode(f) for f in (filepaths or [filepath])]
+        self.progress = 0.0  # 0-0.5 is parsing, 0.5-1 is building
+        self.datas = None
+        self.new_objects = []
+        self.new_meshes = []
+
+        self._build_options = dict(global_clamp_size=global_clamp_size,
+                                   use_ngons=use_ngons,
+                                   use_edges=use_edges,
+                                   use_split_objects=use_split_objects,
+                                   use_split_groups=use_split_groups,
+                                   use_image_search=use_image_search,
+                                   relpath=relpath,
+                                   global_matrix=global_matrix,
+                                   cache=ImportCache() if len(self.filepaths) > 1 else None,
+                                   use_shape_keys=use_shape_keys,
+                                   proxy_object=proxy_object,
+                                   )
+        self._parse_options = dict(use_smooth_groups=use_smooth_groups,
+                                   use_edges=use_edges,
+                                   use_split_objects=use_split_objects,
+                                   use_split_groups=use_split_groups,
+                                   use_groups_as_vgroups=use_groups_as_vgroups,
+                                   use_normals=use_normals,
+                                   )
+        self._builder = None
+        self._error = None
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._parse, name="mmobj parse")
+        self._thread.daemon = True
+        self._time_main = time.time()
+
+    def _parse_progress(self, fraction):
+        self.progress = fraction * 0.5
+
+    def _parse(self):
+        try:
+            self.datas = parse_many(self.filepaths, progress=self._parse_progress, cancel=self._cancel,
+                                    **self._parse_options)
+        except ImportCancelled:
+            pass
+        except Exception as e:
+            self._error = e
+
+    def start(self):
+        print('\nimporting obj %s in the background' % ", ".join(repr(f) for f in self.filepaths))
+        self._thread.start()
+
+    def step(self, context, time_slice):
+        """
+        Does at most about time_slice seconds of main thread work; returns True when the import is done.
+        Raises if parsing or building failed; the caller should then call cancel().
+        """
+        if self._builder is None:
+            if self._thread.is_alive():
+                return False
+            if self._error is not None:
+                raise self._error
+            self._builder = build(context, self.datas, self.new_objects, self.new_meshes, **self._build_options)
+
+        end_time = time.time() + time_slice
+        for progress in self._builder:
+            self.progress = 0.5 + progress * 0.5
+            if time.time() >= end_time:
+                return False
+
+        print("finished importing: %s in %.4f sec." % (", ".join(repr(f) for f in self.filepaths),
+                                                       (time.time() - self._time_main)))
+        return True
+
+    def cancel(self, context):
+        """
+        Stops the parser threads and removes anything that was built so far.
+        """
+        self._cancel.set()
+        self._thread.join()
+        if self._builder is not None:
+            self._builder.close()
+        remove_partial(context, self.datas, self.new_objects, self.new_meshes)
+        print("cancelled importing: %s" % ", ".join(repr(f) for f in self.filepaths))
+
+
+class ProxyBuild:
+    """
+    Builds the full meshes of several proxies in the background, one after another, with the same
+    start/step/cancel interface as BackgroundImport.  All files are parsed at once.
+    """
+    def __init__(self, jobs):
+        self.jobs = jobs  # BackgroundImports with a proxy_object
+        self.progress = 0.0
+        self._index = 0
+
+    def start(self):
+        for job in self.jobs:
+            job.start()
+
+    def step(self, context, time_slice):
+        while self._index < len(self.jobs):
+            job = self.jobs[self._index]
+            if not job.step(context, time_slice):
+                self.progress = (self._index + job.progress) / len(self.jobs)
+                return False
+            self._index += 1
+        return True
+
+    def cancel(self, context):
+        """
+        Cancels the builds that haven't finished; their proxies are left in place.
+        """
+        for job in self.jobs[self._index:]:
+            job.cancel(context)
+
+
+class SnapshotInbox:
+    """
+    Imports new snapshots as they appear in a directory, into a group of their own.  Captures are
+    found and parsed by a watch_mmobj.SnapshotWatcher thread; step() builds them on the main thread a
+    slice at a time, like BackgroundImport.
+    """
+    def __init__(self, directory,
+                 group_name="MMSnapshots",
+                 use_image_search=True,
+                 use_normals=False,
+                 relpath=None,
+                 global_matrix=None,
+                 ):
+        self.group_name = group_name
+        self.watcher = watch_mmobj.SnapshotWatcher(directory,
+                                                   use_split_objects=False,
+                                                   use_split_groups=False,
+                                                   use_normals=use_normals,
+                                                   )
+        self.new_objects = []
+        self.new_meshes = []
+        self._build_options = dict(use_split_objects=False,
+                                   use_split_groups=False,
+                                   use_image_search=use_image_search,
+                                   relpath=relpath,
+                                   global_matrix=global_matrix,
+                                   )
+        self._builder = None
+        self._current = None
+
+    def start(self):
+        print('\nwatching %r for snapshots' % self.watcher.directory)
+        self.watcher.start()
+
+    def _add_to_group(self):
+        group = bpy.data.groups.get(self.group_name)
+        if group is None:
+            group = bpy.data.groups.new(self.group_name)
+        for ob in self.new_objects:
+            group.objects.link(ob)
+
+    def step(self, context, time_slice):
+        """
+        Does at most about time_slice seconds of main thread work.  Returns a list of (path, error) for
+        the captures that were finished (error is None) or failed in this step.
+        """
+        finished = []
+        end_time = time.time() + time_slice
+        while time.time() < end_time:
+            if self._builder is None:
+                item = self.watcher.get()
+                if item is None:
+                    break
+                path, data, error = item
+                if error is not None:
+                    finished.append((path, error))
+                    continue
+                self._current = path, data
+                self.new_objects, self.new_meshes = [], []
+                self._builder = build(context, [data], self.new_objects, self.new_meshes, **self._build_options)
+
+            try:
+                for _progress in self._builder:
+                    if time.time() >= end_time:
+                        return finished
+            except Exception as e:
+                remove_partial(context, [self._current[1]], self.new_objects, self.new_meshes)
+                finished.append((self._current[0], e))
+            else:
+                self._add_to_group()
+                finished.append((self._current[0], None))
+            self._builder = None
+            self._current = None
+        return finished
+
+    def stop(self, context):
+        """
+        Stops watching; a capture that was half built is removed.
+        """
+        self.watcher.stop()
+        if self._builder is not None:
+            self._builder.close()
+            remove_partial(context, [self._current[1]], self.new_objects, self.new_meshes)
+            self._builder = None
+        print('stopped watching %r for snapshots' % self.watcher.directory)
@@ -0,0 +1,453 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Parses ModelMod OBJ files into plain python data.
+
+This module must not import bpy: the importer runs it on a worker thread so that Blender's UI
+stays responsive while large files are read, and the tools outside of blender use it directly.
+"""
+
+import os
+import hashlib
+from array import array
+
+
+class ImportCancelled(Exception):
+    """Raised by parse() when its cancel event is set"""
+    pass
+
+
+class MMObjData:
+    """
+    Everything read from an mmobj file that the importer needs to build objects.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.verts_loc = []
+        self.verts_tex = []
+        self.verts_nor = []  # only when use_normals is true
+        self.faces = []  # tuples of the faces
+        self.material_libs = []  # filanems to material libs this uses
+        self.vertex_groups = {}  # when use_groups_as_vgroups is true
+
+        # used by modelmod to create weighted-index vgroups:
+        self.verts_blenddata_idx = 0
+        self.weighted_groups = {}
+        self.pos_xforms = []
+        self.uv_xforms = []
+
+        self.nurbs = []
+        self.has_ngons = False
+
+        # Until we can use sets
+        self.unique_materials = {}
+        self.unique_material_images = {}
+        self.unique_smooth_groups = {}
+
+        self.float_func = float
+
+    def topology_key(self):
+        """
+        Returns a key that is equal for files that differ only in their vertex positions: the element
+        counts plus a hash of the face position and uv indices.  Must be called before the faces are
+        handed to the mesh builder, which modifies them.
+        """
+        digest = hashlib.sha1()
+        for face in self.faces:
+            digest.update(array('l', [len(face[0])] + face[0] + face[1]).tobytes())
+        return (len(self.verts_loc), len(self.verts_tex), len(self.faces), self.verts_blenddata_idx,
+                digest.hexdigest())
+
+
+def line_value(line_split):
+    """
+    Returns 1 string represneting the value for this line
+    None will be returned if theres only 1 word
+    """
+    length = len(line_split)
+    if length == 1:
+        return None
+
+    elif length == 2:
+        return line_split[1]
+
+    elif length > 2:
+        return b' '.join(line_split[1:])
+
+
+def strip_slash(line_split):
+    if line_split[-1][-1] == 92:  # '\' char
+        if len(line_split[-1]) == 1:
+            line_split.pop()  # remove the \ item
+        else:
+            line_split[-1] = line_split[-1][:-1]  # remove the \ from the end last number
+        return True
+    return False
+
+
+def get_float_func(filepath):
+    """
+    find the float function for this obj file
+    - whether to replace commas or not
+    """
+    file = open(filepath, 'rb')
+    for line in file:  # .readlines():
+        line = line.lstrip()
+        if line.startswith(b'v'):  # vn vt v
+            if b',' in line:
+                file.close()
+                return lambda f: float(f.replace(b',', b'.'))
+            elif b'.' in line:
+                file.close()
+                return float
+
+    file.close()
+    # in case all vert values were ints
+    return float
+
+
+def zeropad(s, n):
+    while (len(s) < n):
+        s = b'0' + s
+    return s
+
+
+# how many lines to read between progress reports and cancel checks
+PROGRESS_LINES = 65536
+
+
+def parse(filepath,
+          use_smooth_groups=True,
+          use_edges=True,
+          use_split_objects=True,
+          use_split_groups=True,
+          use_groups_as_vgroups=False,
+          use_normals=False,
+          progress=None,
+          cancel=None,
+          ):
+    """
+    Reads filepath (bytes) and returns an MMObjData.
+
+    Faces are (loc indices, tex indices, material, smooth group, object, nor indices) tuples.  vn records and
+    the normal indices of faces are only read if use_normals is true; otherwise the nor indices are empty.
+
+    progress, if given, is called from the parsing thread with the fraction of the file read so far.
+    cancel, if given, is a threading.Event; parsing stops with ImportCancelled once it is set.
+    """
+    data = MMObjData(filepath)
+
+    verts_loc = data.verts_loc
+    verts_tex = data.verts_tex
+    verts_nor = data.verts_nor
+    faces = data.faces
+    material_libs = data.material_libs
+    vertex_groups = data.vertex_groups
+
+    verts_blenddata_idx = 0
+    weighted_groups = data.weighted_groups
+    pos_xforms = []
+    uv_xforms = []
+
+    # Get the string to float conversion func for this file- is 'float' for almost all files.
+    float_func = data.float_func = get_float_func(filepath)
+
+    # Context variables
+    context_material = None
+    context_smooth_group = None
+    context_object = None
+    context_vgroup = None
+
+    # Nurbs
+    context_nurbs = {}
+    nurbs = data.nurbs
+    context_parm = b''  # used by nurbs too but could be used elsewhere
+
+    has_ngons = False
+    # has_smoothgroups= False - is explicit with len(unique_smooth_groups) being > 0
+
+    unique_materials = data.unique_materials
+    unique_smooth_groups = data.unique_smooth_groups
+    # unique_obects= {} - no use for this variable since the objects are stored in the face.
+
+    # when there are faces that end with \
+    # it means they are multiline-
+    # since we use xreadline we cant skip to the next line
+    # so we need to know whether
+    context_multi_line = b''
+
+    file_size = max(os.path.getsize(filepath), 1)
+    line_count = 0
+
+    file = open(filepath, 'rb')
+    for line in file:  # .readlines():
+        line_count += 1
+        if line_count == PROGRESS_LINES:
+            line_count = 0
+            if cancel is not None and cancel.is_set():
+                file.close()
+                raise ImportCancelled()
+            if progress is not None:
+                progress(file.tell() / file_size)
+
+        line_split = line.split()
+
+        if not line_split:
+            continue
+
+        line_start = line_split[0]  # we compare with this a _lot_
+
+        if line_start == b'v':
+            verts_loc.append((float_func(line_split[1]), float_func(line_split[2]), float_func(line_split[3])))
+
+        elif line_start == b'#vbld' or context_multi_line == b'#vbld':
+            groups = line_split[1:]
+            vidx = verts_blenddata_idx
+            verts_blenddata_idx += 1
+            for g in groups:
+                idx, weight = g.split(b'/')
+                weight = float_func(weight)
+                if (weight > 0.0):
+                    gname = b'Index.' + zeropad(idx, 2)
+                    weighted_groups.setdefault(gname, {})
+                    weighted_groups[gname][vidx] = weight
+
+            context_multi_line = b''
+        elif line_start == b'#pos_xforms' or context_multi_line == b'#pos_xforms':
+            # don't interpret this, its just baggage that needs to be passed through by the exporter.
+            pos_xforms = line_split[1:]
+            context_multi_line = b''
+        elif line_start == b'#uv_xforms' or context_multi_line == b'#uv_xforms':
+            # don't interpret this, its just baggage that needs to be passed through by the exporter.
+            uv_xforms = line_split[1:]
+            context_multi_line = b''
+
+        elif line_start == b'vn':
+            if use_normals:
+                verts_nor.append((float_func(line_split[1]), float_func(line_split[2]), float_func(line_split[3])))
+
+        elif line_start == b'vt':
+            verts_tex.append((float_func(line_split[1]), float_func(line_split[2])))
+
+        # Handel faces lines (as faces) and the second+ lines of fa multiline face here
+        # use 'f' not 'f ' because some objs (very rare have 'fo ' for faces)
+        elif line_start == b'f' or context_multi_line == b'f':
+            if context_multi_line:
+                # use face_vert_loc_indices and face_vert_tex_indices previously defined and used the obj_face
+                pass
+
+            else:
+                line_split = line_split[1:]
+                face_vert_loc_indices = []
+                face_vert_tex_indices = []
+                face_vert_nor_indices = []
+
+                # Instance a face
+                faces.append((face_vert_loc_indices,
+                              face_vert_tex_indices,
+                              context_material,
+                              context_smooth_group,
+                              context_object,
+                              face_vert_nor_indices,
+                              ))
+
+            if strip_slash(line_split):
+                context_multi_line = b'f'
+            else:
+                context_multi_line = b''
+
+            for v in line_split:
+                obj_vert = v.split(b'/')
+                vert_loc_index = int(obj_vert[0]) - 1
+                # Add the vertex to the current group
+                # *warning*, this wont work for files that have groups defined around verts
+                if use_groups_as_vgroups and context_vgroup:
+                    vertex_groups[context_vgroup].append(vert_loc_index)
+
+                # Make relative negative vert indices absolute
+                if vert_loc_index < 0:
+                    vert_loc_index = len(verts_loc) + vert_loc_index + 1
+
+                face_vert_loc_indices.append(vert_loc_index)
+
+                if len(obj_vert) > 1 and obj_vert[1]:
+                    # formatting for faces with normals and textures us
+                    # loc_index/tex_index/nor_index
+
+                    vert_tex_index = int(obj_vert[1]) - 1
+                    # Make relative negative vert indices absolute
+                    if vert_tex_index < 0:
+                        vert_tex_index = len(verts_tex) + vert_tex_index + 1
+
+                    face_vert_tex_indices.append(vert_tex_index)
+                else:
+                    # dummy
+                    face_vert_tex_indices.append(0)
+
+                if use_normals:
+                    if len(obj_vert) > 2 and obj_vert[2]:
+                        vert_nor_index = int(obj_vert[2]) - 1
+                        # Make relative negative vert indices absolute
+                        if vert_nor_index < 0:
+                            vert_nor_index = len(verts_nor) + vert_nor_index + 1
+                        face_vert_nor_indices.append(vert_nor_index)
+                    else:
+                        # no normal; the importer leaves this face's normals alone
+                        face_vert_nor_indices.append(-1)
+
+            if len(face_vert_loc_indices) > 4:
+                has_ngons = True
+
+        elif use_edges and (line_start == b'l' or context_multi_line == b'l'):
+            # very similar to the face load function above with some parts removed
+
+            if context_multi_line:
+                # use face_vert_loc_indices and face_vert_tex_indices previously defined and used the obj_face
+                pass
+
+            else:
+                line_split = line_split[1:]
+                face_vert_loc_indices = []
+                face_vert_tex_indices = []
+
+                # Instance a face
+                faces.append((face_vert_loc_indices,
+                              face_vert_tex_indices,
+                              context_material,
+                              context_smooth_group,
+                              context_object,
+                              [],
+                              ))
+
+            if strip_slash(line_split):
+                context_multi_line = b'l'
+            else:
+                context_multi_line = b''
+
+            # isline = line_start == b'l'  # UNUSED
+
+            for v in line_split:
+                obj_vert = v.split(b'/')
+                vert_loc_index = int(obj_vert[0]) - 1
+
+                # Make relative negative vert indices absolute
+                if vert_loc_index < 0:
+                    vert_loc_index = len(verts_loc) + vert_loc_index + 1
+
+                face_vert_loc_indices.append(vert_loc_index)
+
+        elif line_start == b's':
+            if use_smooth_groups:
+                context_smooth_group = line_value(line_split)
+                if context_smooth_group == b'off':
+                    context_smooth_group = None
+                elif context_smooth_group:  # is not None
+                    unique_smooth_groups[context_smooth_group] = None
+
+        elif line_start == b'o':
+            if use_split_objects:
+                context_object = line_value(line_split)
+                # unique_obects[context_object]= None
+
+        elif line_start == b'g':
+            if use_split_groups:
+                context_object = line_value(line.split())
+                # print 'context_object', context_object
+                # unique_obects[context_object]= None
+            elif use_groups_as_vgroups:
+                context_vgroup = line_value(line.split())
+                if context_vgroup and context_vgroup != b'(null)':
+                    vertex_groups.setdefault(context_vgroup, [])
+                else:
+                    context_vgroup = None  # dont assign a vgroup
+
+        elif line_start == b'usemtl':
+            context_material = line_value(line.split())
+            unique_materials[context_material] = None
+        elif line_start == b'mtllib':  # usemap or usemat
+            material_libs[:] = list(set(material_libs) | set(line.split()[1:]))  # can have multiple mtllib filenames per line, mtllib can appear more than once, so make sure only occurance of material exists
+
+            # Nurbs support
+        elif line_start == b'cstype':
+            context_nurbs[b'cstype'] = line_value(line.split())  # 'rat bspline' / 'bspline'
+        elif line_start == b'curv' or context_multi_line == b'curv':
+            curv_idx = context_nurbs[b'curv_idx'] = context_nurbs.get(b'curv_idx', [])  # in case were multiline
+
+            if not context_multi_line:
+                context_nurbs[b'curv_range'] = float_func(line_split[1]), float_func(line_split[2])
+                line_split[0:3] = []  # remove first 3 items
+
+            if strip_slash(line_split):
+                context_multi_line = b'curv'
+            else:
+                context_multi_line = b''
+
+            for i in line_split:
+                vert_loc_index = int(i) - 1
+
+                if vert_loc_index < 0:
+                    vert_loc_index = len(verts_loc) + vert_loc_index + 1
+
+                curv_idx.append(vert_loc_index)
+
+        elif line_start == b'parm' or context_multi_line == b'parm':
+            if context_multi_line:
+                context_multi_line = b''
+            else:
+                context_parm = line_split[1]
+                line_split[0:2] = []  # remove first 2
+
+            if strip_slash(line_split):
+                context_multi_line = b'parm'
+            else:
+                context_multi_line = b''
+
+            if context_parm.lower() == b'u':
+                context_nurbs.setdefault(b'parm_u', []).extend([float_func(f) for f in line_split])
+            elif context_parm.lower() == b'v':  # surfaces not supported yet
+                context_nurbs.setdefault(b'parm_v', []).extend([float_func(f) for f in line_split])
+            # else: # may want to support other parm's ?
+
+        elif line_start == b'deg':
+            context_nurbs[b'deg'] = [int(i) for i in line.split()[1:]]
+        elif line_start == b'end':
+            # Add the nurbs curve
+            if context_object:
+                context_nurbs[b'name'] = context_object
+            nurbs.append(context_nurbs)
+            context_nurbs = {}
+            context_parm = b''
+
+        ''' # How to use usemap? depricated?
+        elif line_start == b'usema': # usemap or usemat
+            context_image= line_value(line_split)
+        '''
+
+    file.close()
+
+    if progress is not None:
+        progress(1.0)
+
+    data.verts_blenddata_idx = verts_blenddata_idx
+    data.pos_xforms = pos_xforms
+    data.uv_xforms = uv_xforms
+    data.has_ngons = has_ngons
+    return data
@@ -0,0 +1,178 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Reads a cheap preview of a large mmobj file: a spatially even subset of its triangles and its bounds.
+
+Only the lines of the sampled faces and the vertices they use are parsed.  If the snapshot's raw
+buffers (see snapshot_dat) are next to the file they are used instead, since they can be read without
+parsing at all.
+
+Does not need blender.
+"""
+
+import os
+
+import numpy as np
+
+from . import snapshot_dat
+
+# default number of triangles in a proxy
+PROXY_TRIANGLES = 20000
+
+# cells per axis of the grid used to spread the proxy's triangles over the mesh
+PROXY_GRID = 24
+
+# how many more faces than the proxy needs are sampled from a text file before thinning them out
+CANDIDATE_FACTOR = 2
+
+# vertex lines read from a text file to estimate its bounds, in addition to those of the sampled faces
+BOUNDS_SAMPLE = 65536
+
+
+class ProxyData:
+    """
+    A preview mesh: positions, triangles into them, and the (min, max) corners of the full mesh bounds.
+    """
+    def __init__(self, positions, triangles, bounds, num_triangles):
+        self.positions = positions
+        self.triangles = triangles
+        self.bounds = bounds
+        self.num_triangles = num_triangles  # in the full mesh
+
+
+def stratified_triangles(positions, triangles, max_triangles, grid=PROXY_GRID):
+    """
+    Returns the indices of at most max_triangles triangles, spread evenly over space: triangles are
+    binned by centroid into a grid, and each cell contributes its first triangle, then its second, and
+    so on until the budget is used up.  Original order is kept within the result.
+    """
+    if len(triangles) <= max_triangles:
+        return np.arange(len(triangles))
+
+    centroids = positions[triangles].mean(axis=1)
+    lo = centroids.min(axis=0)
+    extent = centroids.max(axis=0) - lo
+    extent[extent == 0.0] = 1.0
+    cells = np.minimum(((centroids - lo) / extent * grid).astype(np.int64), grid - 1)
+    cell_ids = (cells[:, 0] * grid + cells[:, 1]) * grid + cells[:, 2]
+
+    # rank of each triangle within its cell
+    order = np.argsort(cell_ids, kind='mergesort')
+    sorted_cells = cell_ids[order]
+    cell_starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    run_lengths = np.diff(np.r_[cell_starts, len(order)])
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order)) - np.repeat(cell_starts, run_lengths)
+
+    # take whole ranks while they fit, then part of the next one
+    per_rank = np.bincount(ranks)
+    full_ranks = np.searchsorted(np.cumsum(per_rank), max_triangles, side='right')
+    selected = ranks < full_ranks
+    remaining = max_triangles - int(selected.sum())
+    if remaining > 0:
+        partial = np.flatnonzero(ranks == full_ranks)
+        selected[partial[np.linspace(0, len(partial) - 1, remaining).astype(np.int64)]] = True
+    return np.flatnonzero(selected)
+
+
+def _compact(positions, triangles, bounds, num_triangles):
+    used, local = np.unique(triangles, return_inverse=True)
+    return ProxyData(positions[used].astype(np.float32), local.reshape(-1, 3), bounds, num_triangles)
+
+
+def _proxy_from_dat(filepath, max_triangles):
+    mesh = snapshot_dat.read_snapshot(filepath)
+    pos_xforms, _ = snapshot_dat.read_xforms(filepath)
+    snapshot_dat.apply_xforms(mesh, pos_xforms, [])
+    positions = mesh.positions
+    bounds = positions.min(axis=0), positions.max(axis=0)
+    picked = mesh.triangles[stratified_triangles(positions, mesh.triangles, max_triangles)]
+    return _compact(positions, picked, bounds, len(mesh.triangles))
+
+
+def _line(data, starts, ends, i):
+    return data[starts[i]:ends[i]].tobytes().split()
+
+
+def _proxy_from_text(filepath, max_triangles):
+    data = np.fromfile(filepath, dtype=np.uint8)
+    if not len(data):
+        raise ValueError("%r is empty" % filepath)
+
+    newlines = np.flatnonzero(data == ord('\n'))
+    starts = np.r_[0, newlines + 1]
+    ends = np.r_[newlines, len(data)]
+    keep = starts < len(data) - 1
+    starts, ends = starts[keep], ends[keep]
+    first = data[starts]
+    second = data[starts + 1]
+    is_sep = (second == ord(' ')) | (second == ord('\t'))
+
+    v_lines = np.flatnonzero((first == ord('v')) & is_sep)
+    f_lines = np.flatnonzero((first == ord('f')) & is_sep)
+    if not len(v_lines) or not len(f_lines):
+        raise ValueError("%r has no faces" % filepath)
+
+    # sample faces evenly through the file, then parse just those lines
+    num_candidates = min(len(f_lines), max_triangles * CANDIDATE_FACTOR)
+    candidates = f_lines[np.linspace(0, len(f_lines) - 1, num_candidates).astype(np.int64)]
+    triangles = []
+    for line_idx in candidates.tolist():
+        corners = []
+        for corner in _line(data, starts, ends, line_idx)[1:]:
+            vidx = int(corner.split(b'/')[0])
+            if vidx < 0:
+                # relative to the vertices defined before this line
+                vidx += int(np.searchsorted(v_lines, line_idx)) + 1
+            corners.append(vidx - 1)
+        for i in range(1, len(corners) - 1):
+            triangles.append((corners[0], corners[i], corners[i + 1]))
+    triangles = np.array(triangles, dtype=np.int64).reshape(-1, 3)
+    triangles = triangles[(triangles >= 0).all(axis=1) & (triangles < len(v_lines)).all(axis=1)]
+
+    # positions of the used vertices and of an even sample of all of them, for the bounds
+    needed = np.union1d(np.unique(triangles),
+                        np.linspace(0, len(v_lines) - 1, min(len(v_lines), BOUNDS_SAMPLE)).astype(np.int64))
+    positions = np.zeros((len(v_lines), 3), dtype=np.float64)
+    for vidx in needed.tolist():
+        positions[vidx] = [float(f) for f in _line(data, starts, ends, v_lines[vidx])[1:4]]
+    bounds = positions[needed].min(axis=0), positions[needed].max(axis=0)
+
+    picked = triangles[stratified_triangles(positions, triangles, max_triangles)]
+    # estimate of the full triangle count, assuming the sampled faces are typical
+    num_triangles = int(round(len(triangles) * len(f_lines) / float(num_candidates)))
+    return _compact(positions, picked, bounds, num_triangles)
+
+
+def read_proxy(filepath, max_triangles=PROXY_TRIANGLES):
+    """
+    Returns a ProxyData preview of the mmobj at filepath.  The bounds are exact when the snapshot's raw
+    buffers are available and estimated from a sample of the vertices otherwise.
+    """
+    base = snapshot_dat.snapshot_basename(filepath)
+    if all(os.path.exists(base + suffix) for suffix in (snapshot_dat.DECL_SUFFIX,
+                                                        snapshot_dat.VB_SUFFIX,
+                                                        snapshot_dat.IB_SUFFIX)):
+        try:
+            return _proxy_from_dat(filepath, max_triangles)
+        except ValueError as e:
+            print("\tcan't use the snapshot buffers for the proxy, reading the mmobj instead: %s" % e)
+    return _proxy_from_text(filepath, max_triangles)
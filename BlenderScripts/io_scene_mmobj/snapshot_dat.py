@@ -0,0 +1,507 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Reads and writes the raw buffers that a ModelMod snapshot writes next to its mmobj file:
+
+    snap_N_Pp_Vv_VBDecl.dat   D3DVERTEXELEMENT9 array, ending with D3DDECL_END
+    snap_N_Pp_Vv_VB.dat       uint32 vertex count, uint32 stride, vertex data
+    snap_N_Pp_Vv_IB.dat       int32 index count, int32 index size, index data
+
+The vertex data is viewed in place as a numpy structured array laid out by the declaration, so
+decoding a capture is a handful of array conversions rather than a text parse.  Elements are
+decoded the same way as the snapshot code (Snapshot.fs) decodes them when it writes the mmobj, and
+encoded the same way as the runtime (ModDBInterop.fillModData) fills a mod's vertex buffer.
+
+Does not need blender.
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+
+# D3DDECLTYPE
+DECLTYPE_FLOAT1 = 0
+DECLTYPE_FLOAT2 = 1
+DECLTYPE_FLOAT3 = 2
+DECLTYPE_FLOAT4 = 3
+DECLTYPE_D3DCOLOR = 4
+DECLTYPE_UBYTE4 = 5
+DECLTYPE_SHORT2 = 6
+DECLTYPE_SHORT4 = 7
+DECLTYPE_UBYTE4N = 8
+DECLTYPE_SHORT2N = 9
+DECLTYPE_SHORT4N = 10
+DECLTYPE_USHORT2N = 11
+DECLTYPE_USHORT4N = 12
+DECLTYPE_UDEC3 = 13
+DECLTYPE_DEC3N = 14
+DECLTYPE_FLOAT16_2 = 15
+DECLTYPE_FLOAT16_4 = 16
+DECLTYPE_UNUSED = 17
+
+# D3DDECLUSAGE
+USAGE_POSITION = 0
+USAGE_BLENDWEIGHT = 1
+USAGE_BLENDINDICES = 2
+USAGE_NORMAL = 3
+USAGE_PSIZE = 4
+USAGE_TEXCOORD = 5
+USAGE_TANGENT = 6
+USAGE_BINORMAL = 7
+USAGE_TESSFACTOR = 8
+USAGE_POSITIONT = 9
+USAGE_COLOR = 10
+USAGE_FOG = 11
+USAGE_DEPTH = 12
+USAGE_SAMPLE = 13
+
+# numpy (base type, component count) for each declaration type.  UDEC3 and DEC3N are packed into a
+# single uint32 and are left undecoded.
+DECLTYPE_FORMATS = {
+    DECLTYPE_FLOAT1: ('<f4', 1),
+    DECLTYPE_FLOAT2: ('<f4', 2),
+    DECLTYPE_FLOAT3: ('<f4', 3),
+    DECLTYPE_FLOAT4: ('<f4', 4),
+    DECLTYPE_D3DCOLOR: ('u1', 4),
+    DECLTYPE_UBYTE4: ('u1', 4),
+    DECLTYPE_SHORT2: ('<i2', 2),
+    DECLTYPE_SHORT4: ('<i2', 4),
+    DECLTYPE_UBYTE4N: ('u1', 4),
+    DECLTYPE_SHORT2N: ('<i2', 2),
+    DECLTYPE_SHORT4N: ('<i2', 4),
+    DECLTYPE_USHORT2N: ('<u2', 2),
+    DECLTYPE_USHORT4N: ('<u2', 4),
+    DECLTYPE_UDEC3: ('<u4', 1),
+    DECLTYPE_DEC3N: ('<u4', 1),
+    DECLTYPE_FLOAT16_2: ('<f2', 2),
+    DECLTYPE_FLOAT16_4: ('<f2', 4),
+}
+
+VertexElement = namedtuple("VertexElement", "stream offset type method usage usage_index")
+
+ELEMENT_DTYPE = np.dtype([('stream', '<u2'),
+                          ('offset', '<u2'),
+                          ('type', 'u1'),
+                          ('method', 'u1'),
+                          ('usage', 'u1'),
+                          ('usage_index', 'u1'),
+                          ])
+
+# sidecar file suffixes, see Snapshot.take
+DECL_SUFFIX = "_VBDecl.dat"
+VB_SUFFIX = "_VB.dat"
+IB_SUFFIX = "_IB.dat"
+
+
+class SnapshotMesh:
+    """
+    Decoded snapshot buffers, or a mesh to encode into them.  Arrays are per vertex except for triangles; attributes that the
+    declaration doesn't have are None.
+    """
+    def __init__(self):
+        self.positions = None  # (n, 3) float32
+        self.uvs = None  # (n, 2) float32
+        self.normals = None  # (n, 3) float32
+        self.blend_indices = None  # (n, 4) uint8
+        self.blend_weights = None  # (n, 4) float32
+        self.triangles = None  # (m, 3) int
+        self.elements = []
+
+
+def snapshot_basename(filepath):
+    """
+    Returns the snapshot base path (without sidecar suffix) for the path of any of its files.
+    """
+    for suffix in (DECL_SUFFIX, VB_SUFFIX, IB_SUFFIX, ".mmobj"):
+        if filepath.lower().endswith(suffix.lower()):
+            return filepath[:-len(suffix)]
+    return os.path.splitext(filepath)[0]
+
+
+def read_decl(filepath):
+    """
+    Reads a _VBDecl.dat file (see ModDB.writeVertexElement) and returns its VertexElements, up to
+    the D3DDECL_END marker.
+    """
+    raw = np.fromfile(filepath, dtype=np.uint8)
+    if len(raw) % ELEMENT_DTYPE.itemsize:
+        raise ValueError("Binary vertex declaration array has unexpected size, should be a multiple of %d: size is: %d"
+                         % (ELEMENT_DTYPE.itemsize, len(raw)))
+    elements = []
+    for el in raw.view(ELEMENT_DTYPE):
+        if el['stream'] == 0xFF or el['type'] == DECLTYPE_UNUSED:
+            break
+        elements.append(VertexElement(*(int(el[f]) for f in ELEMENT_DTYPE.names)))
+    return elements
+
+
+def vertex_dtype(elements, stride):
+    """
+    Returns a numpy structured dtype that overlays one vertex of the given stride.  Fields are named
+    "<usage>_<usage index>", eg "5_0" for the first texture coordinate.
+    """
+    names = []
+    formats = []
+    offsets = []
+    for el in elements:
+        if el.stream != 0:
+            continue  # snapshot only captures stream 0
+        base, count = DECLTYPE_FORMATS[el.type]
+        names.append("%d_%d" % (el.usage, el.usage_index))
+        formats.append((base, (count,)))
+        offsets.append(el.offset)
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': stride})
+
+
+def read_vb(filepath, elements):
+    """
+    Maps a _VB.dat file and returns a structured array view of its vertices (see vertex_dtype).
+    """
+    header = np.fromfile(filepath, dtype='<u4', count=2)
+    if len(header) != 2:
+        raise ValueError("%r is too short for a vertex buffer header" % filepath)
+    num_verts, stride = int(header[0]), int(header[1])
+    data = np.memmap(filepath, dtype=np.uint8, mode='r', offset=8, shape=(num_verts * stride,))
+    return data.view(vertex_dtype(elements, stride))
+
+
+def read_ib(filepath):
+    """
+    Maps an _IB.dat file and returns its indices as an (m, 3) array of triangles.
+    """
+    header = np.fromfile(filepath, dtype='<i4', count=2)
+    if len(header) != 2:
+        raise ValueError("%r is too short for an index buffer header" % filepath)
+    count, size = int(header[0]), int(header[1])
+    if size not in (2, 4):
+        raise ValueError("%r has unsupported index size %d" % (filepath, size))
+    indices = np.memmap(filepath, dtype='<u2' if size == 2 else '<u4', mode='r', offset=8, shape=(count,))
+    return indices[:count - count % 3].reshape(-1, 3)
+
+
+def _ubyte_unit(values):
+    return values.astype(np.float32) / 255.0
+
+
+def decode_vector(values, el_type, name):
+    """
+    Decodes normal-like data to float xyz, the same way Snapshot.readElement does.
+    """
+    if el_type in (DECLTYPE_FLOAT3, DECLTYPE_FLOAT4):
+        return values[:, :3].astype(np.float32)
+    if el_type in (DECLTYPE_D3DCOLOR, DECLTYPE_UBYTE4N, DECLTYPE_UBYTE4):
+        # not sure if all 4 byte normals will be encoded the same way; this matches the snapshot
+        return _ubyte_unit(values[:, :3])
+    raise ValueError("Unsupported type for %s: %d" % (name, el_type))
+
+
+def decode(elements, vertices, triangles):
+    """
+    Converts the structured vertex view and triangles into a SnapshotMesh.
+    """
+    mesh = SnapshotMesh()
+    mesh.elements = elements
+    mesh.triangles = np.asarray(triangles, dtype=np.int64)
+
+    for el in elements:
+        if el.stream != 0:
+            continue
+        values = vertices["%d_%d" % (el.usage, el.usage_index)]
+
+        if el.usage == USAGE_POSITION and mesh.positions is None:
+            if el.type not in (DECLTYPE_FLOAT3, DECLTYPE_FLOAT4):
+                raise ValueError("Unsupported type for position: %d" % el.type)
+            mesh.positions = values[:, :3].astype(np.float32)
+
+        elif el.usage == USAGE_TEXCOORD and mesh.uvs is None:
+            if el.type not in (DECLTYPE_FLOAT2, DECLTYPE_FLOAT16_2, DECLTYPE_FLOAT4, DECLTYPE_FLOAT16_4):
+                raise ValueError("Unsupported type for texture coordinate: %d" % el.type)
+            mesh.uvs = values[:, :2].astype(np.float32)
+
+        elif el.usage == USAGE_NORMAL and mesh.normals is None:
+            mesh.normals = decode_vector(values, el.type, "normal")
+
+        elif el.usage == USAGE_BLENDINDICES and mesh.blend_indices is None:
+            if el.type not in (DECLTYPE_UBYTE4, DECLTYPE_D3DCOLOR):
+                raise ValueError("Unsupported type for blend index: %d" % el.type)
+            mesh.blend_indices = np.array(values, dtype=np.uint8)
+
+        elif el.usage == USAGE_BLENDWEIGHT and mesh.blend_weights is None:
+            if el.type in (DECLTYPE_UBYTE4N, DECLTYPE_D3DCOLOR):
+                mesh.blend_weights = _ubyte_unit(values)
+            elif el.type == DECLTYPE_FLOAT4:
+                mesh.blend_weights = values.astype(np.float32)
+            elif el.type in (DECLTYPE_FLOAT1, DECLTYPE_FLOAT2, DECLTYPE_FLOAT3):
+                # d3d derives the last weight so that they sum to one
+                weights = np.zeros((len(values), 4), dtype=np.float32)
+                count = values.shape[1]
+                weights[:, :count] = values
+                weights[:, count] = 1.0 - values.sum(axis=1)
+                mesh.blend_weights = weights
+            else:
+                raise ValueError("Unsupported type for blend weight: %d" % el.type)
+
+    if mesh.positions is None:
+        raise ValueError("Vertex declaration has no position element")
+
+    if mesh.blend_indices is not None and mesh.blend_weights is None:
+        # same as MeshUtil.writeObj: assume only the first index is used
+        mesh.blend_weights = np.zeros((len(mesh.blend_indices), 4), dtype=np.float32)
+        mesh.blend_weights[:, 0] = 1.0
+
+    return mesh
+
+
+def read_snapshot(filepath):
+    """
+    Reads the decl, vertex and index sidecars of the snapshot that filepath belongs to.
+    """
+    base = snapshot_basename(filepath)
+    elements = read_decl(base + DECL_SUFFIX)
+    vertices = read_vb(base + VB_SUFFIX, elements)
+    triangles = read_ib(base + IB_SUFFIX)
+    if len(triangles) and int(triangles.max()) >= len(vertices):
+        raise ValueError("Index buffer references vertex %d but only %d were captured"
+                         % (int(triangles.max()), len(vertices)))
+    return decode(elements, vertices, triangles)
+
+
+def read_xforms(mmobj_path, tail_bytes=4096):
+    """
+    Returns the (pos_xforms, uv_xforms) lists recorded at the end of a snapshot's mmobj file, so that raw
+    captures can be put into the same space as the mmobj.  Only the end of the file is read.
+    """
+    pos_xforms = []
+    uv_xforms = []
+    if not os.path.exists(mmobj_path):
+        return pos_xforms, uv_xforms
+    with open(mmobj_path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        file.seek(max(file.tell() - tail_bytes, 0))
+        for line in file.read().splitlines():
+            line_split = line.split()
+            if not line_split:
+                continue
+            if line_split[0] == b'#pos_xforms':
+                pos_xforms = line_split[1:]
+            elif line_split[0] == b'#uv_xforms':
+                uv_xforms = line_split[1:]
+    return pos_xforms, uv_xforms
+
+
+def _rotation(axis, degrees):
+    c = np.cos(np.radians(degrees))
+    s = np.sin(np.radians(degrees))
+    if axis == b'x':
+        return np.array([[1, 0, 0], [0, c, -s], [0, s, c]])
+    elif axis == b'y':
+        return np.array([[c, 0, s], [0, 1, 0], [-s, 0, c]])
+    elif axis == b'z':
+        return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+    raise ValueError("Unknown rotation axis: %r" % axis)
+
+
+def _position_matrix(pos_xforms):
+    matrix = np.identity(3)
+    for xform in pos_xforms:
+        parts = xform.replace(b'_', b' ').lower().split()
+        if parts[0] == b'rot' and len(parts) == 3:
+            matrix = _rotation(parts[1], float(parts[2])).dot(matrix)
+        elif parts[0] == b'scale' and len(parts) == 2:
+            matrix = float(parts[1]) * matrix
+        else:
+            raise ValueError("Unsupported position transform: %r" % xform)
+    return matrix
+
+
+def apply_xforms(mesh, pos_xforms, uv_xforms, reverse=False):
+    """
+    Applies snapshot profile transforms (see MeshTransform.fs) to a SnapshotMesh in place.  Transform
+    names are as written in mmobj files, with underscores in place of spaces (eg b'rot_x_90').  With
+    reverse, undoes them instead, as the runtime does when it loads a mod.
+    """
+    matrix = _position_matrix(pos_xforms)
+    if reverse:
+        matrix = np.linalg.inv(matrix)
+    if pos_xforms:
+        mesh.positions = mesh.positions.dot(matrix.T).astype(np.float32)
+        if mesh.normals is not None:
+            normals = mesh.normals.dot(matrix.T)
+            lengths = np.linalg.norm(normals, axis=1)
+            lengths[lengths == 0.0] = 1.0
+            mesh.normals = (normals / lengths[:, None]).astype(np.float32)
+
+    if mesh.uvs is not None:
+        for xform in uv_xforms:
+            parts = xform.replace(b'_', b' ').lower().split()
+            if parts == [b'flip', b'x']:
+                mesh.uvs[:, 0] = 1.0 - mesh.uvs[:, 0]
+            elif parts == [b'flip', b'y']:
+                mesh.uvs[:, 1] = 1.0 - mesh.uvs[:, 1]
+            else:
+                raise ValueError("Unsupported uv transform: %r" % xform)
+
+
+# bytes of the declaration types the runtime writes, see MeshUtil.getVertSize
+DECLTYPE_SIZES = {
+    DECLTYPE_FLOAT1: 4,
+    DECLTYPE_FLOAT2: 8,
+    DECLTYPE_FLOAT3: 12,
+    DECLTYPE_FLOAT4: 16,
+    DECLTYPE_SHORT4: 8,
+    DECLTYPE_SHORT2: 4,
+    DECLTYPE_UBYTE4N: 4,
+    DECLTYPE_UBYTE4: 4,
+    DECLTYPE_D3DCOLOR: 4,
+    DECLTYPE_FLOAT16_2: 4,
+}
+
+
+def vertex_size(elements):
+    """
+    Returns the bytes of one vertex of the declaration: the end of the element with the highest offset.
+    """
+    last = max(elements, key=lambda el: el.offset)
+    if last.type not in DECLTYPE_SIZES:
+        raise ValueError("Unknown size of vertex element type: %d" % last.type)
+    return last.offset + DECLTYPE_SIZES[last.type]
+
+
+def _unit_bytes(vectors, reverse):
+    """
+    Encodes unit vectors as 4 bytes, the same way as ModDBInterop.write4ByteVector; with reverse, as
+    the ReverseNormals game profile setting does.  Like its uint8 conversion, this truncates toward zero
+    and keeps the low byte, so a component of -1.0 wraps around to 255.
+    """
+    scaled = vectors.astype(np.float32) * np.float32(128.0) + np.float32(127.0)
+    xyz = (np.trunc(scaled).astype(np.int64) & 0xFF).astype(np.uint8)
+    data = np.zeros((len(vectors), 4), dtype=np.uint8)
+    data[:, :3] = xyz[:, ::-1] if reverse else xyz
+    return data
+
+
+def _tangents(normals, binormal):
+    """
+    Computes a tangent or binormal from each normal, the same way as ModDBInterop's modmBinormalTangent.
+    """
+    v1 = np.cross(normals, [0.0, 0.0, 1.0])
+    v2 = np.cross(normals, [0.0, 1.0, 0.0])
+    longer = np.linalg.norm(v1, axis=1) > np.linalg.norm(v2, axis=1)
+    tangents = _normalized(np.where(longer[:, None], v1, v2))
+    if binormal:
+        return _normalized(np.cross(normals, tangents))
+    return tangents
+
+
+def _normalized(vectors):
+    lengths = np.linalg.norm(vectors, axis=1)
+    lengths[lengths == 0.0] = 1.0
+    return (vectors / lengths[:, None]).astype(np.float32)
+
+
+def _require(values, name):
+    if values is None:
+        raise ValueError("The vertex declaration has a %s element, but the mesh has no %s data" % (name, name))
+    return values
+
+
+def encode(elements, mesh, reverse_normals=False):
+    """
+    Packs the vertices of a SnapshotMesh into the layout of the declaration, and returns them as a
+    structured array (see vertex_dtype).  Bytes no element covers are zero.
+    """
+    num_verts = len(mesh.positions)
+    vertices = np.zeros(num_verts, dtype=vertex_dtype(elements, vertex_size(elements)))
+
+    for el in elements:
+        if el.stream != 0:
+            continue
+        field = "%d_%d" % (el.usage, el.usage_index)
+
+        if el.usage == USAGE_POSITION:
+            if el.type != DECLTYPE_FLOAT3:
+                raise ValueError("Unsupported type for position: %d" % el.type)
+            vertices[field] = mesh.positions
+
+        elif el.usage == USAGE_TEXCOORD:
+            if el.type not in (DECLTYPE_FLOAT2, DECLTYPE_FLOAT16_2):
+                raise ValueError("Unsupported type for texture coordinate: %d" % el.type)
+            vertices[field] = _require(mesh.uvs, "texture coordinate")
+
+        elif el.usage in (USAGE_NORMAL, USAGE_TANGENT, USAGE_BINORMAL):
+            normals = _require(mesh.normals, "normal")
+            if el.usage != USAGE_NORMAL:
+                normals = _tangents(normals, el.usage == USAGE_BINORMAL)
+            if el.type in (DECLTYPE_D3DCOLOR, DECLTYPE_UBYTE4N, DECLTYPE_UBYTE4):
+                vertices[field] = _unit_bytes(normals, reverse_normals)
+            elif el.type == DECLTYPE_FLOAT3:
+                vertices[field] = normals
+            else:
+                raise ValueError("Unsupported type for normal: %d" % el.type)
+
+        elif el.usage == USAGE_BLENDINDICES:
+            if el.type not in (DECLTYPE_UBYTE4, DECLTYPE_D3DCOLOR):
+                raise ValueError("Unsupported type for blend index: %d" % el.type)
+            vertices[field] = _require(mesh.blend_indices, "blend index")
+
+        elif el.usage == USAGE_BLENDWEIGHT:
+            weights = _require(mesh.blend_weights, "blend weight").astype(np.float32)
+            if el.type in (DECLTYPE_UBYTE4N, DECLTYPE_D3DCOLOR):
+                # np.round, like Math.Round, rounds halves to even
+                vertices[field] = np.round(weights * np.float32(255.0))
+            elif el.type == DECLTYPE_FLOAT4:
+                vertices[field] = weights
+            else:
+                raise ValueError("Unsupported type for blend weight: %d" % el.type)
+
+        elif el.usage == USAGE_COLOR:
+            # the runtime writes white, the snapshot doesn't capture colors
+            if el.type == DECLTYPE_D3DCOLOR:
+                vertices[field] = 255
+            elif el.type == DECLTYPE_FLOAT4:
+                vertices[field] = 1.0
+            else:
+                raise ValueError("Unsupported type for color: %d" % el.type)
+
+        else:
+            raise ValueError("Unsupported vertex element usage: %d" % el.usage)
+
+    return vertices
+
+
+def vb_bytes(vertices):
+    """
+    Returns the contents of a _VB.dat file for a structured vertex array.
+    """
+    header = np.array([len(vertices), vertices.dtype.itemsize], dtype='<u4')
+    return header.tobytes() + vertices.tobytes()
+
+
+def ib_bytes(triangles, num_verts):
+    """
+    Returns the contents of an _IB.dat file for the (m, 3) triangles, with 16 bit indices if
+    num_verts allows them.
+    """
+    index_dtype = np.dtype('<u2') if num_verts <= 0x10000 else np.dtype('<u4')
+    indices = np.asarray(triangles).ravel().astype(index_dtype)
+    header = np.array([len(indices), index_dtype.itemsize], dtype='<i4')
+    return header.tobytes() + indices.tobytes()
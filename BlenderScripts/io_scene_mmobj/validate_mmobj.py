@@ -0,0 +1,363 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Preflight checks for mmobj files, so that broken files are found before blender or the game
+trips over them.
+
+The file is scanned with the same record patterns that the game's mmobj reader
+(MeshUtil.readObj) uses, and the checks then run over whole index arrays at once.
+Does not need blender; run it from a command line on files or whole mod directories:
+
+    python validate_mmobj.py [--palette-size N] [--jobs N] [--output report.json] path...
+
+The report is written as json (to stdout by default).  The exit code is 1 if any file has errors.
+"""
+
+import os
+import re
+import sys
+import json
+
+import numpy as np
+
+# record patterns, see MeshUtil.readObj.  Anchored at line start since that is where the writers put the keyword.
+RE_POS = re.compile(rb'^v\s+(\S+)\s+(\S+)\s+(\S+)', re.M)
+RE_TEX = re.compile(rb'^vt\s+(\S+)\s+(\S+)', re.M)
+RE_NOR = re.compile(rb'^vn\s+(\S+)\s+(\S+)\s+(\S+)', re.M)
+RE_FACE = re.compile(rb'^f\s', re.M)
+RE_PTN_TRI = re.compile(rb'^f\s+(\S+)/(\S+)/(\S+)\s+(\S+)/(\S+)/(\S+)\s+(\S+)/(\S+)/(\S+)', re.M)
+RE_BLEND = re.compile(rb'^#vbld\s', re.M)
+RE_BLEND4 = re.compile(rb'^#vbld\s+(\S+)/(\S+)\s+(\S+)/(\S+)\s+(\S+)/(\S+)\s+(\S+)/(\S+)', re.M)
+RE_VGROUP = re.compile(rb'^#vg\s+(.*)$', re.M)
+RE_VGROUP_NAME = re.compile(rb'^#vgn\s+(\S+)', re.M)
+
+# number of offending elements to list in each issue
+MAX_EXAMPLES = 10
+
+# weights of a vertex should sum to one; the game patches up small differences
+WEIGHT_SUM_TOLERANCE = 0.01
+
+
+def _issue(issues, severity, code, mask, message):
+    """
+    Appends an issue for the elements selected by the boolean array mask, if there are any.
+    """
+    count = int(np.count_nonzero(mask))
+    if count:
+        issues.append({"severity": severity,
+                       "code": code,
+                       "count": count,
+                       "examples": np.flatnonzero(mask)[:MAX_EXAMPLES].tolist(),
+                       "message": message,
+                       })
+
+
+def _to_ints(groups):
+    return np.array(groups, dtype=np.bytes_).reshape(len(groups), -1).astype(np.int64)
+
+
+def validate_file(filepath, palette_size=None):
+    """
+    Checks one mmobj file and returns a report dict.  Examples in the report are zero-based element
+    numbers: triangle number for face issues, vertex number for blend and group issues.
+    """
+    issues = []
+    report = {"path": filepath, "issues": issues}
+
+    with open(filepath, 'rb') as file:
+        text = file.read()
+
+    n_pos = len(RE_POS.findall(text))
+    n_tex = len(RE_TEX.findall(text))
+    n_nor = len(RE_NOR.findall(text))
+    n_faces = len(RE_FACE.findall(text))
+    tris = RE_PTN_TRI.findall(text)
+    n_blend = len(RE_BLEND.findall(text))
+    blend = RE_BLEND4.findall(text)
+    vgroups = RE_VGROUP.findall(text)
+    n_vgroup_names = len(set(RE_VGROUP_NAME.findall(text)))
+    del text
+
+    report["counts"] = {"positions": n_pos,
+                        "uvs": n_tex,
+                        "normals": n_nor,
+                        "faces": n_faces,
+                        "triangles": len(tris),
+                        "blend_vertices": n_blend,
+                        "group_vertices": len(vgroups),
+                        "group_names": n_vgroup_names,
+                        }
+
+    # faces: the game only reads triangles that have position, uv and normal indices
+    if not tris:
+        issues.append({"severity": "error",
+                       "code": "no_triangles",
+                       "count": n_faces,
+                       "examples": [],
+                       "message": "no pos/uv/normal triangles; the game will refuse this mesh (faces need uv and normal indices)",
+                       })
+    elif n_faces != len(tris):
+        issues.append({"severity": "error",
+                       "code": "face_not_ptn_triangle",
+                       "count": n_faces - len(tris),
+                       "examples": [],
+                       "message": "faces that are not triangles with pos/uv/normal indices are dropped by the game",
+                       })
+
+    if tris:
+        try:
+            corners = _to_ints(tris).reshape(-1, 3, 3) - 1
+        except ValueError:
+            issues.append({"severity": "error",
+                           "code": "bad_face_index",
+                           "count": 1,
+                           "examples": [],
+                           "message": "a face index is not an integer",
+                           })
+        else:
+            for column, name, count in ((0, "position", n_pos), (1, "uv", n_tex), (2, "normal", n_nor)):
+                idx = corners[:, :, column]
+                _issue(issues, "error", name + "_index_out_of_range",
+                       ((idx < 0) | (idx >= count)).any(axis=1),
+                       "triangles with %s indices outside 1..%d" % (name, count))
+
+    # blend data
+    if n_blend:
+        if n_blend != n_pos:
+            issues.append({"severity": "error",
+                           "code": "blend_count_mismatch",
+                           "count": abs(n_blend - n_pos),
+                           "examples": [],
+                           "message": "%d #vbld records for %d positions; blend data will go to the wrong vertices" % (n_blend, n_pos),
+                           })
+        if len(blend) != n_blend:
+            issues.append({"severity": "error",
+                           "code": "blend_pair_count",
+                           "count": n_blend - len(blend),
+                           "examples": [],
+                           "message": "#vbld records with fewer than four index/weight pairs are dropped by the game",
+                           })
+
+    report["blend_index_counts"] = []
+    if blend:
+        try:
+            pairs = np.array(blend, dtype=np.bytes_).reshape(len(blend), 4, 2)
+            blend_idx = pairs[:, :, 0].astype(np.int64)
+            blend_weights = pairs[:, :, 1].astype(np.float64)
+        except ValueError:
+            issues.append({"severity": "error",
+                           "code": "bad_blend_pair",
+                           "count": 1,
+                           "examples": [],
+                           "message": "a #vbld index or weight is not a number",
+                           })
+        else:
+            used = blend_weights > 0.0
+            _issue(issues, "error", "blend_index_out_of_range",
+                   ((blend_idx < 0) | (blend_idx > 255)).any(axis=1),
+                   "vertices with blend indices that don't fit in a byte")
+            _issue(issues, "error", "negative_blend_weight", (blend_weights < 0.0).any(axis=1),
+                   "vertices with negative blend weights")
+            _issue(issues, "warning", "blend_weight_sum",
+                   np.abs(blend_weights.sum(axis=1) - 1.0) > WEIGHT_SUM_TOLERANCE,
+                   "vertices whose blend weights do not sum to 1")
+
+            # per-index usage, so that palettes can be checked after the fact (see check_palette)
+            valid = used & (blend_idx >= 0) & (blend_idx <= 255)
+            report["blend_index_counts"] = np.bincount(blend_idx[valid], minlength=1).tolist()
+
+            if palette_size is not None:
+                _issue(issues, "error", "blend_index_past_palette",
+                       (used & (blend_idx >= palette_size)).any(axis=1),
+                       "vertices weighted to Index groups at or past the palette size %d" % palette_size)
+
+    # vertex groups
+    if vgroups:
+        lens = np.array([len(g.split()) for g in vgroups])
+        try:
+            group_idx = np.array(b' '.join(vgroups).split(), dtype=np.bytes_).astype(np.int64)
+        except ValueError:
+            issues.append({"severity": "error",
+                           "code": "bad_group_index",
+                           "count": 1,
+                           "examples": [],
+                           "message": "a #vg group index is not an integer",
+                           })
+        else:
+            bad = ((group_idx < -1) | (group_idx >= n_vgroup_names)).astype(np.int64)
+            vert_bad = np.zeros(len(vgroups), dtype=bool)
+            nonempty = lens > 0
+            if bad.any():
+                starts = np.cumsum(lens) - lens
+                vert_bad[nonempty] = np.add.reduceat(bad, starts[nonempty]) > 0
+            _issue(issues, "error", "group_index_out_of_range", vert_bad,
+                   "vertices with #vg indices that have no #vgn name (%d names)" % n_vgroup_names)
+        if len(vgroups) > n_pos:
+            issues.append({"severity": "error",
+                           "code": "group_count_mismatch",
+                           "count": len(vgroups) - n_pos,
+                           "examples": [],
+                           "message": "more #vg records than positions",
+                           })
+
+    return report
+
+
+def check_palette(report, palette_size, source):
+    """
+    Adds a blend_index_past_palette issue to a report from validate_file, using its per-index counts.
+    palette_size is what the reference source uses, only a lower bound of the game's palette, so going
+    past it is a warning.
+    """
+    counts = report.get("blend_index_counts") or []
+    past = sum(counts[palette_size:])
+    if past:
+        report["issues"].append({"severity": "warning",
+                                 "code": "blend_index_past_palette",
+                                 "count": past,
+                                 "examples": [i for i in range(palette_size, len(counts)) if counts[i]][:MAX_EXAMPLES],
+                                 "message": "blend weights on indices past the %d used by %s; pass --palette-size "
+                                            "to check against the game's palette" % (palette_size, source),
+                                 })
+
+
+def read_simple_yaml(filepath):
+    """
+    Reads the flat "Key: value" mappings used by mod and reference yaml files.  Keys are lowercased
+    since ModelMod looks them up without regard to case.
+    """
+    values = {}
+    with open(filepath, 'r', encoding="utf8", errors="replace") as file:
+        for line in file:
+            key, sep, value = line.partition(':')
+            if sep and not line[:1].isspace():
+                values[key.strip().lower()] = value.strip().strip('"')
+    return values
+
+
+def find_files(paths):
+    """
+    Expands paths into (mmobj files, {mmobj file: reference mmobj file}) by walking directories and
+    reading the mod yaml files in them.
+    """
+    mmobjs = []
+    yamls = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    ext = os.path.splitext(name)[1].lower()
+                    if ext == ".mmobj":
+                        mmobjs.append(os.path.join(dirpath, name))
+                    elif ext == ".yaml":
+                        yamls.append(os.path.join(dirpath, name))
+        else:
+            mmobjs.append(path)
+
+    refs = {}  # ref name: mesh path
+    mods = []  # (mesh path, ref name)
+    for path in yamls:
+        try:
+            node = read_simple_yaml(path)
+        except OSError:
+            continue
+        mesh = node.get("meshpath")
+        if not mesh:
+            continue
+        mesh = os.path.normpath(os.path.join(os.path.dirname(path), mesh))
+        kind = node.get("type", "").lower()
+        if kind == "reference":
+            refs[os.path.splitext(os.path.basename(path))[0].lower()] = mesh
+        elif kind == "mod" and node.get("ref"):
+            mods.append((mesh, node["ref"].lower()))
+
+    mod_refs = {mesh: refs[ref] for mesh, ref in mods if ref in refs}
+    mmobjs = [os.path.normpath(p) for p in mmobjs]
+    return mmobjs, mod_refs
+
+
+def _validate_task(args):
+    filepath, palette_size = args
+    try:
+        return validate_file(filepath, palette_size)
+    except Exception as e:
+        return {"path": filepath,
+                "issues": [{"severity": "error", "code": "unreadable", "count": 1, "examples": [], "message": str(e)}],
+                }
+
+
+def validate_paths(paths, palette_size=None, jobs=None):
+    """
+    Validates every mmobj in paths (files or directories) in a process pool; returns the full report dict.
+    Mod meshes are also checked against the blend indices that their reference uses.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    mmobjs, mod_refs = find_files(paths)
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        reports = list(pool.map(_validate_task, [(p, palette_size) for p in mmobjs], chunksize=1))
+
+    by_path = {r["path"]: r for r in reports}
+    for mesh, ref in sorted(mod_refs.items()):
+        if mesh in by_path and ref in by_path:
+            ref_counts = by_path[ref].get("blend_index_counts") or []
+            if ref_counts:
+                check_palette(by_path[mesh], len(ref_counts), os.path.basename(ref))
+
+    for r in reports:
+        r.pop("blend_index_counts", None)
+        r["ok"] = not any(i["severity"] == "error" for i in r["issues"])
+
+    return {"files": reports,
+            "summary": {"files": len(reports),
+                        "failed": sum(1 for r in reports if not r["ok"]),
+                        "warnings": sum(1 for r in reports for i in r["issues"] if i["severity"] == "warning"),
+                        },
+            }
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check mmobj files and mod directories for errors")
+    parser.add_argument("paths", nargs="+", help="mmobj files or directories to search")
+    parser.add_argument("--palette-size", type=int, default=None,
+                        help="flag blend indices at or past this value in every file")
+    parser.add_argument("--jobs", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--output", default=None, help="write the json report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = validate_paths(args.paths, args.palette_size, args.jobs)
+
+    if args.output:
+        with open(args.output, 'w', encoding="utf8") as file:
+            json.dump(report, file, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        sys.stdout.write('\n')
+
+    return 1 if report["summary"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
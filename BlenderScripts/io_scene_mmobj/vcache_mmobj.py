@@ -0,0 +1,155 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Orders faces so that the vertices the GPU has just transformed are used again while they are still in
+its post-transform cache.  That only helps indexed drawing, as from the _IB.dat the exporter can write;
+the game draws mods without an index buffer, every corner its own vertex.
+
+The order is Tipsify's (Sander, Nehab and Barczak, "Fast Triangle Reordering for Vertex Locality and
+Reduced Overdraw", 2007): faces are emitted as fans around one vertex at a time, and the next fan is
+around a vertex of the last one that is still in the cache, so it runs in linear time.  Faces are given
+as flat corner arrays with the number of corners of each face; a face with more than three corners is
+emitted as a whole, like a fan of triangles.  Corners are vertex numbers; only faces move, the vertices
+keep their numbers.
+
+Does not need blender.
+"""
+
+import collections
+
+import numpy as np
+
+# entries of the FIFO cache that the order is made for and that miss_ratio simulates; about what the
+# hardware of the game's era has
+CACHE_SIZE = 16
+
+
+def face_vertex_lists(corners, totals):
+    """
+    Splits the flat corners into a list of vertex lists, one for each face.
+    """
+    corners = np.asarray(corners).tolist()
+    ends = np.cumsum(totals).tolist()
+    return [corners[end - total:end] for end, total in zip(ends, np.asarray(totals).tolist())]
+
+
+def miss_ratio(corners, totals, cache_size=CACHE_SIZE):
+    """
+    Returns the average number of vertices that miss a FIFO cache of cache_size entries per triangle,
+    for faces drawn in the given order.  A face with n corners counts as n - 2 triangles.
+    """
+    num_triangles = int(np.maximum(np.asarray(totals) - 2, 0).sum())
+    if not num_triangles:
+        return 0.0
+    fifo = collections.deque()
+    cached = set()
+    misses = 0
+    for v in np.asarray(corners).tolist():
+        if v in cached:
+            continue
+        misses += 1
+        fifo.append(v)
+        cached.add(v)
+        if len(fifo) > cache_size:
+            cached.discard(fifo.popleft())
+    return misses / num_triangles
+
+
+def tipsify(corners, totals, num_verts, cache_size=CACHE_SIZE):
+    """
+    Returns a cache friendly order of the faces, as an array of face indices.  Corners are numbers
+    below num_verts.
+    """
+    faces = face_vertex_lists(corners, totals)
+
+    # faces of every vertex, and how many of them are left
+    vertex_faces = [[] for _ in range(num_verts)]
+    for f, verts in enumerate(faces):
+        for v in verts:
+            vertex_faces[v].append(f)
+    live = [len(vf) for vf in vertex_faces]
+
+    time_stamp = [0] * num_verts
+    clock = cache_size + 1
+    emitted = [False] * len(faces)
+    dead_ends = []
+    order = []
+    cursor = 0
+
+    fan = 0 if num_verts else -1
+    while fan >= 0:
+        candidates = []
+        for f in vertex_faces[fan]:
+            if emitted[f]:
+                continue
+            emitted[f] = True
+            order.append(f)
+            for v in faces[f]:
+                dead_ends.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                # a vertex that isn't in the cache any more is loaded again
+                if clock - time_stamp[v] > cache_size:
+                    time_stamp[v] = clock
+                    clock += 1
+
+        # the candidate that is longest in the cache yet stays there while its fan is emitted
+        fan = -1
+        best = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if clock - time_stamp[v] + 2 * live[v] <= cache_size:
+                    priority = clock - time_stamp[v]
+                if priority > best:
+                    best = priority
+                    fan = v
+
+        if fan < 0:
+            # a recently used vertex with faces left, or else the next one in vertex order
+            while dead_ends:
+                v = dead_ends.pop()
+                if live[v] > 0:
+                    fan = v
+                    break
+            else:
+                while cursor < num_verts:
+                    if live[cursor] > 0:
+                        fan = cursor
+                        break
+                    cursor += 1
+
+    return np.array(order, dtype=np.int64)
+
+
+def reorder_triangles(triangles, num_verts, cache_size=CACHE_SIZE):
+    """
+    Returns the (m, 3) index buffer triangles in tipsify's order, or as they are if that misses the
+    cache as often, with the miss ratios before and after.
+    """
+    triangles = np.asarray(triangles)
+    totals = np.full(len(triangles), 3)
+    before = miss_ratio(triangles.ravel(), totals, cache_size)
+    reordered = triangles[tipsify(triangles.ravel(), totals, num_verts, cache_size)]
+    after = miss_ratio(reordered.ravel(), totals, cache_size)
+    if after >= before:
+        return triangles, before, before
+    return reordered, before, after
@@ -0,0 +1,157 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Watches a snapshot directory for new captures and parses them on a background thread.
+
+Snapshot.fs writes the textures and .mtl first, then the .mmobj, then the _VBDecl.dat, _IB.dat and
+_VB.dat files.  A capture is treated as complete once all of those exist, the vertex buffer has the
+size its header says, and none of the files has changed for settle_time seconds.
+
+Does not need blender; the importer drains the parsed captures from its main thread timer.
+"""
+
+import os
+import queue
+import re
+import struct
+import threading
+import time
+
+from .parse_mmobj import parse
+from .snapshot_dat import DECL_SUFFIX, IB_SUFFIX, VB_SUFFIX
+
+SNAPSHOT_RE = re.compile(r"^snap_\d+_\d+p_\d+v\.mmobj$", re.IGNORECASE)
+
+
+def vb_complete(vb_path):
+    """
+    Returns True if the _VB.dat file is as long as its header says it should be.
+    """
+    try:
+        with open(vb_path, 'rb') as vb:
+            header = vb.read(8)
+            if len(header) < 8:
+                return False
+            num_verts, stride = struct.unpack('<II', header)
+            vb.seek(0, os.SEEK_END)
+            return vb.tell() >= 8 + num_verts * stride
+    except OSError:
+        return False
+
+
+class SnapshotWatcher:
+    """
+    Polls directory for new snap_*.mmobj files on a background thread, which also parses each complete
+    capture, one after another.
+    Parsed captures are handed over through a bounded queue: when the importer falls behind, the
+    watcher stops parsing until there is room, rather than piling up parsed meshes in memory.
+    Files that are already in the directory when the watcher starts are ignored.
+    """
+    def __init__(self, directory, poll_interval=0.5, settle_time=1.0, max_queue=2, **parse_options):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.parse_options = parse_options
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._seen = set()  # captures that have been queued or were there at the start
+        self._pending = {}  # path: (file stats, time they were first seen unchanged)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mmobj snapshot watcher")
+        self._thread.daemon = True
+
+    def _list(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [os.path.join(self.directory, name) for name in names if SNAPSHOT_RE.match(name)]
+
+    def _stats(self, path):
+        """
+        Returns the (size, mtime) of the capture's files, or None if it is not complete yet.
+        """
+        base = os.path.splitext(path)[0]
+        stats = []
+        for file_path in (path, base + DECL_SUFFIX, base + IB_SUFFIX, base + VB_SUFFIX):
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return None
+            stats.append((st.st_size, st.st_mtime))
+        if not vb_complete(base + VB_SUFFIX):
+            return None
+        return tuple(stats)
+
+    def _ready(self, now):
+        """
+        Returns the captures whose files have stayed unchanged for settle_time, oldest first.
+        """
+        ready = []
+        for path in self._list():
+            if path in self._seen:
+                continue
+            stats = self._stats(path)
+            previous = self._pending.get(path)
+            if stats is None:
+                self._pending.pop(path, None)
+            elif previous is None or previous[0] != stats:
+                self._pending[path] = stats, now
+            elif now - previous[1] >= self.settle_time:
+                ready.append(path)
+        ready.sort(key=lambda p: self._pending[p][0][0][1])
+        return ready
+
+    def _run(self):
+        while not self._stop.is_set():
+            for path in self._ready(time.time()):
+                if self._stop.is_set():
+                    return
+                try:
+                    data, error = parse(os.fsencode(path), **self.parse_options), None
+                except Exception as e:
+                    data, error = None, e
+                self._seen.add(path)
+                del self._pending[path]
+                # wait for room, but keep noticing stop requests
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put((path, data, error), timeout=self.poll_interval)
+                        break
+                    except queue.Full:
+                        pass
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self._seen.update(self._list())
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def get(self):
+        """
+        Returns the next (path, MMObjData, None) or (path, None, exception) without waiting, or None.
+        """
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
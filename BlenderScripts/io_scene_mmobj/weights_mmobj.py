@@ -0,0 +1,98 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Picks the blend indices and weights the exporter writes on #vbld lines from a mesh's vertex groups.
+
+Does not need blender; the exporter reads the vertex group memberships into flat arrays.
+"""
+
+import numpy as np
+
+# the runtime reads exactly this many index/weight pairs from every #vbld line
+BLEND_INFLUENCES = 4
+
+# blend weights below this are left out
+BLEND_MIN_WEIGHT = 0.0001
+
+# vertices that lose more than this share of their blend weight to the influence limit are reported
+BLEND_DROP_REPORT = 0.01
+
+
+def blend_index_table(group_names, prefix="Index."):
+    """
+    Returns the blend index of every vertex group, or -1 for groups that aren't blend groups.
+    The blend index comes from the group name ("Index.07" or "Index.07.annotation") rather than the
+    group's position, which can get out of sync with it.
+    """
+    table = np.full(len(group_names), -1, dtype=np.int64)
+    for i, gname in enumerate(group_names):
+        if gname.startswith(prefix):
+            blendindex = gname.strip()[len(prefix):]
+            # remove optional group annotation suffix
+            dotIdx = blendindex.find(".")
+            if dotIdx != -1:
+                blendindex = blendindex[0:dotIdx]
+            table[i] = int(blendindex)
+    return table
+
+
+def top_blend_weights(counts, groups, weights, blend_table, max_influences=BLEND_INFLUENCES):
+    """
+    Picks the heaviest max_influences blend groups of every vertex.  Returns (n, max_influences) arrays
+    of blend indices and weights, heaviest first, padded with zero weights on the vertex's heaviest
+    index (or 0), and the share of its weight every vertex lost.  Vertices that lost influences have
+    the remaining weights renormalized; the others are left exactly as they are.
+    """
+    num_verts = len(counts)
+    member_vert = np.repeat(np.arange(num_verts), counts)
+    blend = blend_table[groups] if len(groups) else np.zeros(0, dtype=np.int64)
+    used = (blend >= 0) & (weights >= BLEND_MIN_WEIGHT)
+    member_vert, blend, weights = member_vert[used], blend[used], weights[used]
+
+    # dense (vertex, influence) arrays, influences in group order and padded with -inf weights
+    num_influences = np.bincount(member_vert, minlength=num_verts)
+    width = max(int(num_influences.max()) if num_verts else 0, max_influences)
+    slot = np.arange(len(member_vert)) - np.repeat(np.cumsum(num_influences) - num_influences, num_influences)
+    dense_index = np.zeros((num_verts, width), dtype=np.int64)
+    dense_weight = np.full((num_verts, width), -np.inf)
+    dense_index[member_vert, slot] = blend
+    dense_weight[member_vert, slot] = weights
+
+    # heaviest first; mergesort is stable, so equal weights keep their group order
+    order = np.argsort(-dense_weight, axis=1, kind='mergesort')
+    rows = np.arange(num_verts)[:, None]
+    dense_index = dense_index[rows, order]
+    dense_weight = dense_weight[rows, order]
+
+    top_index = dense_index[:, :max_influences].copy()
+    top_weight = dense_weight[:, :max_influences].copy()
+    padding = np.arange(max_influences) >= num_influences[:, None]
+    top_index[padding] = np.repeat(dense_index[:, :1], max_influences, axis=1)[padding]
+    top_weight[padding] = 0.0
+
+    dropped = np.zeros(num_verts)
+    over = num_influences > max_influences
+    if over.any():
+        kept = top_weight[over].sum(axis=1)
+        total = np.where(np.isfinite(dense_weight[over]), dense_weight[over], 0.0).sum(axis=1)
+        dropped[over] = 1.0 - kept / total
+        top_weight[over] /= kept[:, None]
+    return top_index, top_weight, dropped
@@ -0,0 +1,526 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+
+"""
+Writes the exporter's text output in large formatted blocks.
+
+The exporter hands over small pieces of text and whole arrays of rows; an array is formatted with one
+% operation per chunk of rows.  BlockWriter does that on the calling thread.  PipelinedWriter does the
+formatting and the writing on worker threads, in the order things were handed over, so that blender's
+main thread only has to read the meshes.
+
+Both write to a temporary file and hash the output on the way; the file is only replaced when its
+content changed, so an export that produces the same bytes leaves the existing file and its mtime alone.
+DeltaWriter goes further: when nothing but the vertex rows changed since its last full write, it only
+writes those rows, to a delta file next to it (see delta_mmobj).  AnimationWriter writes the frames of
+an animation that keeps its topology as one full file and a stream of the vertex rows of every frame.
+
+Does not need blender.
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import os
+import queue
+import threading
+
+import numpy as np
+
+from .delta_mmobj import (ANIMATION_HEADER, ANIMATION_MAGIC, VERSION, animation_path, delta_path, encode_delta,
+                          encode_frame, style_code)
+from .format_mmobj import FORMAT_CHUNK, format_block, format_list_block, format_lists, format_rows, list_chunks
+
+# buffer of the output file
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+
+# characters of small text collected before they are queued as one piece
+TEXT_BATCH_SIZE = 65536
+
+# bytes read at once when hashing an existing file
+HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(path):
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            hasher.update(chunk)
+    return hasher.digest()
+
+
+class ChangedFile:
+    """
+    A binary file written next to path and hashed while it is written.  close() moves it to path
+    only if path doesn't hold the same bytes already; changed then says whether it did.
+    """
+    def __init__(self, path, buffering=-1):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self._file = open(self.tmp_path, "wb", buffering=buffering)
+        self._hasher = hashlib.sha1()
+        self.size = 0
+        self.changed = None
+        self.digest = None
+
+    def write(self, data):
+        self._hasher.update(data)
+        self.size += len(data)
+        self._file.write(data)
+
+    def _unchanged(self):
+        try:
+            if os.path.getsize(self.path) != self.size:
+                return False
+            return file_digest(self.path) == self._hasher.digest()
+        except OSError:
+            return False
+
+    def close(self):
+        self._file.close()
+        self.digest = self._hasher.digest()
+        self.changed = not self._unchanged()
+        if not self.changed:
+            os.remove(self.tmp_path)
+            return
+        try:
+            os.replace(self.tmp_path, self.path)
+        except OSError:
+            self.discard()
+            raise
+
+    def discard(self):
+        """
+        Drops what was written, leaving path as it was.
+        """
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+class BlockWriter:
+    """
+    Formats and writes everything on the calling thread, with the floats of rows in style, one of
+    format_mmobj.NUMBER_STYLES.
+    """
+    def __init__(self, filepath, on_done=None, style='FIXED'):
+        self._file = ChangedFile(filepath, buffering=WRITE_BUFFER_SIZE)
+        self.on_done = on_done
+        self.style = style
+        self.error = None
+
+    def write(self, text):
+        self._file.write(text.encode("utf8"))
+
+    def write_rows(self, fmt, values):
+        for text in format_rows(fmt, values, self.style):
+            self.write(text)
+
+    def write_lists(self, head, item_fmt, counts, values):
+        for text in format_lists(head, item_fmt, counts, values, self.style):
+            self.write(text)
+
+    def call(self, func, *args):
+        func(*args)
+
+    @property
+    def changed(self):
+        return self._file.changed
+
+    @property
+    def digest(self):
+        return self._file.digest
+
+    def close(self):
+        self._file.close()
+        if self.on_done is not None:
+            self.on_done(None)
+
+    def abort(self, error):
+        self.error = error
+        self._file.discard()
+
+    def wait(self):
+        return self.error
+
+
+class PipelinedWriter:
+    """
+    Formats blocks on a pool of worker threads and writes them from a writer thread, in the order they
+    were handed over.  Handing over waits while max_queue pieces are still unwritten, so a slow disk
+    holds back the main thread instead of filling up memory.
+
+    close() returns at once; on_done(error) is then called on the writer thread once the file is
+    closed, with None or the exception that stopped the writing.  Arrays handed over must not be
+    changed afterwards.  style is as for BlockWriter.
+    """
+    def __init__(self, filepath, on_done=None, workers=2, max_queue=16, style='FIXED'):
+        # opened here, so a bad path fails on the calling thread
+        self._file = ChangedFile(filepath, buffering=WRITE_BUFFER_SIZE)
+        self.on_done = on_done
+        self.style = style
+        self.error = None
+        self._pending = []
+        self._pending_size = 0
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="mmobj writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _flush(self):
+        if self._pending:
+            self._queue.put(''.join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+    def _submit(self, func, *args):
+        self._flush()
+        self._queue.put(self._pool.submit(func, *args))
+
+    def write(self, text):
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= TEXT_BATCH_SIZE:
+            self._flush()
+
+    def write_rows(self, fmt, values):
+        values = np.asarray(values)
+        for start in range(0, len(values), FORMAT_CHUNK):
+            self._submit(format_block, fmt, values[start:start + FORMAT_CHUNK], self.style)
+
+    def write_lists(self, head, item_fmt, counts, values):
+        for chunk, chunk_values in list_chunks(counts, values):
+            self._submit(format_list_block, head, item_fmt, chunk, chunk_values, self.style)
+
+    def call(self, func, *args):
+        """
+        Calls func(*args) on the writer thread, after everything handed over before it is written.
+        """
+        self._flush()
+        self._queue.put((func, args))
+
+    @property
+    def changed(self):
+        """
+        Whether the file was replaced; None until it is closed.
+        """
+        return self._file.changed
+
+    def close(self):
+        self._flush()
+        self._queue.put(None)
+
+    def abort(self, error):
+        """
+        Stops writing after a failure on the calling thread; what is still queued is dropped.
+        """
+        self.error = error
+        self._pending = []
+        self._queue.put(None)
+
+    def wait(self):
+        """
+        Waits until the file is closed and returns None or the exception that stopped the writing.
+        """
+        self._thread.join()
+        return self.error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                # drain the queue so the calling thread never blocks on it
+                if isinstance(item, concurrent.futures.Future):
+                    item.cancel()
+                continue
+            try:
+                if isinstance(item, tuple):
+                    item[0](*item[1])
+                    continue
+                if isinstance(item, concurrent.futures.Future):
+                    item = item.result()
+                self._file.write(item.encode("utf8"))
+            except Exception as e:
+                self.error = e
+
+        self._pool.shutdown(wait=False)
+        if self.error is not None:
+            self._file.discard()
+        else:
+            try:
+                self._file.close()
+            except OSError as e:
+                self.error = e
+        if self.on_done is not None:
+            self.on_done(self.error)
+
+
+# full file path: (digest of everything but the delta rows, size, mtime and sha1 of the file), for the
+# files DeltaWriter wrote in full
+delta_bases = {}
+
+
+class RecordingWriter:
+    """
+    Collects what is handed over instead of writing it, and hashes all of it except the values of the
+    rows written with one of delta_fmts; only their number counts.  Two exports with the same digest
+    differ in nothing but those rows.  The number style the rows will be written in counts too.
+    """
+    def __init__(self, delta_fmts, on_done=None, style='FIXED'):
+        self.delta_fmts = frozenset(delta_fmts)
+        self.on_done = on_done
+        self.style = style
+        self.error = None
+        self.changed = None
+        self._items = []  # ('text', text), ('rows', fmt, values), ('lists', ...) or ('call', func, args)
+        self._hasher = hashlib.sha1(b"s" + style.encode("utf8"))
+
+    def _hash_array(self, values):
+        values = np.ascontiguousarray(values)
+        self._hasher.update(("%s%r" % (values.dtype.str, values.shape)).encode("utf8"))
+        self._hasher.update(values.tobytes())
+
+    def write(self, text):
+        self._items.append(('text', text))
+        self._hasher.update(b"t" + text.encode("utf8"))
+
+    def write_rows(self, fmt, values):
+        values = np.asarray(values)
+        self._items.append(('rows', fmt, values))
+        self._hasher.update(b"r" + fmt.encode("utf8"))
+        if fmt in self.delta_fmts:
+            self._hasher.update(repr(values.shape).encode("utf8"))
+        else:
+            self._hash_array(values)
+
+    def write_lists(self, head, item_fmt, counts, values):
+        self._items.append(('lists', head, item_fmt, counts, values))
+        self._hasher.update(b"l" + (head + item_fmt).encode("utf8"))
+        self._hash_array(counts)
+        self._hash_array(values)
+
+    def call(self, func, *args):
+        self._items.append(('call', func, args))
+
+    @property
+    def digest(self):
+        return self._hasher.digest()
+
+    def delta_blocks(self):
+        """
+        The (row format, values) of the rows written with delta_fmts, in order.
+        """
+        return [item[1:] for item in self._items if item[0] == 'rows' and item[1] in self.delta_fmts]
+
+    def write_file(self, filepath):
+        """
+        Writes everything to filepath as a BlockWriter would, and returns the closed BlockWriter.
+        """
+        out = BlockWriter(filepath, style=self.style)
+        try:
+            for item in self._items:
+                if item[0] == 'text':
+                    out.write(item[1])
+                elif item[0] == 'rows':
+                    out.write_rows(*item[1:])
+                elif item[0] == 'lists':
+                    out.write_lists(*item[1:])
+        except Exception as e:
+            out.abort(e)
+            raise
+        out.close()
+        return out
+
+    def run_calls(self):
+        for item in self._items:
+            if item[0] == 'call':
+                item[1](*item[2])
+
+    def abort(self, error):
+        self.error = error
+        self._items = []
+
+    def wait(self):
+        return self.error
+
+
+class DeltaWriter(RecordingWriter):
+    """
+    Compares what was handed over with the last full write to the same file on close(): if only the
+    rows written with delta_fmts differ, and the file wasn't touched since, just those rows are
+    written to the file's delta.  Otherwise the whole file is written as a BlockWriter would, and any
+    delta of it is removed.
+
+    Works on the calling thread, like BlockWriter.  Arrays handed over must not be changed afterwards.
+    """
+    def __init__(self, filepath, delta_fmts, on_done=None, style='FIXED'):
+        RecordingWriter.__init__(self, delta_fmts, on_done, style)
+        self.filepath = filepath
+        self.wrote_delta = False
+
+    def _base_unchanged(self, digest):
+        base = delta_bases.get(self.filepath)
+        if base is None or base[0] != digest:
+            return False
+        try:
+            stat = os.stat(self.filepath)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == base[1:3]
+
+    def _write_delta(self):
+        _, base_size, _, base_sha1 = delta_bases[self.filepath]
+        delta = ChangedFile(delta_path(self.filepath))
+        try:
+            delta.write(encode_delta(base_size, base_sha1, self.delta_blocks(), self.style))
+        except Exception:
+            delta.discard()
+            raise
+        delta.close()
+        self.changed = delta.changed
+        self.wrote_delta = True
+
+    def _write_full(self, digest):
+        out = self.write_file(self.filepath)
+        self.changed = out.changed
+        stat = os.stat(self.filepath)
+        delta_bases[self.filepath] = digest, stat.st_size, stat.st_mtime_ns, out.digest
+        if os.path.exists(delta_path(self.filepath)):
+            os.remove(delta_path(self.filepath))
+
+    def close(self):
+        digest = self.digest
+        try:
+            if self._base_unchanged(digest):
+                self._write_delta()
+            else:
+                self._write_full(digest)
+            self.run_calls()
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            self._items = []
+        if self.on_done is not None:
+            self.on_done(None)
+
+
+class AnimationWriter:
+    """
+    Writes an animation whose frames share their topology: the first frame as a full file, and the
+    rows written with delta_fmts of every frame to one animation stream next to it (see delta_mmobj).
+    Each frame is exported to the writer frame() returns; it is encoded and written on a worker thread
+    while the next one is exported.  A frame whose digest differs from the first one's fails.
+    """
+    def __init__(self, filepath, delta_fmts, max_pending=2, style='FIXED'):
+        self.filepath = filepath
+        self.delta_fmts = delta_fmts
+        self.style = style
+        self.max_pending = max_pending
+        self.num_frames = 0
+        self._digest = None
+        self._stream = None
+        self._pending = collections.deque()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def frame(self, frame):
+        return AnimationFrame(self, frame)
+
+    def _start(self, first):
+        out = first.write_file(self.filepath)
+        self._digest = first.digest
+        self._stream = ChangedFile(animation_path(self.filepath), buffering=WRITE_BUFFER_SIZE)
+        self._stream.write(ANIMATION_HEADER.pack(ANIMATION_MAGIC, VERSION, os.path.getsize(self.filepath),
+                                                 out.digest, style_code(self.style)))
+        # a delta of an earlier export doesn't apply to the new file
+        if os.path.exists(delta_path(self.filepath)):
+            os.remove(delta_path(self.filepath))
+
+    def add(self, frame):
+        """
+        Queues the rows of an exported frame; the first frame also writes the full file.
+        """
+        if self._stream is None:
+            self._start(frame)
+        elif frame.digest != self._digest:
+            raise ValueError("frame %d doesn't have the topology of the first frame" % frame.frame)
+        # the frame before the last still being written holds back the export
+        while len(self._pending) >= self.max_pending:
+            self._pending.popleft().result()
+        self._pending.append(self._pool.submit(self._write_frame, frame.frame, frame.delta_blocks()))
+        self.num_frames += 1
+
+    def _write_frame(self, frame, blocks):
+        self._stream.write(encode_frame(frame, blocks))
+
+    def close(self):
+        """
+        Waits for the queued frames and closes the stream.  Returns whether it changed.
+        """
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        except Exception:
+            self.abort()
+            raise
+        self._pool.shutdown()
+        if self._stream is None:
+            return False
+        self._stream.close()
+        return self._stream.changed
+
+    def abort(self):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown()
+        if self._stream is not None:
+            self._stream.discard()
+
+
+class AnimationFrame(RecordingWriter):
+    """
+    Collects one frame of an AnimationWriter, and hands it over on close().  A frame that fails stops
+    the whole animation.
+    """
+    def __init__(self, animation, frame):
+        RecordingWriter.__init__(self, animation.delta_fmts, style=animation.style)
+        self.animation = animation
+        self.frame = frame
+
+    def close(self):
+        try:
+            self.animation.add(self)
+            self.run_calls()
+        except Exception as e:
+            self.abort(e)
+            raise
+        finally:
+            self._items = []
+        self.changed = True
+
+    def abort(self, error):
+        RecordingWriter.abort(self, error)
+        self.animation.abort()
@@ -0,0 +1,15 @@
+"""
+Makes the addon's modules that don't need blender importable as io_scene_mmobj.<module>, without
+running the package's __init__, which registers the blender operators.
+"""
+
+import os
+import sys
+import types
+
+ADDON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "io_scene_mmobj")
+
+if "io_scene_mmobj" not in sys.modules:
+    package = types.ModuleType("io_scene_mmobj")
+    package.__path__ = [ADDON_DIR]
+    sys.modules["io_scene_mmobj"] = package
@@ -0,0 +1,101 @@
+import os
+
+from io_scene_mmobj.copy_mmobj import MANIFEST_NAME, copy_textures, load_manifest
+
+
+def setup(tmp_path):
+    src_dir = tmp_path / "src"
+    out_dir = tmp_path / "out"
+    src_dir.mkdir()
+    out_dir.mkdir()
+    src = src_dir / "skin.dds"
+    src.write_bytes(b"texture one")
+    return str(src), str(out_dir / "skin.dds"), str(out_dir)
+
+
+def export(src, dst, directory, link='COPY'):
+    messages = []
+    result = copy_textures({(src, dst)}, directory, link, report=messages.append)
+    return result, messages
+
+
+def manifest_mtime(directory):
+    return os.stat(os.path.join(directory, MANIFEST_NAME)).st_mtime_ns
+
+
+def set_mtime(path, delta_ns):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + delta_ns))
+
+
+def test_first_copy_and_unchanged(tmp_path):
+    src, dst, directory = setup(tmp_path)
+    assert export(src, dst, directory)[0] == (1, 0)
+    with open(dst, 'rb') as f:
+        assert f.read() == b"texture one"
+    entry = load_manifest(os.path.join(directory, MANIFEST_NAME))["skin.dds"]
+    assert entry["source"] == os.path.abspath(src) and entry["size"] == len(b"texture one")
+
+    # an unchanged manifest isn't rewritten
+    set_mtime(os.path.join(directory, MANIFEST_NAME), -10 ** 9)
+    before = manifest_mtime(directory)
+    assert export(src, dst, directory)[0] == (0, 1)
+    assert manifest_mtime(directory) == before
+
+
+def test_changed_source_is_copied(tmp_path):
+    src, dst, directory = setup(tmp_path)
+    export(src, dst, directory)
+    with open(src, 'wb') as f:
+        f.write(b"texture two")
+    set_mtime(src, 10 ** 9)
+    assert export(src, dst, directory)[0] == (1, 0)
+    with open(dst, 'rb') as f:
+        assert f.read() == b"texture two"
+
+
+def test_changed_copy_is_replaced(tmp_path):
+    src, dst, directory = setup(tmp_path)
+    export(src, dst, directory)
+    with open(dst, 'wb') as f:
+        f.write(b"edited copy")
+    set_mtime(dst, 10 ** 9)
+    assert export(src, dst, directory)[0] == (1, 0)
+    with open(dst, 'rb') as f:
+        assert f.read() == b"texture one"
+
+
+def test_touched_source_only_updates_the_manifest(tmp_path):
+    src, dst, directory = setup(tmp_path)
+    export(src, dst, directory)
+    copy_mtime = os.stat(dst).st_mtime_ns
+    set_mtime(src, 10 ** 9)
+    assert export(src, dst, directory)[0] == (0, 1)
+    assert os.stat(dst).st_mtime_ns == copy_mtime
+    entry = load_manifest(os.path.join(directory, MANIFEST_NAME))["skin.dds"]
+    assert entry["mtime"] == os.stat(src).st_mtime_ns
+
+
+def test_other_source_is_copied(tmp_path):
+    src, dst, directory = setup(tmp_path)
+    export(src, dst, directory)
+    other = str(tmp_path / "src" / "other.dds")
+    with open(other, 'wb') as f:
+        f.write(b"texture one")
+    assert export(other, dst, directory)[0] == (1, 0)
+
+
+def test_missing_source_is_reported(tmp_path):
+    src, dst, directory = setup(tmp_path)
+    os.remove(src)
+    (copied, skipped), messages = export(src, dst, directory)
+    assert (copied, skipped) == (0, 0)
+    assert len(messages) == 1 and "missing" in messages[0]
+    assert not os.path.exists(os.path.join(directory, MANIFEST_NAME))
+
+
+def test_hardlink(tmp_path):
+    src, dst, directory = setup(tmp_path)
+    assert export(src, dst, directory, 'HARDLINK')[0] == (1, 0)
+    assert os.path.samefile(src, dst)
+    assert export(src, dst, directory, 'HARDLINK')[0] == (0, 1)
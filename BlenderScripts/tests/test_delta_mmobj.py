@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pytest
+
+from io_scene_mmobj.delta_mmobj import DeltaError, animation_path, delta_path, merge
+from io_scene_mmobj.format_mmobj import NUMBER_STYLES
+from io_scene_mmobj.write_mmobj import AnimationWriter, BlockWriter, DeltaWriter
+
+POSITION = 'v %.6f %.6f %.6f\n'
+NORMAL = 'vn %.6f %.6f %.6f\n'
+
+
+def export(out, seed, name="cube"):
+    """
+    Writes a small mesh the way the exporter hands it over; the seed moves its vertices.
+    """
+    rng = np.random.RandomState(seed)
+    out.write("# comment\no %s\n" % name)
+    out.write_rows(POSITION, rng.uniform(-10.0, 10.0, (4, 3)).astype(np.float32))
+    out.write_rows('vt %.6f %.6f\n', np.array([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]]))
+    out.write_rows(NORMAL, rng.uniform(-1.0, 1.0, (4, 3)))
+    out.write_lists('f', ' %d/%d/%d', np.array([4]), np.repeat(np.arange(1, 5)[:, None], 3, axis=1))
+    out.close()
+    return out
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def full_export(tmp_path, seed, style):
+    path = str(tmp_path / ("full%d.mmobj" % seed))
+    export(BlockWriter(path, style=style), seed)
+    return read(path)
+
+
+@pytest.mark.parametrize("style", NUMBER_STYLES)
+def test_merge_gives_the_full_export(tmp_path, style):
+    path = str(tmp_path / "cube.mmobj")
+    assert not export(DeltaWriter(path, (POSITION, NORMAL), style=style), 0).wrote_delta
+    base = read(path)
+    assert export(DeltaWriter(path, (POSITION, NORMAL), style=style), 1).wrote_delta
+    assert read(path) == base
+
+    assert merge(base, read(delta_path(path))) == full_export(tmp_path, 1, style)
+    with pytest.raises(DeltaError):
+        merge(base.replace(b"cube", b"cone"), read(delta_path(path)))
+
+
+def test_other_changes_write_the_full_file(tmp_path):
+    path = str(tmp_path / "cube.mmobj")
+    export(DeltaWriter(path, (POSITION, NORMAL)), 0)
+    export(DeltaWriter(path, (POSITION, NORMAL)), 1)
+    assert not export(DeltaWriter(path, (POSITION, NORMAL)), 1, name="cone").wrote_delta
+    assert not os.path.exists(delta_path(path))
+    assert b"o cone\n" in read(path)
+
+
+@pytest.mark.parametrize("style", NUMBER_STYLES)
+def test_merge_animation_frame(tmp_path, style):
+    path = str(tmp_path / "cube.mmobj")
+    animation = AnimationWriter(path, (POSITION, NORMAL), style=style)
+    for frame in (1, 2, 3):
+        export(animation.frame(frame), frame)
+    animation.close()
+    base = read(path)
+    stream = read(animation_path(path))
+
+    assert base == full_export(tmp_path, 1, style)
+    for frame in (1, 2, 3):
+        assert merge(base, stream, frame) == full_export(tmp_path, frame, style)
+    with pytest.raises(DeltaError):
+        merge(base, stream, 4)
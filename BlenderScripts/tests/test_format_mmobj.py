@@ -0,0 +1,55 @@
+import numpy as np
+
+from io_scene_mmobj.format_mmobj import format_block, format_lists, format_rows
+
+ROW = 'v %.6f %.6f %.6f\n'
+
+
+def values():
+    rng = np.random.RandomState(0)
+    rows = rng.uniform(-1000.0, 1000.0, (200, 3))
+    rows[:4] = [[0.0, -0.0, 0.5], [1.0, -2.25, 1e-7], [123456.75, 0.0000005, 0.0000015], [1e-30, 3e38, -7.0]]
+    return rows
+
+
+def test_fixed_is_the_format():
+    rows = values()
+    assert format_block(ROW, rows) == (ROW * len(rows)) % tuple(rows.ravel().tolist())
+
+
+def test_trim_strips_the_zeros_of_the_format():
+    rows = values()
+    lines = format_block(ROW, rows, 'TRIM').splitlines()
+    for line, row in zip(lines, rows.tolist()):
+        expected = ['v'] + [('%.6f' % x).rstrip('0').rstrip('.') for x in row]
+        assert line.split() == expected
+    assert lines[0] == 'v 0 -0 0.5'
+
+
+def test_shortest_reads_back_as_the_same_float32():
+    rows = values()
+    floats = rows.astype(np.float32)
+    lines = format_block(ROW, rows, 'SHORTEST').splitlines()
+    assert 'e' not in ''.join(lines)
+    back = np.array([line.split()[1:] for line in lines], dtype=np.float32)
+    assert (back == floats).all()
+    assert lines[1] == 'v 1 -2.25 0.0000001'
+
+
+def test_rows_are_formatted_in_chunks(monkeypatch):
+    from io_scene_mmobj import format_mmobj
+    monkeypatch.setattr(format_mmobj, 'FORMAT_CHUNK', 7)
+    rows = values()
+    chunks = list(format_rows(ROW, rows, 'TRIM'))
+    assert len(chunks) == 29
+    assert ''.join(chunks) == format_block(ROW, rows, 'TRIM')
+
+
+def test_lists():
+    counts = np.array([3, 4])
+    items = np.array([[1, 1], [2, 2], [3, 3], [4, 4], [5, 5], [6, 6], [7, 7]])
+    text = ''.join(format_lists('f', ' %d/%d', counts, items))
+    assert text == 'f 1/1 2/2 3/3\nf 4/4 5/5 6/6 7/7\n'
+
+    pairs = np.array([[3, 0.25], [1, 0.75]])
+    assert ''.join(format_lists('#vbld', ' %d/%0.6f', np.array([2]), pairs, 'TRIM')) == '#vbld 3/0.25 1/0.75\n'
@@ -0,0 +1,61 @@
+import numpy as np
+
+from io_scene_mmobj.proxy_mmobj import read_proxy, stratified_triangles
+
+
+def test_small_meshes_are_kept_whole():
+    positions = np.zeros((3, 3))
+    triangles = np.array([[0, 1, 2], [2, 1, 0]])
+    assert stratified_triangles(positions, triangles, 2).tolist() == [0, 1]
+
+
+def test_triangles_are_spread_over_space():
+    # 100 triangles in one corner, 4 in the other
+    rng = np.random.RandomState(0)
+    positions = np.concatenate((rng.uniform(0.0, 1.0, (300, 3)), rng.uniform(99.0, 100.0, (12, 3))))
+    triangles = np.arange(312).reshape(-1, 3)
+
+    picked = stratified_triangles(positions, triangles, 20, grid=2)
+    assert len(picked) == 20
+    assert (np.diff(picked) > 0).all()
+    assert set(range(100, 104)) <= set(picked.tolist())
+
+
+def test_budget_ends_inside_a_rank():
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [10, 10, 10], [11, 10, 10], [10, 11, 10]], dtype=float)
+    triangles = np.array([[0, 1, 2]] * 3 + [[3, 4, 5]] * 3)
+    picked = stratified_triangles(positions, triangles, 3, grid=2)
+    assert len(picked) == 3
+    # one of each cell first, then one more
+    assert {0, 3} <= set(picked.tolist())
+
+
+def test_proxy_from_text(tmp_path):
+    path = tmp_path / "mesh.mmobj"
+    path.write_bytes(b"v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\n"
+                     b"f 1/1/1 2/2/1 3/3/1 4/4/1\n"
+                     b"v 2 0 0\nv 2 1 0\n"
+                     b"f -5 -2 -1\n")
+    proxy = read_proxy(str(path))
+
+    corners = proxy.positions[proxy.triangles].tolist()
+    assert corners == [[[0, 0, 0], [1, 0, 0], [1, 1, 0]],
+                       [[0, 0, 0], [1, 1, 0], [0, 1, 0]],
+                       # relative indices count back from the vertices before the face
+                       [[1, 0, 0], [2, 0, 0], [2, 1, 0]]]
+    assert proxy.bounds[0].tolist() == [0, 0, 0] and proxy.bounds[1].tolist() == [2, 1, 0]
+    assert proxy.num_triangles == 3
+
+
+def test_proxy_from_text_samples_faces(tmp_path):
+    lines = []
+    for i in range(50):
+        lines.append("v %d 0 0\nv %d 1 0\nv %d 0 1\n" % (i, i, i))
+        lines.append("f -3 -2 -1\n")
+    path = tmp_path / "mesh.mmobj"
+    path.write_bytes("".join(lines).encode("utf8"))
+
+    proxy = read_proxy(str(path), max_triangles=10)
+    assert len(proxy.triangles) == 10
+    assert proxy.num_triangles == 50
+    assert proxy.bounds[1].tolist() == [49, 1, 1]
@@ -0,0 +1,81 @@
+import numpy as np
+
+from io_scene_mmobj import snapshot_dat as sd
+
+ELEMENTS = [
+    sd.VertexElement(0, 0, sd.DECLTYPE_FLOAT3, 0, sd.USAGE_POSITION, 0),
+    sd.VertexElement(0, 12, sd.DECLTYPE_D3DCOLOR, 0, sd.USAGE_NORMAL, 0),
+    sd.VertexElement(0, 16, sd.DECLTYPE_FLOAT2, 0, sd.USAGE_TEXCOORD, 0),
+    sd.VertexElement(0, 24, sd.DECLTYPE_UBYTE4, 0, sd.USAGE_BLENDINDICES, 0),
+    sd.VertexElement(0, 28, sd.DECLTYPE_UBYTE4N, 0, sd.USAGE_BLENDWEIGHT, 0),
+]
+
+
+def decl_bytes(elements):
+    decl = np.zeros(len(elements) + 1, dtype=sd.ELEMENT_DTYPE)
+    for i, el in enumerate(elements):
+        decl[i] = tuple(el)
+    decl[-1] = (0xFF, 0, sd.DECLTYPE_UNUSED, 0, 0, 0)
+    return decl.tobytes()
+
+
+def mesh():
+    m = sd.SnapshotMesh()
+    m.positions = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0.5]], dtype=np.float32)
+    m.uvs = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float32)
+    m.normals = np.array([[0, 0, 1], [0, 0, -1], [1, 0, 0], [0, 0.6, 0.8]], dtype=np.float32)
+    m.blend_indices = np.array([[1, 2, 0, 0], [3, 0, 0, 0], [0, 0, 0, 0], [4, 5, 6, 7]], dtype=np.uint8)
+    m.blend_weights = np.array([[0.5, 0.5, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0], [0.4, 0.3, 0.2, 0.1]],
+                               dtype=np.float32)
+    m.triangles = np.array([[0, 1, 2], [0, 2, 3]])
+    return m
+
+
+def test_unit_bytes_wrap_like_the_runtime():
+    data = sd._unit_bytes(np.array([[-1.0, 0.0, 1.0], [0.5, -0.5, 0.25]]), False)
+    assert data.tolist() == [[255, 127, 255, 0], [191, 63, 159, 0]]
+    assert sd._unit_bytes(np.array([[-1.0, 0.0, 1.0]]), True).tolist() == [[255, 127, 255, 0]]
+
+
+def test_encode_decode_round_trip(tmp_path):
+    base = str(tmp_path / "snap")
+    m = mesh()
+    vertices = sd.encode(ELEMENTS, m)
+    assert vertices.dtype.itemsize == sd.vertex_size(ELEMENTS) == 32
+
+    with open(base + sd.DECL_SUFFIX, "wb") as f:
+        f.write(decl_bytes(ELEMENTS))
+    with open(base + sd.VB_SUFFIX, "wb") as f:
+        f.write(sd.vb_bytes(vertices))
+    with open(base + sd.IB_SUFFIX, "wb") as f:
+        f.write(sd.ib_bytes(m.triangles, len(m.positions)))
+
+    back = sd.read_snapshot(base + ".mmobj")
+    assert back.elements == ELEMENTS
+    assert (back.positions == m.positions).all()
+    assert (back.uvs == m.uvs).all()
+    assert (back.triangles == m.triangles).all()
+    assert (back.blend_indices == m.blend_indices).all()
+    assert np.allclose(back.blend_weights, m.blend_weights, atol=0.5 / 255)
+    # what the snapshot reads for byte normals; -1.0 wraps to the top of the range
+    assert (back.normals * 255).round().astype(int).tolist() == [[127, 127, 255], [127, 127, 255],
+                                                                  [255, 127, 127], [127, 203, 229]]
+
+
+def test_index_buffer_size():
+    triangles = np.array([[0, 1, 2]])
+    small = sd.ib_bytes(triangles, 0x10000)
+    assert np.frombuffer(small[:8], '<i4').tolist() == [3, 2] and len(small) == 8 + 6
+    large = sd.ib_bytes(triangles, 0x10001)
+    assert np.frombuffer(large[:8], '<i4').tolist() == [3, 4] and len(large) == 8 + 12
+
+
+def test_reverse_xforms_undo_them():
+    m = mesh()
+    xforms = [b'rot_x_90', b'scale_0.1', b'rot_z_45']
+    sd.apply_xforms(m, xforms, [b'flip_y'])
+    assert not np.allclose(m.positions, mesh().positions)
+    sd.apply_xforms(m, xforms, [b'flip_y'], reverse=True)
+    assert np.allclose(m.positions, mesh().positions, atol=1e-5)
+    assert np.allclose(m.normals, mesh().normals, atol=1e-5)
+    assert (m.uvs == mesh().uvs).all()
@@ -0,0 +1,105 @@
+import json
+import os
+
+import pytest
+
+from io_scene_mmobj.validate_mmobj import _validate_task, main, validate_file, validate_paths
+
+GOOD = """v 0 0 0
+v 1 0 0
+v 0 1 0
+vt 0 0
+vt 1 0
+vt 0 1
+vn 0 0 1
+#vbld 0/1.0 0/0 0/0 0/0
+#vbld 1/0.5 2/0.5 0/0 0/0
+#vbld 1/1.0 0/0 0/0 0/0
+#vgn Index.00
+#vgn Index.01
+#vg 0
+#vg 1
+#vg 0 1
+f 1/1/1 2/2/1 3/3/1
+"""
+
+
+def write(tmp_path, text, name="mesh.mmobj"):
+    path = tmp_path / name
+    path.write_bytes(text.encode("utf8"))
+    return str(path)
+
+
+def issues(report):
+    return {(i["severity"], i["code"]): i for i in report["issues"]}
+
+
+def test_good_file(tmp_path):
+    report = validate_file(write(tmp_path, GOOD))
+    assert report["issues"] == []
+    assert report["counts"]["triangles"] == 1
+    assert report["blend_index_counts"] == [1, 2, 1]
+
+
+@pytest.mark.parametrize("old, new, code", [
+    ("f 1/1/1 2/2/1 3/3/1\n", "f 1 2 3\n", "no_triangles"),
+    ("f 1/1/1 2/2/1 3/3/1\n", "f 1/1/1 2/2/1 3/3/1\nf 1 2 3\n", "face_not_ptn_triangle"),
+    ("2/2/1", "2/x/1", "bad_face_index"),
+    ("3/3/1", "4/3/1", "position_index_out_of_range"),
+    ("2/2/1", "2/0/1", "uv_index_out_of_range"),
+    ("3/3/1", "3/3/2", "normal_index_out_of_range"),
+    ("#vbld 1/1.0 0/0 0/0 0/0\n", "", "blend_count_mismatch"),
+    ("#vbld 1/1.0 0/0 0/0 0/0", "#vbld 1/1.0", "blend_pair_count"),
+    ("#vbld 0/1.0", "#vbld 0/one", "bad_blend_pair"),
+    ("#vbld 1/1.0", "#vbld 256/1.0", "blend_index_out_of_range"),
+    ("#vbld 1/0.5 2/0.5", "#vbld 1/1.5 2/-0.5", "negative_blend_weight"),
+    ("#vg 1\n", "#vg one\n", "bad_group_index"),
+    ("#vg 1\n", "#vg 2\n", "group_index_out_of_range"),
+    ("#vg 0 1\n", "#vg 0 1\n#vg 0\n", "group_count_mismatch"),
+])
+def test_errors(tmp_path, old, new, code):
+    assert old in GOOD
+    report = validate_file(write(tmp_path, GOOD.replace(old, new)))
+    assert ("error", code) in issues(report)
+
+
+def test_examples_are_element_numbers(tmp_path):
+    text = GOOD.replace("#vbld 1/0.5 2/0.5", "#vbld 1/0.5 2/0.4")
+    issue = issues(validate_file(write(tmp_path, text)))[("warning", "blend_weight_sum")]
+    assert issue["count"] == 1 and issue["examples"] == [1]
+
+
+def test_unreadable(tmp_path):
+    report = _validate_task((str(tmp_path / "missing.mmobj"), None))
+    assert ("error", "unreadable") in issues(report)
+
+
+def test_palette_size_is_an_error(tmp_path):
+    issue = issues(validate_file(write(tmp_path, GOOD), palette_size=2))[("error", "blend_index_past_palette")]
+    assert issue["examples"] == [1]
+
+
+def test_reference_palette_is_a_warning(tmp_path):
+    # the reference only uses indices 0 and 1, the mod also 2
+    write(tmp_path, GOOD.replace("2/0.5", "0/0.5"), "ref.mmobj")
+    write(tmp_path, GOOD, "mod.mmobj")
+    write(tmp_path, "Type: Reference\nMeshPath: ref.mmobj\n", "ref.yaml")
+    write(tmp_path, "Type: Mod\nRef: ref\nMeshPath: mod.mmobj\n", "mod.yaml")
+
+    report = validate_paths([str(tmp_path)], jobs=1)
+    by_name = {os.path.basename(r["path"]): r for r in report["files"]}
+    issue = issues(by_name["mod.mmobj"])[("warning", "blend_index_past_palette")]
+    assert issue["examples"] == [2]
+    assert "--palette-size" in issue["message"]
+    assert by_name["mod.mmobj"]["ok"] and by_name["ref.mmobj"]["ok"]
+    assert report["summary"] == {"files": 2, "failed": 0, "warnings": 1}
+
+
+def test_exit_code(tmp_path):
+    good = write(tmp_path, GOOD, "good.mmobj")
+    bad = write(tmp_path, GOOD.replace("3/3/1", "4/3/1"), "bad.mmobj")
+    output = str(tmp_path / "report.json")
+    assert main([good, "--jobs", "1", "--output", output]) == 0
+    assert main([good, bad, "--jobs", "1", "--output", output]) == 1
+    with open(output) as f:
+        assert json.load(f)["summary"]["failed"] == 1
@@ -0,0 +1,69 @@
+import numpy as np
+
+from io_scene_mmobj.vcache_mmobj import face_vertex_lists, miss_ratio, reorder_triangles, tipsify
+
+
+def grid(size):
+    """
+    The quads of a size x size grid, as flat corners and face totals.
+    """
+    corners = []
+    for y in range(size):
+        for x in range(size):
+            v = y * (size + 1) + x
+            corners.extend([v, v + 1, v + size + 2, v + size + 1])
+    return np.array(corners), np.full(size * size, 4), (size + 1) ** 2
+
+
+def reordered(corners, totals, order):
+    faces = face_vertex_lists(corners, totals)
+    return np.concatenate([faces[f] for f in order]), totals[order]
+
+
+def test_miss_ratio():
+    # every vertex of two triangles sharing an edge misses once
+    assert miss_ratio([0, 1, 2, 2, 1, 3], [3, 3]) == 2.0
+    # a cache of 2 has lost vertex 0 when the second triangle uses it again, and has 0 and 3 for the third
+    assert miss_ratio([0, 1, 2, 0, 2, 3, 0, 3, 4], [3, 3, 3], cache_size=2) == 2.0
+    assert miss_ratio([0, 1, 2, 0, 2, 3, 0, 3, 4], [3, 3, 3]) == 5 / 3
+    assert miss_ratio([], []) == 0.0
+
+
+def test_tipsify_is_a_permutation():
+    corners, totals, num_verts = grid(8)
+    order = tipsify(corners, totals, num_verts)
+    assert sorted(order.tolist()) == list(range(len(totals)))
+
+
+def test_tipsify_improves_a_shuffled_grid():
+    corners, totals, num_verts = grid(30)
+    shuffle = np.random.RandomState(0).permutation(len(totals))
+    corners, totals = reordered(corners, totals, shuffle)
+    before = miss_ratio(corners, totals)
+
+    order = tipsify(corners, totals, num_verts)
+    after = miss_ratio(*reordered(corners, totals, order))
+    assert after < 0.75 < before
+
+
+def test_tipsify_keeps_unused_vertices_out():
+    # vertex 3 has no faces
+    order = tipsify([0, 1, 2, 4, 5, 6], [3, 3], 7)
+    assert sorted(order.tolist()) == [0, 1]
+
+
+def test_reorder_triangles():
+    corners, totals, num_verts = grid(20)
+    quads = corners.reshape(-1, 4)
+    triangles = np.concatenate((quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]))
+    triangles = triangles[np.random.RandomState(1).permutation(len(triangles))]
+
+    reordered, before, after = reorder_triangles(triangles, num_verts)
+    assert sorted(map(tuple, reordered.tolist())) == sorted(map(tuple, triangles.tolist()))
+    assert after < before
+    assert np.isclose(after, miss_ratio(reordered.ravel(), np.full(len(reordered), 3)))
+
+    # no order misses less than once per vertex, so this one is kept
+    kept, before, after = reorder_triangles(np.array([[2, 1, 3], [0, 1, 2]]), 4)
+    assert kept.tolist() == [[2, 1, 3], [0, 1, 2]]
+    assert before == after == 2.0
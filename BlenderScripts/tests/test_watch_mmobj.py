@@ -0,0 +1,72 @@
+import struct
+
+from io_scene_mmobj.watch_mmobj import SnapshotWatcher, vb_complete
+
+
+def write_vb(path, num_verts, stride, data_len=None):
+    if data_len is None:
+        data_len = num_verts * stride
+    path.write_bytes(struct.pack('<II', num_verts, stride) + b"\0" * data_len)
+
+
+def write_capture(directory, name="snap_1_2p_3v", vb_len=None):
+    base = directory / name
+    (directory / (name + ".mmobj")).write_text("v 0 0 0\n")
+    (directory / (name + "_VBDecl.dat")).write_bytes(b"decl")
+    (directory / (name + "_IB.dat")).write_bytes(b"ib")
+    write_vb(directory / (name + "_VB.dat"), 3, 12, vb_len)
+    return str(base) + ".mmobj"
+
+
+def test_vb_complete(tmp_path):
+    vb = tmp_path / "a_VB.dat"
+    assert not vb_complete(str(vb))
+    vb.write_bytes(b"\3\0\0\0")
+    assert not vb_complete(str(vb))
+    write_vb(vb, 3, 12, 35)
+    assert not vb_complete(str(vb))
+    write_vb(vb, 3, 12)
+    assert vb_complete(str(vb))
+
+
+def test_vb_complete_reads_stride_unsigned(tmp_path):
+    # read as signed, this stride makes the expected length negative
+    vb = tmp_path / "a_VB.dat"
+    write_vb(vb, 1, 0x80000000, 0)
+    assert not vb_complete(str(vb))
+
+
+def test_ready_after_settle_time(tmp_path):
+    path = write_capture(tmp_path)
+    watcher = SnapshotWatcher(str(tmp_path), settle_time=1.0)
+    assert watcher._ready(10.0) == []
+    assert watcher._ready(10.5) == []
+    assert watcher._ready(11.0) == [path]
+
+
+def test_ready_restarts_when_files_change(tmp_path):
+    path = write_capture(tmp_path)
+    watcher = SnapshotWatcher(str(tmp_path), settle_time=1.0)
+    watcher._ready(10.0)
+    (tmp_path / "snap_1_2p_3v_IB.dat").write_bytes(b"longer ib")
+    assert watcher._ready(11.0) == []
+    assert watcher._ready(12.0) == [path]
+
+
+def test_ready_skips_incomplete_captures(tmp_path):
+    write_capture(tmp_path, vb_len=10)
+    write_capture(tmp_path, "snap_2_2p_3v")
+    (tmp_path / "snap_2_2p_3v_IB.dat").unlink()
+    (tmp_path / "notes.mmobj").write_text("")
+    watcher = SnapshotWatcher(str(tmp_path), settle_time=0.0)
+    assert watcher._ready(10.0) == []
+    assert watcher._ready(20.0) == []
+    assert watcher._pending == {}
+
+
+def test_ready_skips_seen_captures(tmp_path):
+    path = write_capture(tmp_path)
+    watcher = SnapshotWatcher(str(tmp_path), settle_time=0.0)
+    watcher._seen.add(path)
+    watcher._ready(10.0)
+    assert watcher._ready(20.0) == []
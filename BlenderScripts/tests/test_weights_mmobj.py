@@ -0,0 +1,45 @@
+import numpy as np
+
+from io_scene_mmobj.weights_mmobj import blend_index_table, top_blend_weights
+
+
+def test_blend_index_table():
+    table = blend_index_table(["Index.03", "Arm", "Index.12.left", "PosTransform.rot_x_90"])
+    assert table.tolist() == [3, -1, 12, -1]
+
+
+def test_top_four_heaviest_first_and_renormalized():
+    # one vertex in six blend groups, one in none
+    counts = np.array([6, 0])
+    groups = np.array([0, 1, 2, 3, 4, 5])
+    weights = np.array([0.1, 0.3, 0.05, 0.2, 0.25, 0.1])
+    table = np.arange(6) + 10
+    index, weight, dropped = top_blend_weights(counts, groups, weights, table)
+
+    assert index[0].tolist() == [11, 14, 13, 10]
+    kept = np.array([0.3, 0.25, 0.2, 0.1])
+    assert np.allclose(weight[0], kept / kept.sum())
+    assert np.isclose(dropped[0], 1.0 - kept.sum())
+    assert weight[1].tolist() == [0.0, 0.0, 0.0, 0.0]
+    assert dropped[1] == 0.0
+
+
+def test_ties_keep_group_order_and_padding_repeats_heaviest_index():
+    counts = np.array([3])
+    groups = np.array([0, 1, 2])
+    weights = np.array([0.25, 0.5, 0.25])
+    index, weight, dropped = top_blend_weights(counts, groups, weights, np.array([7, 8, 9]))
+
+    assert index[0].tolist() == [8, 7, 9, 8]
+    assert weight[0].tolist() == [0.5, 0.25, 0.25, 0.0]
+    assert dropped[0] == 0.0
+
+
+def test_non_blend_groups_and_tiny_weights_are_skipped():
+    counts = np.array([3])
+    groups = np.array([0, 1, 2])
+    weights = np.array([1.0, 0.00001, 0.5])
+    index, weight, _ = top_blend_weights(counts, groups, weights, np.array([-1, 4, 5]))
+
+    assert index[0].tolist() == [5, 5, 5, 5]
+    assert weight[0].tolist() == [0.5, 0.0, 0.0, 0.0]